@@ -0,0 +1,352 @@
+"""
+Long-running analysis server.
+
+Keeps one transposition table (and optionally a tablebase and an opening book)
+warm across requests, and while waiting for the next request ponders: it searches
+the position expected after its own move and the opponent's predicted reply (the
+first two moves of the principal variation). When the next request is for that
+position, the ponder search simply continues as the real search.
+
+Requests and replies are JSON lines, over stdin/stdout or local TCP:
+
+    python analysis_server.py                  # stdin/stdout
+    python analysis_server.py --port 7777      # 127.0.0.1:7777
+
+As in get_best_move, the engine plays 'x'. Boards are 24-character strings (or
+lists) in the point order of bitboard.py with 'x', '0' and ',' for an empty point.
+Every request may carry an "id" that is copied into its reply.
+
+    {"cmd": "go", "board": "...", "pieces_to_place": [nx, n0], "algorithm": "AlphaBeta",
+     "depth": 6, "time_limit_ms": 1000, "quiescence": false}
+        Search the position; without depth and time_limit_ms the search runs until
+        "stop" ("MCTS", which ignores depth, runs its playout budget when given only
+        a depth). Reply: move ([frm, to, removed]), board and pieces_to_place after the
+        move, depth (deepest finished iteration), pv, ponder (the expected reply),
+        ponder_hit, nodes and ms. With "multi_pv": k the k best moves are ranked in one
+        search (get_top_moves, in place of the algorithm) and the reply also has lines,
+        a list of {move, score, pv} objects, best first.
+    {"cmd": "stop"}
+        Make the running search reply at once with its best move so far.
+    {"cmd": "new_game"}
+        Stop pondering and clear the transposition table and the MCTS tree.
+    {"cmd": "quit"}
+
+Searches always deepen iteratively (so that they can be stopped); "go" requests
+are answered one at a time, and a "go" sent while another runs gets an error.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import sys
+import time
+
+import bitboard
+from mcts import MonteCarloTreeSearch
+from transposition import TranspositionTable
+
+ALGORITHMS = ("MinMax", "AlphaBeta", "Negamax", "DFPN", "MCTS")
+# How often a search that became the real search after a ponder hit checks its depth.
+POLL_SECONDS = 0.005
+
+
+class _Search:
+    """A search running in a worker thread."""
+
+    def __init__(self, game, key, settings, task):
+        self.game = game
+        # (board, pieces_to_place) and (algorithm, quiescence, multi_pv) of the searched position.
+        self.key = key
+        self.settings = settings
+        self.task = task
+
+
+def parse_position(request):
+    """Return the (board string, pieces_to_place) of a request, checking both."""
+    board = request.get('board')
+    if not isinstance(board, (str, list)) or len(board) != bitboard.POINTS:
+        raise ValueError(f"board must have {bitboard.POINTS} points")
+    board = ''.join(piece if piece in ('x', '0') else bitboard.EMPTY for piece in board)
+    pieces_to_place = request.get('pieces_to_place')
+    if (not isinstance(pieces_to_place, list) or len(pieces_to_place) != 2
+            or not all(isinstance(n, int) and 0 <= n <= 9 for n in pieces_to_place)):
+        raise ValueError("pieces_to_place must be [nx, n0] with 0 <= n <= 9")
+    return board, tuple(pieces_to_place)
+
+
+class AnalysisSession:
+    """
+    Engine state shared by all requests.
+
+    Args:
+        tt_mb: Transposition table size in megabytes, 0 for none
+        tablebase: Optional tablebase.Tablebase probed by every search
+        opening_book: Optional opening_book.OpeningBook answered before searching
+        ponder: Whether to search the expected position between requests
+    """
+
+    def __init__(self, tt_mb=64, tablebase=None, opening_book=None, ponder=True):
+        self._engine = importlib.import_module('improved-nine-mens-morris')
+        self.transposition_table = TranspositionTable(tt_mb) if tt_mb else None
+        self.tablebase = tablebase
+        self.opening_book = opening_book
+        self.mcts = MonteCarloTreeSearch()
+        self.ponder = ponder
+        self._current = None
+        self._pondering = None
+        self._busy = False
+
+    def _start(self, key, settings, depth, time_limit_ms):
+        board, pieces_to_place = key
+        algorithm, quiescence, multi_pv = settings
+        game = self._engine.NineMensMorrisGame(list(board), pieces_to_place, self.transposition_table,
+                                               self.tablebase, self.opening_book, self.mcts)
+        if time_limit_ms is None:
+            if algorithm == 'MCTS' and depth is None:
+                # MCTS ignores depth: only a search with no limit at all runs until stop.
+                game.mcts_playouts = None
+            time_limit_ms = float('inf')
+        if multi_pv:
+            task = asyncio.ensure_future(asyncio.to_thread(
+                game.get_top_moves, multi_pv, depth, time_limit_ms, quiescence))
+        else:
+            task = asyncio.ensure_future(asyncio.to_thread(
+                game.get_best_move, algorithm, depth, time_limit_ms, None, quiescence))
+        return _Search(game, key, settings, task)
+
+    async def _stop_pondering(self):
+        pondering, self._pondering = self._pondering, None
+        if pondering is not None:
+            pondering.game.stop()
+            await asyncio.wait({pondering.task})
+
+    async def go(self, request):
+        """Answer a "go" request; see the module docstring."""
+        if self._busy:
+            raise ValueError("a search is already running")
+        key = parse_position(request)
+        algorithm = request.get('algorithm', 'AlphaBeta')
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm: {algorithm}")
+        multi_pv = request.get('multi_pv')
+        if multi_pv is not None and (not isinstance(multi_pv, int) or multi_pv < 1):
+            raise ValueError("multi_pv must be a positive integer")
+        settings = (algorithm, bool(request.get('quiescence', False)), multi_pv)
+        depth = request.get('depth')
+        time_limit_ms = request.get('time_limit_ms')
+        started = time.perf_counter()
+
+        self._busy = True
+        try:
+            pondering = self._pondering
+            ponder_hit = pondering is not None and pondering.key == key and pondering.settings == settings
+            if ponder_hit:
+                # The ponder search becomes the real search; stop it once it reaches the
+                # requested depth or time (for MCTS, which has no depth, the playout budget).
+                self._pondering = None
+                self._current = search = pondering
+                game = search.game
+                while not search.task.done():
+                    if depth is not None:
+                        if algorithm == 'MCTS' and not multi_pv:
+                            if game.mcts.playouts >= self._engine.NineMensMorrisGame.mcts_playouts:
+                                break
+                        elif (game.completed_depth or 0) >= depth:
+                            break
+                    if time_limit_ms is not None and (time.perf_counter() - started) * 1000 >= time_limit_ms:
+                        break
+                    await asyncio.sleep(POLL_SECONDS)
+                search.game.stop()
+            else:
+                await self._stop_pondering()
+                self._current = search = self._start(key, settings, depth, time_limit_ms)
+            best = await search.task
+        finally:
+            self._current = None
+            self._busy = False
+
+        game = search.game
+        reply = {
+            'move': None,
+            'board': key[0],
+            'pieces_to_place': list(key[1]),
+            'depth': game.completed_depth,
+            'pv': [list(move) for move in game.principal_variation],
+            'ponder': None,
+            'ponder_hit': ponder_hit,
+            'nodes': game.nodes,
+            'ms': round((time.perf_counter() - started) * 1000, 3),
+        }
+        if multi_pv:
+            reply['lines'] = [{'move': list(pv[0]), 'score': score, 'pv': [list(move) for move in pv]}
+                              for _, score, pv in best]
+            best = best[0][0] if best else None
+        if best is None:
+            return reply
+        best_board, new_pieces_to_place = best
+        x_bb, o_bb = bitboard.from_board(key[0])
+        move = bitboard.move_between(x_bb, o_bb, *bitboard.from_board(best_board))
+        reply['move'] = list(move)
+        reply['board'] = ''.join(best_board)
+        reply['pieces_to_place'] = list(new_pieces_to_place)
+
+        pv = game.principal_variation
+        if len(pv) >= 2 and pv[0] == move:
+            reply['ponder'] = list(pv[1])
+            if self.ponder:
+                position = bitboard.Position(x_bb, o_bb, key[1])
+                position.make_move(pv[0])
+                position.make_move(pv[1])
+                ponder_key = (''.join(position.board()), position.pieces_to_place)
+                self._pondering = self._start(ponder_key, settings, None, None)
+        return reply
+
+    def stop(self):
+        """
+        Stop the running search, or the ponder search when no search is running.
+
+        Returns:
+            True if a search was stopped
+        """
+        search = self._current or self._pondering
+        if search is None:
+            return False
+        search.game.stop()
+        return True
+
+    async def new_game(self):
+        await self._stop_pondering()
+        if self.transposition_table is not None:
+            self.transposition_table.clear()
+        self.mcts = MonteCarloTreeSearch()
+
+    async def close(self):
+        if self._current is not None:
+            self._current.game.stop()
+        await self._stop_pondering()
+
+
+async def serve(session, reader, send):
+    """
+    Answer the requests read from an asyncio.StreamReader until "quit" or end of input.
+
+    Returns:
+        True if the client sent "quit"
+    """
+    searches = set()
+
+    async def answer(request, coroutine):
+        try:
+            reply = await coroutine
+        except (ValueError, TypeError) as error:
+            reply = {'error': str(error)}
+        if 'id' in request:
+            reply['id'] = request['id']
+        send(reply)
+
+    quit_requested = False
+    while not quit_requested:
+        line = await reader.readline()
+        if not line:
+            break
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+        except ValueError as error:
+            send({'error': f"invalid request: {error}"})
+            continue
+        command = request.get('cmd')
+        if command == 'go':
+            # Run in the background so that "stop" is read while the search runs.
+            task = asyncio.ensure_future(answer(request, session.go(request)))
+            searches.add(task)
+            task.add_done_callback(searches.discard)
+            await asyncio.sleep(0)
+            continue
+        if command == 'stop':
+            reply = {'stopped': session.stop()}
+        elif command == 'new_game':
+            await session.new_game()
+            reply = {'ok': True}
+        elif command == 'quit':
+            quit_requested = True
+            reply = {'ok': True}
+        else:
+            reply = {'error': f"unknown command: {command}"}
+        if 'id' in request:
+            reply['id'] = request['id']
+        send(reply)
+    if quit_requested:
+        session.stop()
+    if searches:
+        await asyncio.wait(searches)
+    return quit_requested
+
+
+async def serve_stdio(session):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    def send(reply):
+        sys.stdout.write(json.dumps(reply) + '\n')
+        sys.stdout.flush()
+
+    await serve(session, reader, send)
+    await session.close()
+
+
+async def serve_tcp(session, host, port):
+    """Serve clients on host:port, all sharing the session, until a client sends "quit"."""
+    done = asyncio.Event()
+
+    async def client(reader, writer):
+        def send(reply):
+            writer.write((json.dumps(reply) + '\n').encode())
+
+        try:
+            if await serve(session, reader, send):
+                done.set()
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(client, host, port)
+    print(f"listening on {host}:{port}", file=sys.stderr)
+    async with server:
+        await done.wait()
+    await session.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nine Men's Morris analysis server (JSON lines).")
+    parser.add_argument('--port', type=int, help="serve on local TCP instead of stdin/stdout")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--tt-mb', type=int, default=64, help="transposition table size, 0 for none")
+    parser.add_argument('--tablebase', help="directory of endgame tablebases")
+    parser.add_argument('--book', help="opening book file")
+    parser.add_argument('--no-ponder', action='store_true', help="do not search while waiting for requests")
+    args = parser.parse_args(argv)
+
+    tablebase = opening_book = None
+    if args.tablebase:
+        from tablebase import Tablebase
+        tablebase = Tablebase(args.tablebase)
+    if args.book:
+        from opening_book import OpeningBook
+        opening_book = OpeningBook(args.book)
+
+    async def run():
+        session = AnalysisSession(args.tt_mb, tablebase, opening_book, not args.no_ponder)
+        if args.port is None:
+            await serve_stdio(session)
+        else:
+            await serve_tcp(session, args.host, args.port)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
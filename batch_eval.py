@@ -0,0 +1,287 @@
+"""
+Batch evaluation of many positions at once with NumPy.
+
+Positions are rows of an (N, 24) int8 array in the point order of bitboard.py,
+with 1 for an 'x' piece, -1 for a '0' piece and 0 for an empty point. The terms
+are computed with index arrays over the mills and the adjacency lists, and every
+score equals NineMensMorrisGame.evaluate for the same position (and every
+probability main2.NineMensMorris.bayesian_evaluation), with the same weights.
+"""
+
+import numpy as np
+
+from bitboard import ADJACENCY, MILLS, POINTS
+from weights import WEIGHTS
+
+# Terms of evaluate, in the column order of evaluation_features.
+FEATURES = ('pieces', 'mills', 'mobility', 'potential_mills', 'blocked')
+# Component scores of bayesian_evaluation, in the column order of bayesian_features.
+BAYESIAN_FEATURES = ('mills', 'blocking', 'pieces', 'strategic')
+# Points of main2's strategic positions (its (3, 3) is not a point of the board).
+STRATEGIC_POINTS = np.array([3, 5, 18, 20], dtype=np.intp)
+
+# (16, 3) points of each mill.
+MILL_INDEX = np.array(MILLS, dtype=np.intp)
+# (24, 4) neighbours of each point, padded with POINTS (an extra column that is never empty).
+NEIGHBOUR_INDEX = np.array([list(adj) + [POINTS] * (4 - len(adj)) for adj in ADJACENCY], dtype=np.intp)
+# (16, 24) whether point q belongs to mill m.
+MILL_POINTS = np.zeros((len(MILLS), POINTS), dtype=bool)
+for _m, _mill in enumerate(MILLS):
+    MILL_POINTS[_m, list(_mill)] = True
+MILL_FLOATS = MILL_POINTS.astype(np.float32)
+# (24, 4) the mill shared with each neighbour (every edge lies on exactly one mill),
+# padded with len(MILLS).
+NEIGHBOUR_MILL = np.array([[next(m for m, mill in enumerate(MILLS) if p in mill and q in mill)
+                            for q in ADJACENCY[p]] + [len(MILLS)] * (4 - len(ADJACENCY[p]))
+                           for p in range(POINTS)], dtype=np.intp)
+del _m, _mill
+
+CHUNK = 65536
+
+
+def boards_to_array(boards):
+    """Convert list boards ('x' / '0' / anything else) to an (N, 24) int8 array."""
+    array = np.zeros((len(boards), POINTS), dtype=np.int8)
+    for row, board in enumerate(boards):
+        for i, piece in enumerate(board[:POINTS]):
+            if piece == 'x':
+                array[row, i] = 1
+            elif piece == '0' or piece == 'o':
+                array[row, i] = -1
+    return array
+
+
+def bitboards_to_array(x_bbs, o_bbs):
+    """Convert arrays of 'x' and '0' bitboards to an (N, 24) int8 array."""
+    shifts = np.arange(POINTS, dtype=np.uint32)
+    x = (np.asarray(x_bbs, dtype=np.uint32)[:, None] >> shifts) & 1
+    o = (np.asarray(o_bbs, dtype=np.uint32)[:, None] >> shifts) & 1
+    return (x.astype(np.int8) - o.astype(np.int8))
+
+
+def _mobility(own, opp, empty, placing, potential, opp_closed):
+    """Vectorised bitboard.count_moves for one player; arguments are boolean arrays."""
+    n = own.shape[0]
+    own_count = own.sum(axis=1)
+    opp_count = opp.sum(axis=1)
+    empty_count = empty.sum(axis=1)
+
+    # A move closing a mill counts once per capturable opponent piece.
+    closed_points = (opp_closed.astype(np.float32) @ MILL_FLOATS) > 0
+    free_count = (opp & ~closed_points).sum(axis=1)
+    extra = np.where(free_count > 0, free_count, opp_count) - 1
+    extra = np.where(potential.any(axis=1) & (opp_count > 0), extra, 0)
+
+    # Number of potential mills each empty point would close.
+    closes = ((potential.astype(np.float32) @ MILL_FLOATS) * empty).astype(np.int8)
+    closing_count = (closes > 0).sum(axis=1)
+    placing_count = empty_count + closing_count * extra
+
+    # A flying piece closes every such point except those whose only potential mill
+    # runs through the piece itself.
+    single = (potential & (closes[:, MILL_INDEX[:, 0]] + closes[:, MILL_INDEX[:, 1]]
+                           + closes[:, MILL_INDEX[:, 2]] == 1))
+    flying_closing = closing_count[:, None] - (single.astype(np.float32) @ MILL_FLOATS).astype(np.int16)
+    # A sliding piece closes a mill at an empty neighbour unless the only potential mill
+    # there is the one the piece and the neighbour share.
+    padded_closes = np.concatenate([closes, np.zeros((n, 1), dtype=np.int8)], axis=1)
+    padded_potential = np.concatenate([potential, np.zeros((n, 1), dtype=bool)], axis=1)
+    neighbour_closes = padded_closes[:, NEIGHBOUR_INDEX] - padded_potential[:, NEIGHBOUR_MILL]
+    sliding_closing = (neighbour_closes > 0).sum(axis=2)
+
+    padded_empty = np.concatenate([empty, np.zeros((n, 1), dtype=bool)], axis=1)
+    neighbour_empty = padded_empty[:, NEIGHBOUR_INDEX].sum(axis=2)
+    flying = (own_count <= 3)[:, None]
+    destinations = np.where(flying, empty_count[:, None], neighbour_empty)
+    closing_destinations = np.where(flying, flying_closing, sliding_closing)
+    per_piece = destinations + closing_destinations * extra[:, None]
+    moving_count = (per_piece * own).sum(axis=1)
+
+    return np.where(placing, placing_count, moving_count)
+
+
+def _evaluate_chunk(boards, pieces_to_place):
+    """The terms of evaluate for each position, as a dict of arrays."""
+    x = boards == 1
+    o = boards == -1
+    empty = boards == 0
+    x_place = pieces_to_place[:, 0]
+    o_place = pieces_to_place[:, 1]
+
+    x_in_mills = x[:, MILL_INDEX].sum(axis=2)
+    o_in_mills = o[:, MILL_INDEX].sum(axis=2)
+    x_closed = x_in_mills == 3
+    o_closed = o_in_mills == 3
+    x_potential = (x_in_mills == 2) & (o_in_mills == 0)
+    o_potential = (o_in_mills == 2) & (x_in_mills == 0)
+
+    padded_empty = np.concatenate([empty, np.zeros((len(boards), 1), dtype=bool)], axis=1)
+    stuck = ~padded_empty[:, NEIGHBOUR_INDEX].any(axis=2)
+
+    return {
+        'x_pieces': x.sum(axis=1),
+        'o_pieces': o.sum(axis=1),
+        'x_mills': x_closed.sum(axis=1),
+        'o_mills': o_closed.sum(axis=1),
+        'x_potential_mills': x_potential.sum(axis=1),
+        'o_potential_mills': o_potential.sum(axis=1),
+        'x_blocked': (x & stuck).sum(axis=1),
+        'o_blocked': (o & stuck).sum(axis=1),
+        'x_mobility': _mobility(x, o, empty, x_place > 0, x_potential, o_closed),
+        'o_mobility': _mobility(o, x, empty, o_place > 0, o_potential, x_closed),
+    }
+
+
+def _feature_columns(terms):
+    """The differences of the terms of evaluate, in FEATURES order."""
+    return [terms['x_pieces'] - terms['o_pieces'],
+            terms['x_mills'] - terms['o_mills'],
+            terms['x_mobility'] - terms['o_mobility'],
+            terms['x_potential_mills'] - terms['o_potential_mills'],
+            terms['o_blocked'] - terms['x_blocked']]
+
+
+def _game_over(terms, pieces_to_place):
+    """1000 / -1000 where evaluate sees a won / lost game, else 0, checked in evaluate's order."""
+    x_place = pieces_to_place[:, 0]
+    o_place = pieces_to_place[:, 1]
+    return np.select(
+        [(terms['o_pieces'] <= 2) & (o_place == 0),
+         (terms['x_pieces'] <= 2) & (x_place == 0),
+         (terms['o_mobility'] == 0) & (o_place == 0),
+         (terms['x_mobility'] == 0) & (x_place == 0)],
+        [1000, -1000, 1000, -1000],
+        0)
+
+
+def _prepare(boards, pieces_to_place):
+    boards = np.asarray(boards, dtype=np.int8)
+    if boards.ndim != 2 or boards.shape[1] != POINTS:
+        raise ValueError(f"Expected an (N, {POINTS}) array of positions, got shape {boards.shape}")
+    pieces_to_place = np.broadcast_to(np.asarray(pieces_to_place, dtype=np.int16), (len(boards), 2))
+    return boards, pieces_to_place
+
+
+def _chunked(function, boards, *arrays):
+    """Apply function (returning a dict of arrays) to CHUNK rows at a time and join the results."""
+    chunks = [function(boards[start:start + CHUNK], *(array[start:start + CHUNK] for array in arrays))
+              for start in range(0, len(boards), CHUNK)]
+    if not chunks:
+        chunks = [function(boards, *arrays)]
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+
+def evaluate_batch(boards, pieces_to_place, weights=None):
+    """
+    Evaluate many positions at once.
+
+    Args:
+        boards: An (N, 24) int8 array (1 = 'x', -1 = '0', 0 = empty), see boards_to_array
+        pieces_to_place: A tuple (nx, n0) shared by all positions, or an (N, 2) array
+        weights: Weights of the terms (default: those of evaluate, see weights.py)
+
+    Returns:
+        A dict of int32 vectors of length N: x_pieces, o_pieces, x_mills, o_mills,
+        x_potential_mills, o_potential_mills, x_blocked, o_blocked, x_mobility,
+        o_mobility and score (the value NineMensMorrisGame.evaluate would return)
+    """
+    if weights is None:
+        weights = WEIGHTS['evaluate']
+    boards, pieces_to_place = _prepare(boards, pieces_to_place)
+
+    def evaluate_chunk(boards, pieces_to_place):
+        terms = _evaluate_chunk(boards, pieces_to_place)
+        score = sum(weights[name] * column for name, column in zip(FEATURES, _feature_columns(terms)))
+        game_over = _game_over(terms, pieces_to_place)
+        terms['score'] = np.where(game_over != 0, game_over, score)
+        return {name: np.asarray(values, dtype=np.int32) for name, values in terms.items()}
+
+    return _chunked(evaluate_chunk, boards, pieces_to_place)
+
+
+def evaluation_features(boards, pieces_to_place):
+    """
+    Extract the terms of evaluate for fitting its weights.
+
+    Returns:
+        A tuple (features, game_over): an (N, 5) int32 array of the term differences in
+        FEATURES order, so that evaluate is features @ weights, and an int32 vector
+        with the fixed score (1000 / -1000) of finished games and 0 elsewhere
+    """
+    boards, pieces_to_place = _prepare(boards, pieces_to_place)
+
+    def features_chunk(boards, pieces_to_place):
+        terms = _evaluate_chunk(boards, pieces_to_place)
+        return {'features': np.stack(_feature_columns(terms), axis=1).astype(np.int32),
+                'game_over': _game_over(terms, pieces_to_place).astype(np.int32)}
+
+    result = _chunked(features_chunk, boards, pieces_to_place)
+    return result['features'], result['game_over']
+
+
+def _ratio(x_count, o_count):
+    """x / (x + o), or 0.5 where both are 0."""
+    total = x_count + o_count
+    return np.where(total > 0, x_count / np.maximum(total, 1), 0.5)
+
+
+def bayesian_components(x_in_mills, o_in_mills, x_count, o_count, x_strategic, o_strategic):
+    """
+    Component scores of bayesian_evaluation from piece counts.
+
+    Args:
+        x_in_mills, o_in_mills: (N, 16) pieces of each player in each mill
+        x_count, o_count: Pieces of each player on the board, length N
+        x_strategic, o_strategic: Pieces of each player on STRATEGIC_POINTS, length N
+
+    Returns:
+        An (N, 4) float64 array in BAYESIAN_FEATURES order
+    """
+    x_mills = (x_in_mills == 3).sum(axis=1)
+    o_mills = (o_in_mills == 3).sum(axis=1)
+    mill_score = np.where((x_mills + o_mills > 0) & (x_mills > o_mills),
+                          x_mills / np.maximum(x_mills + o_mills, 1), 0.5)
+    potential_score = _ratio(((x_in_mills == 2) & (o_in_mills == 0)).sum(axis=1),
+                             ((o_in_mills == 2) & (x_in_mills == 0)).sum(axis=1))
+    blocking_score = _ratio(((x_in_mills == 1) & (o_in_mills == 2)).sum(axis=1),
+                            ((o_in_mills == 1) & (x_in_mills == 2)).sum(axis=1))
+    return np.stack([(mill_score + potential_score) / 2,
+                     blocking_score,
+                     _ratio(x_count, o_count),
+                     _ratio(x_strategic, o_strategic)],
+                    axis=1)
+
+
+def bayesian_probability(features, weights):
+    """Win probabilities from bayesian_components, summed term by term in bayesian_evaluation's order."""
+    return (weights['mills'] * features[:, 0]
+            + weights['blocking'] * features[:, 1]
+            + weights['pieces'] * features[:, 2]
+            + weights['strategic'] * features[:, 3])
+
+
+def _bayesian_chunk(boards):
+    x = boards == 1
+    o = boards == -1
+    return {'features': bayesian_components(x[:, MILL_INDEX].sum(axis=2), o[:, MILL_INDEX].sum(axis=2),
+                                            x.sum(axis=1), o.sum(axis=1),
+                                            x[:, STRATEGIC_POINTS].sum(axis=1), o[:, STRATEGIC_POINTS].sum(axis=1))}
+
+
+def bayesian_features(boards):
+    """
+    Extract the component scores of main2's bayesian_evaluation.
+
+    Returns:
+        An (N, 4) float64 array in BAYESIAN_FEATURES order, so that the win probability
+        is features @ weights
+    """
+    boards, _ = _prepare(boards, (0, 0))
+    return _chunked(_bayesian_chunk, boards)['features']
+
+
+def bayesian_batch(boards, weights=None):
+    """Win probabilities of main2's bayesian_evaluation for many positions."""
+    if weights is None:
+        weights = WEIGHTS['bayesian']
+    return bayesian_probability(bayesian_features(boards), weights)
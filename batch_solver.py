@@ -0,0 +1,258 @@
+"""
+Batch solver: stream positions from a JSONL or CSV file, solve them across a
+process pool and write one JSON line per position as soon as it is solved.
+
+    python batch_solver.py positions.jsonl --out results.jsonl --depth 6
+    python batch_solver.py positions.csv --time-limit-ms 200 --workers 8 --stats
+
+Each input position (a JSON object per line, or a CSV row under a header) has:
+
+    board            24 points in the order of bitboard.py: 'x', '0', anything else
+                     is empty ('.' reads better than ',' in CSV)
+    pieces_to_place  [nx, n0]; in CSV the columns x_to_place and o_to_place
+    algorithm, depth, time_limit_ms, quiescence
+                     optional, default to the command-line options
+    id               optional, copied to the result
+
+As in get_best_move, 'x' is to move. Each result has the input line number, the id,
+move ([frm, to, removed]), board and pieces_to_place after the move, score (from
+'x's point of view), depth, pv, nodes and ms, plus the full SearchStats with
+--stats; a position that cannot be solved, or whose search fails, gets an "error"
+instead.
+
+Each worker's transposition table is cleared before every position, so a result
+does not depend on which positions the worker solved before it. --keep-table keeps
+it between positions instead: faster on related positions, but the results then
+depend on the input order, the chunk size and the number of workers.
+
+Results are written in completion order. The input is read lazily and only a
+bounded number of positions is in flight, so memory use does not grow with the
+input size. Searches always deepen iteratively, to report the principal variation.
+"""
+
+import argparse
+import csv
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import bitboard
+from transposition import TranspositionTable
+
+ALGORITHMS = ("MinMax", "AlphaBeta", "Negamax", "DFPN", "MCTS")
+
+_engine = None
+_worker_table = None
+_worker_tablebase = None
+
+
+def _init_worker(tt_mb, tablebase_dir):
+    """Load the engine and give the process its transposition table and tablebase."""
+    global _engine, _worker_table, _worker_tablebase
+    _engine = importlib.import_module('improved-nine-mens-morris')
+    _worker_table = TranspositionTable(tt_mb) if tt_mb else None
+    if tablebase_dir:
+        from tablebase import Tablebase
+        _worker_tablebase = Tablebase(tablebase_dir)
+
+
+def read_positions(lines, csv_format=False):
+    """
+    Parse positions lazily.
+
+    Args:
+        lines: An iterable of text lines (such as an open file)
+        csv_format: True for CSV with a header row, False for JSONL
+
+    Yields:
+        Tuples (line number, dict or None, error message or None)
+    """
+    if csv_format:
+        reader = csv.DictReader(lines)
+        for row in reader:
+            record = {key: value for key, value in row.items() if value not in (None, '')}
+            try:
+                record['pieces_to_place'] = [int(record.pop('x_to_place')), int(record.pop('o_to_place'))]
+            except (KeyError, ValueError):
+                yield reader.line_num, None, "x_to_place and o_to_place must be integers"
+                continue
+            yield reader.line_num, record, None
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield number, None, f"invalid JSON: {error}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "a position must be a JSON object"
+            continue
+        yield number, record, None
+
+
+def _settings(record, defaults):
+    """Return (board, pieces_to_place, algorithm, depth, time_limit_ms, quiescence) of a record."""
+    board = record.get('board')
+    if not isinstance(board, (str, list)) or len(board) != bitboard.POINTS:
+        raise ValueError(f"board must have {bitboard.POINTS} points")
+    board = ['x' if piece == 'x' else '0' if piece in ('0', 'o') else bitboard.EMPTY for piece in board]
+    pieces_to_place = tuple(int(n) for n in record.get('pieces_to_place', ()))
+    if len(pieces_to_place) != 2 or not all(0 <= n <= 9 for n in pieces_to_place):
+        raise ValueError("pieces_to_place must be [nx, n0] with 0 <= n <= 9")
+    algorithm = record.get('algorithm', defaults['algorithm'])
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown algorithm: {algorithm}")
+    depth = record.get('depth', defaults['depth'])
+    time_limit_ms = record.get('time_limit_ms', defaults['time_limit_ms'])
+    depth = None if depth is None else int(depth)
+    time_limit_ms = None if time_limit_ms is None else float(time_limit_ms)
+    if depth is None and time_limit_ms is None:
+        raise ValueError("a position needs a depth or a time_limit_ms")
+    quiescence = record.get('quiescence', defaults['quiescence'])
+    if isinstance(quiescence, str):
+        quiescence = quiescence.lower() in ('1', 'true', 'yes')
+    return board, pieces_to_place, algorithm, depth, time_limit_ms, bool(quiescence)
+
+
+def solve_position(number, record, defaults):
+    """Solve one position in the current process; returns its result dict."""
+    result = {'line': number}
+    if 'id' in record:
+        result['id'] = record['id']
+    try:
+        board, pieces_to_place, algorithm, depth, time_limit_ms, quiescence = _settings(record, defaults)
+    except (TypeError, ValueError) as error:
+        result['error'] = str(error)
+        return result
+
+    if _worker_table is not None and not defaults['keep_table']:
+        _worker_table.clear()
+    started = time.perf_counter()
+    try:
+        game = _engine.NineMensMorrisGame(board, pieces_to_place, _worker_table, _worker_tablebase)
+        best = game.get_best_move(algorithm, depth, float('inf') if time_limit_ms is None else time_limit_ms,
+                                  quiescence=quiescence, stats=defaults['stats'])
+    except Exception as error:
+        result['error'] = f"{type(error).__name__}: {error}"
+        return result
+    result['ms'] = round((time.perf_counter() - started) * 1000, 3)
+    if best is None:
+        result['move'] = None
+    else:
+        best_board, new_pieces_to_place = best
+        x_bb, o_bb = bitboard.from_board(board)
+        result['move'] = list(bitboard.move_between(x_bb, o_bb, *bitboard.from_board(best_board)))
+        result['board'] = ''.join(best_board)
+        result['pieces_to_place'] = list(new_pieces_to_place)
+    result['score'] = game.best_score
+    result['depth'] = game.completed_depth
+    result['pv'] = [list(move) for move in game.principal_variation]
+    result['nodes'] = game.nodes
+    if defaults['stats']:
+        result['stats'] = game.search_stats.as_dict()
+    return result
+
+
+def _solve_chunk(chunk):
+    """Worker: solve a list of (line number, record, error) positions."""
+    defaults, positions = chunk
+    results = []
+    for number, record, error in positions:
+        if error is not None:
+            results.append({'line': number, 'error': error})
+        else:
+            results.append(solve_position(number, record, defaults))
+    return results
+
+
+def _chunks(positions, defaults, size):
+    chunk = []
+    for position in positions:
+        chunk.append(position)
+        if len(chunk) == size:
+            yield defaults, chunk
+            chunk = []
+    if chunk:
+        yield defaults, chunk
+
+
+def solve_stream(positions, defaults, workers=1, tt_mb=16, tablebase_dir=None, chunk_size=16, in_flight=4):
+    """
+    Solve positions from read_positions, keeping at most workers * in_flight chunks of
+    chunk_size positions submitted at a time.
+
+    Yields:
+        Result dicts, in completion order
+    """
+    chunks = _chunks(positions, defaults, chunk_size)
+    if workers <= 1:
+        _init_worker(tt_mb, tablebase_dir)
+        for chunk in chunks:
+            yield from _solve_chunk(chunk)
+        return
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(tt_mb, tablebase_dir)) as pool:
+        pending = set()
+        for chunk in chunks:
+            if len(pending) >= workers * in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(pool.submit(_solve_chunk, chunk))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve a file of Nine Men's Morris positions in parallel.")
+    parser.add_argument('input', help="JSONL or CSV file of positions, - for stdin")
+    parser.add_argument('--out', help="output JSONL file (default: stdout)")
+    parser.add_argument('--format', choices=('jsonl', 'csv'),
+                        help="input format (default: from the file extension, else jsonl)")
+    parser.add_argument('--algorithm', default='AlphaBeta', choices=ALGORITHMS)
+    parser.add_argument('--depth', type=int, help="default search depth")
+    parser.add_argument('--time-limit-ms', type=float, help="default time budget per position")
+    parser.add_argument('--quiescence', action='store_true')
+    parser.add_argument('--stats', action='store_true', help="include the full search statistics")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--tt-mb', type=int, default=16, help="transposition table size per worker")
+    parser.add_argument('--keep-table', action='store_true',
+                        help="keep the transposition table between positions (results depend on the order)")
+    parser.add_argument('--tablebase', help="directory of endgame tablebases")
+    parser.add_argument('--chunk-size', type=int, default=16, help="positions per worker task")
+    args = parser.parse_args(argv)
+
+    defaults = {'algorithm': args.algorithm, 'depth': args.depth, 'time_limit_ms': args.time_limit_ms,
+                'quiescence': args.quiescence, 'stats': args.stats, 'keep_table': args.keep_table}
+    csv_format = args.format == 'csv' or args.format is None and args.input.lower().endswith('.csv')
+    source = sys.stdin if args.input == '-' else open(args.input, newline='')
+    out = sys.stdout if args.out is None else open(args.out, 'w')
+    solved = failed = 0
+    started = time.perf_counter()
+    try:
+        positions = read_positions(source, csv_format)
+        for result in solve_stream(positions, defaults, args.workers, args.tt_mb, args.tablebase, args.chunk_size):
+            out.write(json.dumps(result) + '\n')
+            if 'error' in result:
+                failed += 1
+            else:
+                solved += 1
+            if out is not sys.stdout and not (solved + failed) % 1000:
+                out.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f"{solved} positions solved, {failed} failed in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,637 @@
+"""
+Bitboard representation of a Nine Men's Morris position.
+
+A position is stored as two 24-bit integers, one per player, where bit i is set
+when that player has a piece on point i. Points use the same numbering as the
+list boards of NineMensMorrisGame (and the `positions` order in main2.py):
+
+    0-----------1-----------2
+    |   3-------4-------5   |
+    |   |   6---7---8   |   |
+    9---10--11      12--13--14
+    |   |   15--16--17  |   |
+    |   18------19------20  |
+    21----------22----------23
+"""
+
+import random
+from collections import namedtuple
+
+MILLS = (
+    (0, 1, 2), (3, 4, 5), (6, 7, 8),
+    (9, 10, 11), (12, 13, 14), (15, 16, 17),
+    (18, 19, 20), (21, 22, 23),
+    (0, 9, 21), (3, 10, 18), (6, 11, 15),
+    (1, 4, 7), (16, 19, 22), (8, 12, 17),
+    (5, 13, 20), (2, 14, 23)
+)
+
+ADJACENCY = (
+    (1, 9), (0, 2, 4), (1, 14),
+    (4, 10), (1, 3, 5, 7), (4, 13),
+    (7, 11), (4, 6, 8), (7, 12),
+    (0, 10, 21), (3, 9, 11, 18), (6, 10, 15),
+    (8, 13, 17), (5, 12, 14, 20), (2, 13, 23),
+    (11, 16), (15, 17, 19), (12, 16),
+    (10, 19), (16, 18, 20, 22), (13, 19),
+    (9, 22), (19, 21, 23), (14, 22)
+)
+
+POINTS = 24
+FULL = (1 << POINTS) - 1
+POINT_MASKS = tuple(1 << p for p in range(POINTS))
+MILL_MASKS = tuple(sum(1 << p for p in mill) for mill in MILLS)
+# Masks of the (two) mills running through each point.
+POINT_MILLS = tuple(tuple(m for m in MILL_MASKS if m >> p & 1) for p in range(POINTS))
+# Mask of the points a piece on each point can slide to.
+NEIGHBOURS = tuple(sum(1 << q for q in ADJACENCY[p]) for p in range(POINTS))
+# Mask over mill indices (bit i is MILLS[i]) of the mills running through each point.
+POINT_MILL_INDICES = tuple(sum(1 << i for i, mill in enumerate(MILLS) if p in mill) for p in range(POINTS))
+# Points whose blocked status can change when the point changes: itself and its neighbours.
+AREA = tuple((1 << p) | NEIGHBOURS[p] for p in range(POINTS))
+
+PLAYERS = ('x', '0')
+EMPTY = ','
+
+# Draw rules: a position reached for the REPETITION_LIMIT-th time, or NO_CAPTURE_LIMIT
+# plies without a capture or a placement.
+REPETITION_LIMIT = 3
+NO_CAPTURE_LIMIT = 100
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(mask):
+        return bin(mask).count('1')
+
+
+def iter_points(mask):
+    """Yield the indices of the set bits of mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def from_board(board):
+    """Convert a list board ('x' / '0' / anything else) to an (x, o) pair of bitboards."""
+    x_bb = o_bb = 0
+    for i, piece in enumerate(board[:POINTS]):
+        if piece == 'x':
+            x_bb |= 1 << i
+        elif piece == '0' or piece == 'o':
+            o_bb |= 1 << i
+    return x_bb, o_bb
+
+
+def to_board(x_bb, o_bb):
+    """Convert an (x, o) pair of bitboards back to a list board."""
+    return ['x' if x_bb >> i & 1 else '0' if o_bb >> i & 1 else EMPTY for i in range(POINTS)]
+
+
+def is_mill(own, point):
+    """Check if the piece on point is part of a closed mill of own."""
+    for mill in POINT_MILLS[point]:
+        if own & mill == mill:
+            return True
+    return False
+
+
+def mill_points(own):
+    """Return the mask of own pieces that are part of a closed mill."""
+    closed = 0
+    for mill in MILL_MASKS:
+        if own & mill == mill:
+            closed |= mill
+    return closed
+
+
+def removable(opp):
+    """Return the mask of opp pieces that may be captured (pieces outside mills, else any)."""
+    free = opp & ~mill_points(opp)
+    return free if free else opp
+
+
+def count_mills(own):
+    """Count the closed mills of own."""
+    return sum(1 for mill in MILL_MASKS if own & mill == mill)
+
+
+def count_potential_mills(own, empty):
+    """Count the mills with two own pieces and one empty point."""
+    count = 0
+    for mill in MILL_MASKS:
+        if popcount(own & mill) == 2 and empty & mill:
+            count += 1
+    return count
+
+
+def count_blocked(own, empty):
+    """Count the own pieces with no empty neighbour."""
+    return sum(1 for p in iter_points(own) if not NEIGHBOURS[p] & empty)
+
+
+def closed_mill_indices(own):
+    """Return the mask over mill indices of the closed mills of own."""
+    return sum(1 << i for i, mill in enumerate(MILL_MASKS) if own & mill == mill)
+
+
+def potential_mill_indices(own, opp):
+    """Return the mask over mill indices of the mills with two own pieces and one empty point."""
+    indices = 0
+    for i, mill in enumerate(MILL_MASKS):
+        if popcount(own & mill) == 2 and not opp & mill:
+            indices |= 1 << i
+    return indices
+
+
+def count_moves(own, opp, placing, potential=None, opp_closed=None):
+    """
+    Count the moves generate_moves would yield, without generating them.
+
+    Args:
+        own, opp, placing: As for generate_moves
+        potential: potential_mill_indices(own, opp), if already known
+        opp_closed: closed_mill_indices(opp), if already known
+
+    A destination that closes a mill counts once per capturable opponent piece.
+    """
+    empty = FULL & ~(own | opp)
+    if potential is None:
+        potential = potential_mill_indices(own, opp)
+    extra = 0
+    if potential and opp:
+        if opp_closed is None:
+            closed_points = mill_points(opp)
+        else:
+            closed_points = 0
+            for i in iter_points(opp_closed):
+                closed_points |= MILL_MASKS[i]
+        free = opp & ~closed_points
+        extra = popcount(free if free else opp) - 1
+
+    if placing:
+        count = popcount(empty)
+        if extra:
+            completing = 0
+            for i in iter_points(potential):
+                completing |= MILL_MASKS[i]
+            count += popcount(completing & empty) * extra
+        return count
+
+    flying = popcount(own) <= 3
+    count = 0
+    for frm in iter_points(own):
+        destinations = empty if flying else NEIGHBOURS[frm] & empty
+        if not destinations:
+            continue
+        count += popcount(destinations)
+        if extra:
+            # A move closes a potential mill unless the moving piece is one of its two pieces.
+            completing = 0
+            for i in iter_points(potential):
+                mill = MILL_MASKS[i]
+                if not mill >> frm & 1:
+                    completing |= mill
+            count += popcount(destinations & completing) * extra
+    return count
+
+
+Move = namedtuple('Move', ['frm', 'to', 'removed'])
+Move.__doc__ = """A move to point `to`; frm is None for a placement and removed is None without a capture."""
+
+
+def generate_moves(own, opp, placing):
+    """
+    Lazily yield every Move of the player owning `own`.
+
+    Args:
+        own: Bitboard of the player to move
+        opp: Bitboard of the opponent
+        placing: True while the player to move still has pieces to place
+
+    A move that closes a mill is yielded once per capturable opponent piece.
+    The bitboards are read once, so the caller may make and unmake each yielded
+    move on the position it came from before asking for the next one.
+    """
+    empty = FULL & ~(own | opp)
+    captures = None
+
+    if placing:
+        for to in iter_points(empty):
+            if opp and is_mill(own | (1 << to), to):
+                if captures is None:
+                    captures = removable(opp)
+                for removed in iter_points(captures):
+                    yield Move(None, to, removed)
+            else:
+                yield Move(None, to, None)
+        return
+
+    flying = popcount(own) <= 3
+    for frm in iter_points(own):
+        rest = own ^ (1 << frm)
+        for to in iter_points(empty if flying else NEIGHBOURS[frm] & empty):
+            if opp and is_mill(rest | (1 << to), to):
+                if captures is None:
+                    captures = removable(opp)
+                for removed in iter_points(captures):
+                    yield Move(frm, to, removed)
+            else:
+                yield Move(frm, to, None)
+
+
+def apply_move(own, opp, move):
+    """Return the (new_own, new_opp) bitboards after the owner of own plays move."""
+    frm, to, removed = move
+    if frm is not None:
+        own ^= 1 << frm
+    own |= 1 << to
+    if removed is not None:
+        opp ^= 1 << removed
+    return own, opp
+
+
+def move_between(own, opp, new_own, new_opp):
+    """Return the Move of the owner of own that turns (own, opp) into (new_own, new_opp)."""
+    left, removed = own & ~new_own, opp & ~new_opp
+    return Move(left.bit_length() - 1 if left else None, (new_own & ~own).bit_length() - 1,
+                removed.bit_length() - 1 if removed else None)
+
+
+# Compact position code: 'x' bitboard (bits 0-23), '0' bitboard (24-47), pieces left to
+# place by 'x' (48-51) and '0' (52-55), and the side to move (56), in one 64-bit word.
+CODE_BYTES = 8
+
+
+def encode(x_bb, o_bb, pieces_to_place, side=0):
+    """Pack a position into its 64-bit code."""
+    return x_bb | o_bb << 24 | pieces_to_place[0] << 48 | pieces_to_place[1] << 52 | side << 56
+
+
+def decode(code):
+    """Unpack a 64-bit position code into (x_bb, o_bb, pieces_to_place, side)."""
+    return code & FULL, code >> 24 & FULL, (code >> 48 & 15, code >> 52 & 15), code >> 56 & 1
+
+
+def encode_board(board, pieces_to_place, side=0):
+    """Code of a list board ('x' / '0' or 'o' / anything else)."""
+    return encode(*from_board(board), pieces_to_place, side)
+
+
+# Move code (16 bits): frm, to and removed in 5 bits each, with NO_POINT for None.
+NO_POINT = 31
+
+
+def encode_move(move):
+    frm, to, removed = move
+    return (NO_POINT if frm is None else frm) | to << 5 | (NO_POINT if removed is None else removed) << 10
+
+
+def decode_move(code):
+    frm, removed = code & 31, code >> 10 & 31
+    return Move(None if frm == NO_POINT else frm, code >> 5 & 31, None if removed == NO_POINT else removed)
+
+
+# The points of each ring (outer, middle, inner) clockwise from the top-left corner.
+RINGS = (
+    (0, 1, 2, 14, 23, 22, 21, 9),
+    (3, 4, 5, 13, 20, 19, 18, 10),
+    (6, 7, 8, 12, 17, 16, 15, 11)
+)
+
+
+def _symmetry(rotation, reflect, swap_rings):
+    """Permutation of the points for a rotation by 90 * rotation degrees, optionally
+    preceded by a reflection and a swap of the inner and outer rings."""
+    perm = [0] * POINTS
+    for ring, points in enumerate(RINGS):
+        for k, p in enumerate(points):
+            k2 = (-k) % 8 if reflect else k
+            perm[p] = RINGS[2 - ring if swap_rings else ring][(k2 + 2 * rotation) % 8]
+    return tuple(perm)
+
+
+# The 16 symmetries of the board as point permutations (SYMMETRIES[0] is the identity):
+# bit p of a bitboard moves to bit SYMMETRIES[s][p].
+SYMMETRIES = tuple(_symmetry(rotation, reflect, swap_rings)
+                   for swap_rings in (False, True) for reflect in (False, True) for rotation in range(4))
+INVERSE_SYMMETRIES = tuple(SYMMETRIES.index(tuple(perm.index(p) for p in range(POINTS))) for perm in SYMMETRIES)
+# Per symmetry, lookup tables for the three bytes of a bitboard.
+_SYMMETRY_BYTES = tuple(
+    tuple(tuple(sum(1 << perm[8 * byte + i] for i in range(8) if value >> i & 1) for value in range(256))
+          for byte in range(3))
+    for perm in SYMMETRIES
+)
+
+
+def transform(bb, symmetry):
+    """Apply SYMMETRIES[symmetry] to a bitboard."""
+    low, mid, high = _SYMMETRY_BYTES[symmetry]
+    return low[bb & 255] | mid[bb >> 8 & 255] | high[bb >> 16]
+
+
+def canonical(x_bb, o_bb):
+    """
+    Canonical form of a pair of bitboards under the board symmetries.
+
+    Returns:
+        A tuple (x_bb, o_bb, symmetry): the smallest transformed pair, compared as
+        (x_bb, o_bb), and the index of a symmetry that maps the input onto it
+    """
+    best_x, best_o, best = x_bb, o_bb, 0
+    x_low, x_mid, x_high = x_bb & 255, x_bb >> 8 & 255, x_bb >> 16
+    for symmetry in range(1, 16):
+        low, mid, high = _SYMMETRY_BYTES[symmetry]
+        x = low[x_low] | mid[x_mid] | high[x_high]
+        if x <= best_x:
+            o = low[o_bb & 255] | mid[o_bb >> 8 & 255] | high[o_bb >> 16]
+            if x < best_x or o < best_o:
+                best_x, best_o, best = x, o, symmetry
+    return best_x, best_o, best
+
+
+def transform_move(move, symmetry):
+    """Apply SYMMETRIES[symmetry] to the points of a Move."""
+    perm = SYMMETRIES[symmetry]
+    frm, to, removed = move
+    return Move(None if frm is None else perm[frm], perm[to], None if removed is None else perm[removed])
+
+
+_MASK64 = (1 << 64) - 1
+_zobrist_rng = random.Random(0x9E3779B97F4A7C15)
+ZOBRIST_POINTS = tuple(tuple(_zobrist_rng.getrandbits(64) for _ in range(POINTS)) for _ in PLAYERS)
+ZOBRIST_SIDE = _zobrist_rng.getrandbits(64)
+ZOBRIST_TO_PLACE = tuple(tuple(_zobrist_rng.getrandbits(64) for _ in range(16)) for _ in PLAYERS)
+del _zobrist_rng
+
+
+def zobrist_points(bb, player):
+    """XOR of the Zobrist keys of the pieces in bb for player index 0 ('x') or 1 ('0')."""
+    keys = ZOBRIST_POINTS[player]
+    key = 0
+    for p in iter_points(bb):
+        key ^= keys[p]
+    return key
+
+
+def zobrist_hash(x_bb, o_bb, side, pieces_to_place):
+    """
+    Full Zobrist hash of a position.
+
+    Args:
+        x_bb, o_bb: Bitboards of 'x' and '0'
+        side: 0 when 'x' is to move, 1 when '0' is to move
+        pieces_to_place: A tuple (nx, n0)
+    """
+    key = zobrist_points(x_bb, 0) ^ zobrist_points(o_bb, 1)
+    key ^= ZOBRIST_TO_PLACE[0][pieces_to_place[0]] ^ ZOBRIST_TO_PLACE[1][pieces_to_place[1]]
+    if side:
+        key ^= ZOBRIST_SIDE
+    return key
+
+
+class Position:
+    """
+    Mutable search position: both bitboards, pieces left to place, side to move
+    (0 for 'x', 1 for '0') and the incrementally updated Zobrist key.
+
+    make_move / unmake_move change the position in place, so a whole search can
+    run on a single Position without copying boards. They also keep the evaluation
+    terms up to date per player: closed mills and potential mills (as masks over
+    mill indices) and the number of blocked pieces. Only the mills through the
+    changed points and the blocked status around them are recomputed.
+
+    They also keep the history needed by the draw rules: quiet_plies, the number of
+    moves since the last capture or placement, and seen, the number of times each
+    key occurred since then. Only those positions can occur again (captures and
+    placements cannot be undone), so seen only counts the positions left by quiet
+    moves, and a repetition is a single dict lookup. A position created with
+    track_repetitions=False (for callers without draw rules, such as perft) keeps
+    seen as None and skips that bookkeeping.
+    """
+
+    __slots__ = ('bb', 'to_place', 'side', 'key', 'closed', 'potential', 'blocked', 'quiet_plies', 'seen', '_undo')
+
+    def __init__(self, x_bb, o_bb, pieces_to_place, side=0, track_repetitions=True):
+        self.bb = [x_bb, o_bb]
+        self.to_place = list(pieces_to_place)
+        self.side = side
+        self.key = zobrist_hash(x_bb, o_bb, side, pieces_to_place)
+        empty = FULL & ~(x_bb | o_bb)
+        self.closed = [closed_mill_indices(x_bb), closed_mill_indices(o_bb)]
+        self.potential = [potential_mill_indices(x_bb, o_bb), potential_mill_indices(o_bb, x_bb)]
+        self.blocked = [count_blocked(x_bb, empty), count_blocked(o_bb, empty)]
+        self.quiet_plies = 0
+        self.seen = {} if track_repetitions else None
+        self._undo = []
+
+    @classmethod
+    def from_board(cls, board, pieces_to_place, side=0):
+        """Create a position from a list board."""
+        x_bb, o_bb = from_board(board)
+        return cls(x_bb, o_bb, pieces_to_place, side)
+
+    @classmethod
+    def from_code(cls, code):
+        """Create a position from its 64-bit code (see encode)."""
+        x_bb, o_bb, pieces_to_place, side = decode(code)
+        return cls(x_bb, o_bb, pieces_to_place, side)
+
+    def code(self):
+        """The 64-bit code of the position (see encode)."""
+        return encode(self.bb[0], self.bb[1], self.to_place, self.side)
+
+    def copy(self):
+        """Return an independent copy of the position, with its history."""
+        position = Position(self.bb[0], self.bb[1], self.to_place, self.side)
+        position.quiet_plies = self.quiet_plies
+        position.seen = None if self.seen is None else dict(self.seen)
+        return position
+
+    def set_history(self, positions):
+        """
+        Set the history of the draw rules from the earlier positions of the game.
+
+        Args:
+            positions: (x_bb, o_bb, pieces_to_place) of the earlier positions, oldest
+                       first; the side to move alternates back from this position's
+        """
+        seen = None if self.seen is None else {}
+        self.seen = seen
+        self.quiet_plies = 0
+        material = (popcount(self.bb[0]), popcount(self.bb[1]), self.pieces_to_place)
+        for back, (x_bb, o_bb, pieces_to_place) in enumerate(reversed(positions), 1):
+            if (popcount(x_bb), popcount(o_bb), tuple(pieces_to_place)) != material:
+                break
+            if seen is not None:
+                key = zobrist_hash(x_bb, o_bb, self.side ^ (back & 1), pieces_to_place)
+                seen[key] = seen.get(key, 0) + 1
+            self.quiet_plies = back
+
+    def repetitions(self):
+        """Number of times the position occurred before in the history (0 when not tracked)."""
+        return self.seen.get(self.key, 0) if self.quiet_plies and self.seen is not None else 0
+
+    def is_draw(self, repetition_limit=REPETITION_LIMIT, no_capture_limit=NO_CAPTURE_LIMIT):
+        """Whether a draw rule ends the game here; a limit of None turns its rule off."""
+        if not self.quiet_plies:
+            return False
+        if repetition_limit is not None and self.repetitions() + 1 >= repetition_limit:
+            return True
+        return no_capture_limit is not None and self.quiet_plies >= no_capture_limit
+
+    @property
+    def pieces_to_place(self):
+        """Pieces left to place as a tuple (nx, n0)."""
+        return tuple(self.to_place)
+
+    def board(self):
+        """Return the position as a list board."""
+        return to_board(self.bb[0], self.bb[1])
+
+    def set_side(self, side):
+        """Set the side to move, keeping the key in sync."""
+        if side != self.side:
+            self.side = side
+            self.key ^= ZOBRIST_SIDE
+
+    def canonical_key(self):
+        """
+        Return (key, symmetry): a key shared by every position symmetric to this one,
+        and the index of a symmetry mapping this position onto the canonical one.
+
+        The key packs the canonical bitboards, pieces to place and side to move (57
+        bits) and scrambles them with a bijective mix, so unlike the Zobrist key it
+        never collides.
+        """
+        x_bb, o_bb, symmetry = canonical(self.bb[0], self.bb[1])
+        key = (x_bb << POINTS | o_bb) << 9 | self.to_place[0] << 5 | self.to_place[1] << 1 | self.side
+        key = (key ^ key >> 30) * 0xBF58476D1CE4E5B9 & _MASK64
+        key = (key ^ key >> 27) * 0x94D049BB133111EB & _MASK64
+        return key ^ key >> 31, symmetry
+
+    def moves(self, side=None):
+        """Lazily yield the Moves of side (default: the side to move)."""
+        if side is None:
+            side = self.side
+        return generate_moves(self.bb[side], self.bb[side ^ 1], self.to_place[side] > 0)
+
+    def count_moves(self, side):
+        """Count the Moves of side without generating them."""
+        return count_moves(self.bb[side], self.bb[side ^ 1], self.to_place[side] > 0,
+                           self.potential[side], self.closed[side ^ 1])
+
+    def _update_terms(self, mills, area, x_bb, o_bb):
+        """Recompute the evaluation terms for the given mill indices and blocked area after a change."""
+        closed = self.closed
+        potential = self.potential
+        blocked = self.blocked
+        new_x, new_o = self.bb
+        empty = FULL & ~(x_bb | o_bb)
+        new_empty = FULL & ~(new_x | new_o)
+        for p in iter_points(x_bb & area):
+            if not NEIGHBOURS[p] & empty:
+                blocked[0] -= 1
+        for p in iter_points(o_bb & area):
+            if not NEIGHBOURS[p] & empty:
+                blocked[1] -= 1
+        for p in iter_points(new_x & area):
+            if not NEIGHBOURS[p] & new_empty:
+                blocked[0] += 1
+        for p in iter_points(new_o & area):
+            if not NEIGHBOURS[p] & new_empty:
+                blocked[1] += 1
+        closed_x, closed_o = closed
+        potential_x, potential_o = potential
+        for i in iter_points(mills):
+            mill = MILL_MASKS[i]
+            bit = 1 << i
+            closed_x &= ~bit
+            closed_o &= ~bit
+            potential_x &= ~bit
+            potential_o &= ~bit
+            x_count = popcount(new_x & mill)
+            o_count = popcount(new_o & mill)
+            if x_count == 3:
+                closed_x |= bit
+            elif o_count == 3:
+                closed_o |= bit
+            elif x_count == 2 and not o_count:
+                potential_x |= bit
+            elif o_count == 2 and not x_count:
+                potential_o |= bit
+        closed[0] = closed_x
+        closed[1] = closed_o
+        potential[0] = potential_x
+        potential[1] = potential_o
+
+    def make_move(self, move):
+        """Play move for the side to move and pass the turn."""
+        frm, to, removed = move
+        side = self.side
+        bb = self.bb
+        x_bb, o_bb = bb
+        self._undo.append((self.closed[0], self.closed[1], self.potential[0], self.potential[1],
+                           self.blocked[0], self.blocked[1], self.quiet_plies))
+        own_keys = ZOBRIST_POINTS[side]
+        key = self.key
+        if frm is None or removed is not None:
+            self.quiet_plies = 0
+        else:
+            seen = self.seen
+            if seen is not None:
+                seen[key] = seen.get(key, 0) + 1
+            self.quiet_plies += 1
+        key ^= ZOBRIST_SIDE ^ own_keys[to]
+        mills = POINT_MILL_INDICES[to]
+        area = AREA[to]
+        if frm is None:
+            left = self.to_place[side]
+            key ^= ZOBRIST_TO_PLACE[side][left] ^ ZOBRIST_TO_PLACE[side][left - 1]
+            self.to_place[side] = left - 1
+            bb[side] |= 1 << to
+        else:
+            key ^= own_keys[frm]
+            bb[side] ^= (1 << frm) | (1 << to)
+            mills |= POINT_MILL_INDICES[frm]
+            area |= AREA[frm]
+        if removed is not None:
+            bb[side ^ 1] ^= 1 << removed
+            key ^= ZOBRIST_POINTS[side ^ 1][removed]
+            mills |= POINT_MILL_INDICES[removed]
+            area |= AREA[removed]
+        self.key = key
+        self.side = side ^ 1
+        self._update_terms(mills, area, x_bb, o_bb)
+
+    def unmake_move(self, move):
+        """Take back move, which must be the last move made."""
+        frm, to, removed = move
+        side = self.side ^ 1
+        bb = self.bb
+        own_keys = ZOBRIST_POINTS[side]
+        key = self.key ^ ZOBRIST_SIDE ^ own_keys[to]
+        if frm is None:
+            left = self.to_place[side]
+            key ^= ZOBRIST_TO_PLACE[side][left] ^ ZOBRIST_TO_PLACE[side][left + 1]
+            self.to_place[side] = left + 1
+            bb[side] ^= 1 << to
+        else:
+            key ^= own_keys[frm]
+            bb[side] ^= (1 << frm) | (1 << to)
+        if removed is not None:
+            bb[side ^ 1] |= 1 << removed
+            key ^= ZOBRIST_POINTS[side ^ 1][removed]
+        self.key = key
+        self.side = side
+        if frm is not None and removed is None:
+            seen = self.seen
+            if seen is not None:
+                count = seen[key] - 1
+                if count:
+                    seen[key] = count
+                else:
+                    del seen[key]
+        (self.closed[0], self.closed[1], self.potential[0], self.potential[1],
+         self.blocked[0], self.blocked[1], self.quiet_plies) = self._undo.pop()
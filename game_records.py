@@ -0,0 +1,293 @@
+"""
+Binary game records: a compact, append-only file of games with sequential and
+random access.
+
+    python game_records.py convert match.jsonl games.nmr     # from match_runner results
+    python game_records.py info games.nmr
+    python game_records.py show games.nmr 17                 # one game as JSON
+
+A file starts with the 8-byte header MAGIC + version. Each game follows as
+
+    start   8 bytes   position code of the first position (bitboard.encode)
+    plies   2 bytes   number of moves
+    result  1 byte    0, 1 or 2 for a loss, draw or win of 'x'; 255 if unknown
+    moves   2 bytes per move (bitboard.encode_move)
+
+all little-endian, so a position of a logged game costs two bytes. The byte offset
+of every game is appended to an index file next to it (path + '.idx', 8 bytes per
+game); a reader without a usable index rebuilds it by hopping over the game
+headers. A game cut short by an interrupted writer is ignored.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+from bitboard import Move, apply_move, decode, decode_move, encode, encode_move
+
+MAGIC = b'NMMR'
+VERSION = 1
+HEADER = struct.Struct('<4sB3x')
+GAME = struct.Struct('<QHB')
+OFFSET = struct.Struct('<Q')
+NO_RESULT = 255
+
+
+class _MoveCodes(dict):
+    """Decoded bitboard.Moves by move code, filled in as codes are met."""
+
+    def __missing__(self, code):
+        move = self[code] = decode_move(code)
+        return move
+
+
+_moves = _MoveCodes()
+
+GameRecord = namedtuple('GameRecord', ['start', 'moves', 'result'])
+GameRecord.__doc__ = """A game: start position code, list of bitboard.Moves and score of 'x' (None if unknown)."""
+
+
+def index_path(path):
+    return path + '.idx'
+
+
+def _result_code(result):
+    return NO_RESULT if result is None else int(round(result * 2))
+
+
+def _scan(buffer, start=HEADER.size):
+    """Offsets of the complete games of a record file buffer, from the game at start on."""
+    offsets = array('Q')
+    size = len(buffer)
+    offset = start
+    while offset + GAME.size <= size:
+        plies = GAME.unpack_from(buffer, offset)[1]
+        end = offset + GAME.size + 2 * plies
+        if end > size:
+            break
+        offsets.append(offset)
+        offset = end
+    return offsets
+
+
+def _check_header(header, path):
+    if len(header) < HEADER.size:
+        raise ValueError(f"{path} is not a game record file")
+    magic, version = HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a game record file")
+    if version != VERSION:
+        raise ValueError(f"{path} has version {version}, expected {VERSION}")
+
+
+class GameRecordWriter:
+    """
+    Append games to a record file and its index.
+
+    Args:
+        path: Record file; created if missing
+        append: Keep the games already in the file (else the file is replaced)
+    """
+
+    def __init__(self, path, append=True):
+        self.path = path
+        if append and os.path.exists(path) and os.path.getsize(path):
+            with GameRecordReader(path) as reader:
+                offsets = reader.offsets
+                end = reader.end
+            # Drop a game cut short by an interrupted writer, and rewrite the index.
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+            if sys.byteorder == 'big':
+                offsets.byteswap()
+            with open(index_path(path), 'wb') as f:
+                offsets.tofile(f)
+            self.games = len(offsets)
+            self._file = open(path, 'ab')
+        else:
+            self._file = open(path, 'wb')
+            self._file.write(HEADER.pack(MAGIC, VERSION))
+            self.games = 0
+            with open(index_path(path), 'wb'):
+                pass
+        self._index = open(index_path(path), 'ab')
+        self._offset = self._file.tell()
+
+    def write(self, start, moves, result=None):
+        """
+        Append a game.
+
+        Args:
+            start: Position code of the first position
+            moves: The moves played, as bitboard.Moves or (frm, to, removed) sequences
+            result: Score of 'x' (1, 0.5 or 0), or None
+
+        Returns:
+            The index of the game in the file
+        """
+        codes = array('H', (encode_move(move) for move in moves))
+        if sys.byteorder == 'big':
+            codes.byteswap()
+        self._file.write(GAME.pack(start, len(codes), _result_code(result)))
+        self._file.write(codes.tobytes())
+        self._index.write(OFFSET.pack(self._offset))
+        self._offset += GAME.size + 2 * len(codes)
+        self.games += 1
+        return self.games - 1
+
+    def flush(self):
+        self._file.flush()
+        self._index.flush()
+
+    def close(self):
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class GameRecordReader:
+    """
+    Read a record file through a memory map: len(reader), reader[i] (random access)
+    and iteration (sequential, in file order) give GameRecords.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.getsize(path) < HEADER.size:
+            raise ValueError(f"{path} is not a game record file")
+        self._file = open(path, 'rb')
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        _check_header(self._buffer[:HEADER.size], path)
+        self.offsets = self._load_index()
+
+    def _load_index(self):
+        """Offsets from the index file if it matches the record file, else from a scan."""
+        buffer = self._buffer
+        offsets = array('Q')
+        try:
+            with open(index_path(self.path), 'rb') as f:
+                offsets.frombytes(f.read())
+        except (OSError, ValueError):
+            return _scan(buffer)
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        if not offsets:
+            return _scan(buffer)
+        # Keep the indexed games that fit in the file, then scan whatever follows them.
+        last = offsets[-1]
+        if last + GAME.size > len(buffer) or last + GAME.size + 2 * GAME.unpack_from(buffer, last)[1] > len(buffer):
+            return _scan(buffer)
+        offsets.extend(_scan(buffer, self._end_of(last)))
+        return offsets
+
+    def _end_of(self, offset):
+        return offset + GAME.size + 2 * GAME.unpack_from(self._buffer, offset)[1]
+
+    @property
+    def end(self):
+        """Byte offset just after the last complete game."""
+        return self._end_of(self.offsets[-1]) if self.offsets else HEADER.size
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _read(self, offset):
+        start, plies, result = GAME.unpack_from(self._buffer, offset)
+        codes = array('H')
+        codes.frombytes(self._buffer[offset + GAME.size:offset + GAME.size + 2 * plies])
+        if sys.byteorder == 'big':
+            codes.byteswap()
+        return GameRecord(start, [_moves[code] for code in codes],
+                          None if result == NO_RESULT else result / 2)
+
+    def __getitem__(self, index):
+        return self._read(self.offsets[index])
+
+    def __iter__(self):
+        for offset in self.offsets:
+            yield self._read(offset)
+
+    def close(self):
+        self._buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def replay(record):
+    """Yield the position code of every position of a GameRecord, the start included."""
+    x_bb, o_bb, pieces_to_place, side = decode(record.start)
+    to_place = list(pieces_to_place)
+    yield record.start
+    for move in record.moves:
+        if side == 0:
+            x_bb, o_bb = apply_move(x_bb, o_bb, move)
+        else:
+            o_bb, x_bb = apply_move(o_bb, x_bb, move)
+        if move.frm is None:
+            to_place[side] -= 1
+        side ^= 1
+        yield encode(x_bb, o_bb, to_place, side)
+
+
+def convert_match(lines, writer):
+    """Append the games of match_runner result lines to a GameRecordWriter; returns the count."""
+    count = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            game = json.loads(line)
+        except ValueError:
+            continue
+        writer.write(encode(0, 0, (9, 9)), [Move(*move) for move in game['opening'] + game['moves']],
+                     game['score_x'])
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Binary Nine Men's Morris game records.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help="append match_runner results to a record file")
+    convert.add_argument('input', help="match_runner JSONL results")
+    convert.add_argument('output', help="record file")
+    info = commands.add_parser('info', help="count the games and positions of a record file")
+    info.add_argument('path')
+    show = commands.add_parser('show', help="print a game as JSON")
+    show.add_argument('path')
+    show.add_argument('game', type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        with open(args.input) as f, GameRecordWriter(args.output) as writer:
+            count = convert_match(f, writer)
+        print(f"{count} games written, {writer.games} in {args.output}", file=sys.stderr)
+    elif args.command == 'info':
+        with GameRecordReader(args.path) as reader:
+            positions = sum(len(record.moves) + 1 for record in reader)
+            print(f"{len(reader)} games, {positions} positions, {os.path.getsize(args.path)} bytes")
+    else:
+        with GameRecordReader(args.path) as reader:
+            record = reader[args.game]
+        print(json.dumps({'start': record.start, 'position': list(decode(record.start)),
+                          'moves': [list(move) for move in record.moves], 'score_x': record.result}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,72 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import bitboard
+from bitboard import FULL, popcount
+from mcts import MonteCarloTreeSearch
+from proof_number import PROVEN, ProofNumberSearch, ProofTable
+from search_stats import SearchStats
+from tablebase import Tablebase, is_decisive
+from transposition import ENTRY_BYTES, EXACT, LOWER, UPPER, TranspositionTable
+from weights import WEIGHTS
+
+
+MILLS = [list(mill) for mill in bitboard.MILLS]
+
+ADJACENCY = {point: list(neighbours) for point, neighbours in enumerate(bitboard.ADJACENCY)}
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget of get_best_move runs out."""
+
+
+class _SearchState:
+    """Data shared by all nodes of one iterative deepening search."""
+    
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.root_depth = 0
+        self.root_best = None
+        self.pv = defaultdict(list)
+        self.prev_pv = []
+        self.killers = defaultdict(list)
+        self.history = {}
+
+
 class NineMensMorrisGame:
-    def __init__(self, board_state, pieces_to_place):
+    mills = MILLS
+    adjacency = ADJACENCY
+    # Weights of the terms of evaluate, from weights.json (see weights.py).
+    weights = WEIGHTS['evaluate']
+    # Nodes the quiescence search may visit below each leaf of the main search.
+    quiescence_nodes = 200
+    # Negamax: half-width of the aspiration window around the previous iteration's score,
+    # and the depth and move number from which quiet moves are searched one ply shallower.
+    aspiration_window = 10
+    reduction_depth = 3
+    reduction_move = 3
+    # Node budget of the "DFPN" proof-number search, and the size of its table in megabytes.
+    proof_nodes = 100000
+    proof_table_mb = 16
+    # "DFPN" without a proven win, depth or time limit: depth of the "AlphaBeta" fallback.
+    proof_fallback_depth = 3
+    # "MCTS": playouts per move without a (finite) time limit; None searches until stop().
+    mcts_playouts = 2000
+    # Size in megabytes of the transposition table get_top_moves uses when the game has none.
+    multi_pv_table_mb = 16
+    # Draw rules (see is_draw): the repetition_limit-th occurrence of a position, and
+    # no_capture_limit plies without a capture or a placement; None turns a rule off.
+    # While repetitions count as draws, the search scores every position repeated on its
+    # line as a draw, which cuts cycles of moves back and forth. A game takes its rules
+    # when it is built (see draw_rules in __init__); without a repetition rule its
+    # position does not track repetitions at all.
+    repetition_limit = bitboard.REPETITION_LIMIT
+    no_capture_limit = bitboard.NO_CAPTURE_LIMIT
+    
+    def __init__(self, board_state, pieces_to_place, transposition_table=None, tablebase=None, opening_book=None,
+                 mcts=None, history=None, draw_rules=None):
         """
         Initialize the game with the given board state and pieces to place.
         
@@ -7,72 +74,138 @@ class NineMensMorrisGame:
             board_state: A list representing the current state of the board
             pieces_to_place: A tuple (nx, n0) where nx is the number of 'x' pieces to place
                             and n0 is the number of '0' pieces to place
+            transposition_table: Optional transposition.TranspositionTable shared by the searches
+                                 of this game (both "MinMax" and "AlphaBeta")
+            tablebase: Optional tablebase.Tablebase probed at the leaves of the search
+            opening_book: Optional opening_book.OpeningBook answered before searching
+            mcts: Optional mcts.MonteCarloTreeSearch used by "MCTS"; pass the same one for
+                  every move of a game to reuse the subtree of the moves played
+            history: Optional list of the earlier positions of the game as (board,
+                     pieces_to_place) tuples, oldest first and oriented like board_state
+                     ('0' was to move in the last one), for the draw rules
+            draw_rules: Optional (repetition_limit, no_capture_limit) replacing the class
+                        defaults for this game
         """
-        self.board = board_state
-        self.pieces_to_place = pieces_to_place
-        
-        self.mills = [
-            [0, 1, 2], [3, 4, 5], [6, 7, 8],
-            [9, 10, 11], [12, 13, 14], [15, 16, 17],
-            [18, 19, 20], [21, 22, 23],
-            [0, 9, 21], [3, 10, 18], [6, 11, 15],
-            [1, 4, 7], [16, 19, 22], [8, 12, 17],
-            [5, 13, 20], [2, 14, 23]
-        ]
-            
-        self.adjacency = {
-            0: [1, 9],
-            1: [0, 2, 4],
-            2: [1, 14],
-            3: [4, 10],
-            4: [1, 3, 5, 7],
-            5: [4, 13],
-            6: [7, 11],
-            7: [4, 6, 8],
-            8: [7, 12],
-            9: [0, 10, 21],
-            10: [3, 9, 11, 18],
-            11: [6, 10, 15],
-            12: [8, 13, 17],
-            13: [5, 12, 14, 20],
-            14: [2, 13, 23],
-            15: [11, 16],
-            16: [15, 17, 19],
-            17: [12, 16],
-            18: [10, 19],
-            19: [16, 18, 20, 22],
-            20: [13, 19],
-            21: [9, 22],
-            22: [19, 21, 23],
-            23: [14, 22]
-        }
+        if draw_rules is not None:
+            self.repetition_limit, self.no_capture_limit = draw_rules
+        self._board = board_state
+        x_bb, o_bb = bitboard.from_board(board_state)
+        self.position = bitboard.Position(x_bb, o_bb, pieces_to_place,
+                                          track_repetitions=self.repetition_limit is not None)
+        if history:
+            self.position.set_history([bitboard.from_board(board) + (tuple(to_place),)
+                                       for board, to_place in history])
+        self.transposition_table = transposition_table
+        self.tablebase = tablebase
+        self.opening_book = opening_book
+        self.mcts = mcts
+        self.quiescence = False
+        self._quiescence_budget = 0
+        self._search = None
+        self._stopped = False
+        # Draws by repetition on the line or by the no-capture limit met by the searches.
+        # They depend on the moves that led to a position and on its quiet_plies, which
+        # the transposition table keys ignore, so a node whose subtree met one (the count
+        # grew while it was searched) is not stored.
+        self._path_draws = 0
+        self.completed_depth = None
+        # Score of the last get_best_move from 'x's point of view (of its deepest finished
+        # iteration when searching iteratively), or None for an opening book move or "MCTS".
+        self.best_score = None
+        # Moves of the principal variation of the last finished iterative deepening
+        # iteration (for "MCTS", the most visited line), from the root position.
+        self.principal_variation = []
+        # Nodes visited by the searches of this game (reset by get_best_move).
+        self.nodes = 0
+        # SearchStats of the last get_best_move(..., stats=True) call, and the one being
+        # filled in while such a search runs.
+        self.search_stats = None
+        self._stats = None
+        # Result of the last proof-number search: proof_number.PROVEN, DISPROVEN or UNKNOWN.
+        self.proof_result = None
+
+    @classmethod
+    def from_code(cls, code, *args, **kwargs):
+        """
+        Create a game from a 64-bit position code (see bitboard.encode); the other
+        arguments are those of the constructor after pieces_to_place.
+        """
+        x_bb, o_bb, pieces_to_place, _ = bitboard.decode(code)
+        return cls(bitboard.to_board(x_bb, o_bb), pieces_to_place, *args, **kwargs)
+
+    def to_code(self):
+        """The position as a 64-bit code (see bitboard.encode), with 'x' to move."""
+        position = self.position
+        return bitboard.encode(position.bb[0], position.bb[1], position.to_place)
+
+    @property
+    def board(self):
+        """The board as a list of 'x' / '0' / ',' strings, built on demand from the position."""
+        if self._board is None:
+            self._board = self.position.board()
+        return self._board
+
+    @property
+    def pieces_to_place(self):
+        """A tuple (nx, n0) of the pieces each player still has to place."""
+        return self.position.pieces_to_place
+
+    def make_move(self, move):
+        """Play a bitboard.Move for the side to move, in place."""
+        self.position.make_move(move)
+        self._board = None
+
+    def unmake_move(self, move):
+        """Take back the last move played with make_move."""
+        self.position.unmake_move(move)
+        self._board = None
+
+    def is_draw(self):
+        """Whether the game is drawn by repetition or by the no-capture limit, with 'x' to move."""
+        self.position.set_side(0)
+        return self.position.is_draw(self.repetition_limit, self.no_capture_limit)
+
+    def _is_search_draw(self):
+        """Whether a position below the root is scored as a draw: repeated on the line, or past the limit."""
+        position = self.position
+        if self.repetition_limit is not None and position.key in position.seen:
+            return True
+        return self.no_capture_limit is not None and position.quiet_plies >= self.no_capture_limit
+
+    def _bitboards(self, player):
+        """Return the (own, opponent) bitboards for the given player."""
+        x_bb, o_bb = self.position.bb
+        if player == 'x':
+            return x_bb, o_bb
+        return o_bb, x_bb
+
+    def _empty(self):
+        """Return the bitboard of empty points."""
+        x_bb, o_bb = self.position.bb
+        return FULL & ~(x_bb | o_bb)
 
     def get_empty_positions(self):
         """Return a list of empty positions on the board."""
-        return [i for i, piece in enumerate(self.board) if piece == ',']
+        return list(bitboard.iter_points(self._empty()))
     
     def get_player_positions(self, player):
         """Return a list of positions occupied by the given player."""
-        return [i for i, piece in enumerate(self.board) if piece == player]
+        return list(bitboard.iter_points(self._bitboards(player)[0]))
     
     def is_mill(self, position, player):
         """Check if placing a piece at the given position forms a mill."""
-        for mill in self.mills:
-            if position in mill and all(self.board[pos] == player for pos in mill):
-                return True
-        return False
+        return bitboard.is_mill(self._bitboards(player)[0], position)
     
     def can_move(self, position, player):
         """Check if a piece at the given position can move."""
-        for adj in self.adjacency[position]:
-            if self.board[adj] == ',':
-                return True
-        return False
+        return bool(bitboard.NEIGHBOURS[position] & self._empty())
     
     def get_possible_moves(self, player, opponent):
         """
         Get all possible moves for the current player.
         
+        A move that closes a mill is listed once per opponent piece it may capture.
+        
         Args:
             player: The current player ('x' or '0')
             opponent: The opponent player ('0' or 'x')
@@ -80,132 +213,75 @@ class NineMensMorrisGame:
         Returns:
             A list of possible new board states
         """
-        possible_moves = []
-        
-        if player == 'x' and self.pieces_to_place[0] > 0 or player == '0' and self.pieces_to_place[1] > 0:
-            empty_positions = self.get_empty_positions()
-            
-            for pos in empty_positions:
-                new_board = self.board.copy()
-                new_board[pos] = player
-                
-                new_pieces_to_place = list(self.pieces_to_place)
-                if player == 'x':
-                    new_pieces_to_place[0] -= 1
-                else:
-                    new_pieces_to_place[1] -= 1
-                
-                if self.is_mill(pos, player):
-                    opponent_positions = self.get_player_positions(opponent)
-                    for opp_pos in opponent_positions:
-                        if not self.is_mill(opp_pos, opponent) or all(self.is_mill(p, opponent) for p in opponent_positions):
-                            new_board_after_remove = new_board.copy()
-                            new_board_after_remove[opp_pos] = ','
-                            possible_moves.append((new_board_after_remove, tuple(new_pieces_to_place)))
-                else:
-                    possible_moves.append((new_board, tuple(new_pieces_to_place)))
-        
-        else:
-            player_positions = self.get_player_positions(player)
-            
-            if len(player_positions) <= 3:
-                for pos in player_positions:
-                    for empty_pos in self.get_empty_positions():
-                        new_board = self.board.copy()
-                        new_board[pos] = ','
-                        new_board[empty_pos] = player
-                        
-                        if self.is_mill(empty_pos, player):
-                            opponent_positions = self.get_player_positions(opponent)
-                            for opp_pos in opponent_positions:
-                                if not self.is_mill(opp_pos, opponent) or all(self.is_mill(p, opponent) for p in opponent_positions):
-                                    new_board_after_remove = new_board.copy()
-                                    new_board_after_remove[opp_pos] = ','
-                                    possible_moves.append((new_board_after_remove, self.pieces_to_place))
-                        else:
-                            possible_moves.append((new_board, self.pieces_to_place))
-            else:
-                for pos in player_positions:
-                    for adj_pos in self.adjacency[pos]:
-                        if self.board[adj_pos] == ',':
-                            new_board = self.board.copy()
-                            new_board[pos] = ','
-                            new_board[adj_pos] = player
-                            
-                            if self.is_mill(adj_pos, player):
-                                opponent_positions = self.get_player_positions(opponent)
-                                for opp_pos in opponent_positions:
-                                    if not self.is_mill(opp_pos, opponent) or all(self.is_mill(p, opponent) for p in opponent_positions):
-                                        new_board_after_remove = new_board.copy()
-                                        new_board_after_remove[opp_pos] = ','
-                                        possible_moves.append((new_board_after_remove, self.pieces_to_place))
-                            else:
-                                possible_moves.append((new_board, self.pieces_to_place))
+        own, opp = self._bitboards(player)
+        new_pieces_to_place = list(self.pieces_to_place)
+        side = 0 if player == 'x' else 1
+        placing = new_pieces_to_place[side] > 0
+        if placing:
+            new_pieces_to_place[side] -= 1
+        new_pieces_to_place = tuple(new_pieces_to_place)
         
+        possible_moves = []
+        for move in bitboard.generate_moves(own, opp, placing):
+            new_own, new_opp = bitboard.apply_move(own, opp, move)
+            if side:
+                new_own, new_opp = new_opp, new_own
+            possible_moves.append((bitboard.to_board(new_own, new_opp), new_pieces_to_place))
         return possible_moves
     
     def evaluate(self):
         """
         Heuristic evaluation function for the current board state.
         A positive value favors 'x' (MAX), a negative value favors '0' (MIN).
-        """
-        x_pieces = self.board.count('x')
-        o_pieces = self.board.count('0')
-        
-        x_total = x_pieces + self.pieces_to_place[0]
-        o_total = o_pieces + self.pieces_to_place[1]
-        
-        piece_difference = 3 * (x_pieces - o_pieces)
         
-        x_mills = 0
-        o_mills = 0
-        counted_mills = set()
-        
-        for mill in self.mills:
-            mill_str = ''.join(self.board[pos] for pos in mill)
-            mill_key = tuple(sorted(mill))
-            
-            if mill_key not in counted_mills:
-                if mill_str == 'xxx':
-                    x_mills += 1
-                    counted_mills.add(mill_key)
-                elif mill_str == '000':
-                    o_mills += 1
-                    counted_mills.add(mill_key)
-        
-        mill_difference = 6 * (x_mills - o_mills)
-        
-        x_mobility = len(self.get_possible_moves('x', '0'))
-        o_mobility = len(self.get_possible_moves('0', 'x'))
-        mobility_difference = x_mobility - o_mobility
-        
-        x_potential_mills = self._count_potential_mills('x')
-        o_potential_mills = self._count_potential_mills('0')
-        potential_mills_difference = 2 * (x_potential_mills - o_potential_mills)
+        Mills, potential mills and blocked pieces are kept up to date by make/unmake
+        on the position, and mobility is counted rather than generated.
+        """
+        position = self.position
+        x_bb, o_bb = position.bb
+        pieces_to_place = position.to_place
         
-        x_blocked = sum(1 for pos in self.get_player_positions('x') if not self.can_move(pos, 'x'))
-        o_blocked = sum(1 for pos in self.get_player_positions('0') if not self.can_move(pos, '0'))
-        blocked_difference = o_blocked - x_blocked
+        x_pieces = popcount(x_bb)
+        o_pieces = popcount(o_bb)
         
-        if o_pieces <= 2 and self.pieces_to_place[1] == 0:
+        if o_pieces <= 2 and pieces_to_place[1] == 0:
             return 1000
-        if x_pieces <= 2 and self.pieces_to_place[0] == 0:
+        if x_pieces <= 2 and pieces_to_place[0] == 0:
             return -1000
-        if o_mobility == 0 and self.pieces_to_place[1] == 0:
+        
+        x_mobility = position.count_moves(0)
+        o_mobility = position.count_moves(1)
+        
+        if o_mobility == 0 and pieces_to_place[1] == 0:
             return 1000
-        if x_mobility == 0 and self.pieces_to_place[0] == 0:
+        if x_mobility == 0 and pieces_to_place[0] == 0:
             return -1000
         
+        closed = position.closed
+        potential = position.potential
+        weights = self.weights
+        
+        piece_difference = weights['pieces'] * (x_pieces - o_pieces)
+        mill_difference = weights['mills'] * (popcount(closed[0]) - popcount(closed[1]))
+        mobility_difference = weights['mobility'] * (x_mobility - o_mobility)
+        potential_mills_difference = weights['potential_mills'] * (popcount(potential[0]) - popcount(potential[1]))
+        blocked_difference = weights['blocked'] * (position.blocked[1] - position.blocked[0])
+        
         return piece_difference + mill_difference + mobility_difference + potential_mills_difference + blocked_difference
     
     def _count_potential_mills(self, player):
         """Count the number of potential mills that can be formed in one move."""
-        potential_mills = 0
-        for mill in self.mills:
-            pieces = [self.board[pos] for pos in mill]
-            if pieces.count(player) == 2 and pieces.count(',') == 1:
-                potential_mills += 1
-        return potential_mills
+        return bitboard.count_potential_mills(self._bitboards(player)[0], self._empty())
+    
+    def _move_result(self, move):
+        """Return the (new_board, new_pieces_to_place) reached by playing move, or None."""
+        if move is None:
+            return None
+        position = self.position
+        position.make_move(move)
+        result = (position.board(), position.pieces_to_place)
+        position.unmake_move(move)
+        return result
     
     def minimax(self, depth, alpha, beta, is_maximizing, use_alpha_beta=False):
         """
@@ -221,61 +297,808 @@ class NineMensMorrisGame:
         Returns:
             A tuple (best_score, best_move) where best_move is a tuple (new_board, new_pieces_to_place)
         """
+        self.position.set_side(0 if is_maximizing else 1)
+        if self._stats is not None:
+            self._stats.root_depth = depth
+        best_score, best_move = self._minimax(depth, alpha, beta, use_alpha_beta, True)
+        return best_score, self._move_result(best_move)
+    
+    def _minimax(self, depth, alpha, beta, use_alpha_beta, is_root=False):
+        """
+        Minimax on self.position, made and unmade in place; best_move is a bitboard.Move.
+        
+        Transposition table entries are only used for cutoffs below the root, so the
+        root always returns a move from a fresh search.
+        """
+        self.nodes += 1
+        search = self._search
+        if search is not None:
+            if not self.nodes & 127 and time.perf_counter() >= search.deadline:
+                raise SearchTimeout()
+            ply = search.root_depth - depth
+            search.pv[ply] = []
+        stats = self._stats
+        if stats is not None:
+            stats.node((search.root_depth if search is not None else stats.root_depth) - depth)
+        
+        if self.position.quiet_plies and not is_root and self._is_search_draw():
+            self._path_draws += 1
+            return 0, None
+        # Draws met below this node that depend on the line (see _path_draws).
+        path_draws = self._path_draws
+        
         if depth == 0:
+            if self.tablebase is not None:
+                score = self.tablebase.score(self.position)
+                if score is not None:
+                    return score, None
+            if self.quiescence:
+                self._quiescence_budget = self.quiescence_nodes
+                return self._quiescence(alpha, beta, use_alpha_beta), None
             return self.evaluate(), None
         
-        if is_maximizing:
-            player, opponent = 'x', '0'
-            best_score = float('-inf')
-        else:
-            player, opponent = '0', 'x'
-            best_score = float('inf')
+        position = self.position
+        is_maximizing = position.side == 0
+        
+        tt = self.transposition_table
+        tt_move = None
+        if tt is not None:
+            # Symmetric positions share an entry; its move is kept in the canonical frame.
+            key, symmetry = position.canonical_key()
+            entry = tt.probe(key)
+            if entry is not None:
+                _, entry_depth, entry_score, bound, tt_move = entry
+                if symmetry and tt_move is not None:
+                    tt_move = bitboard.transform_move(tt_move, bitboard.INVERSE_SYMMETRIES[symmetry])
+                if entry_depth >= depth and not is_root:
+                    if bound == EXACT:
+                        return entry_score, tt_move
+                    if use_alpha_beta:
+                        if bound == LOWER:
+                            alpha = max(alpha, entry_score)
+                        else:
+                            beta = min(beta, entry_score)
+                        if beta <= alpha:
+                            return entry_score, tt_move
+            alpha_orig, beta_orig = alpha, beta
         
+        best_score = float('-inf') if is_maximizing else float('inf')
         best_move = None
-        possible_moves = self.get_possible_moves(player, opponent)
         
-        if not possible_moves:
-            return (-1000 if is_maximizing else 1000), None
+        if stats is not None:
+            started = time.perf_counter()
+        if is_root:
+            possible_moves = self._distinct_moves(position.moves())
+            if search is not None:
+                possible_moves = self._order_moves(possible_moves, ply, tt_move)
+            elif tt_move in possible_moves:
+                possible_moves.remove(tt_move)
+                possible_moves.insert(0, tt_move)
+        elif search is not None:
+            possible_moves = self._order_moves(list(position.moves()), ply, tt_move)
+        elif tt_move is not None:
+            possible_moves = _tt_move_first(tt_move, position.moves())
+        else:
+            possible_moves = position.moves()
+        if stats is not None:
+            possible_moves = stats.timed_moves(possible_moves, started)
         
         for move in possible_moves:
-            new_board, new_pieces_to_place = move
-            
-            new_game = NineMensMorrisGame(new_board, new_pieces_to_place)
+            position.make_move(move)
+            try:
+                score, _ = self._minimax(depth - 1, alpha, beta, use_alpha_beta)
+            finally:
+                position.unmake_move(move)
             
-            score, _ = new_game.minimax(depth - 1, alpha, beta, not is_maximizing, use_alpha_beta)
-            
-            if is_maximizing and score > best_score:
+            if best_move is None or is_maximizing and score > best_score or not is_maximizing and score < best_score:
                 best_score = score
                 best_move = move
+                if search is not None:
+                    search.pv[ply] = [move] + search.pv[ply + 1]
+                    if is_root:
+                        search.root_best = move
                 if use_alpha_beta:
-                    alpha = max(alpha, best_score)
+                    if is_maximizing:
+                        alpha = max(alpha, best_score)
+                    else:
+                        beta = min(beta, best_score)
                     if beta <= alpha:
+                        if search is not None:
+                            self._record_cutoff(move, ply, depth)
+                        if stats is not None:
+                            stats.cutoff(possible_moves.count == 1)
                         break
-            elif not is_maximizing and score < best_score:
+        
+        if best_move is None:
+            return (-1000 if is_maximizing else 1000), None
+        
+        if tt is not None and self._path_draws == path_draws:
+            if best_score <= alpha_orig:
+                bound = UPPER
+            elif best_score >= beta_orig:
+                bound = LOWER
+            else:
+                bound = EXACT
+            tt.store(key, depth, best_score, bound,
+                     bitboard.transform_move(best_move, symmetry) if symmetry else best_move)
+        
+        return best_score, best_move
+    
+    def _quiescence(self, alpha, beta, use_alpha_beta):
+        """
+        Search only mill-closing and mill-blocking moves below a leaf until the position
+        is quiet. The side to move may always stand pat on the static evaluation, and the
+        search stops expanding once the node budget of the leaf is used up.
+        """
+        self.nodes += 1
+        search = self._search
+        if search is not None and not self.nodes & 127 and time.perf_counter() >= search.deadline:
+            raise SearchTimeout()
+        
+        stand_pat = self.evaluate()
+        if is_decisive(stand_pat) or self._quiescence_budget <= 0:
+            return stand_pat
+        self._quiescence_budget -= 1
+        
+        position = self.position
+        side = position.side
+        is_maximizing = side == 0
+        best_score = stand_pat
+        if use_alpha_beta:
+            if is_maximizing:
+                if stand_pat >= beta:
+                    return stand_pat
+                alpha = max(alpha, stand_pat)
+            else:
+                if stand_pat <= alpha:
+                    return stand_pat
+                beta = min(beta, stand_pat)
+        
+        empty = FULL & ~(position.bb[0] | position.bb[1])
+        blocking = 0
+        for i in bitboard.iter_points(position.potential[side ^ 1]):
+            blocking |= bitboard.MILL_MASKS[i]
+        blocking &= empty
+        
+        for move in position.moves():
+            if move.removed is None and not blocking >> move.to & 1:
+                continue
+            position.make_move(move)
+            try:
+                score = self._quiescence(alpha, beta, use_alpha_beta)
+            finally:
+                position.unmake_move(move)
+            
+            if is_maximizing and score > best_score or not is_maximizing and score < best_score:
                 best_score = score
-                best_move = move
                 if use_alpha_beta:
-                    beta = min(beta, best_score)
+                    if is_maximizing:
+                        alpha = max(alpha, best_score)
+                    else:
+                        beta = min(beta, best_score)
                     if beta <= alpha:
                         break
         
-        return best_score, best_move
+        return best_score
+    
+    def _distinct_moves(self, possible_moves):
+        """
+        Return the moves as a list, dropping each move whose resulting position is
+        symmetric to that of an earlier move (both have the same value).
+        
+        Only for root searches that return a single best move (minimax, the parallel
+        root and negamax): multi-PV, MCTS root statistics and the analysis server rank
+        every legal move, symmetric or not.
+        """
+        position = self.position
+        seen = set()
+        distinct = []
+        for move in possible_moves:
+            position.make_move(move)
+            key = bitboard.canonical(position.bb[0], position.bb[1])[:2]
+            position.unmake_move(move)
+            if key not in seen:
+                seen.add(key)
+                distinct.append(move)
+        return distinct
+    
+    def _order_moves(self, possible_moves, ply, tt_move):
+        """
+        Sort moves: transposition-table move, previous principal variation, mill-forming
+        and capturing moves, killer moves, then by history score.
+        """
+        search = self._search
+        side = self.position.side
+        own = self.position.bb[side]
+        pv_move = search.prev_pv[ply] if ply < len(search.prev_pv) else None
+        killers = search.killers[ply]
+        history = search.history
+        
+        def priority(move):
+            if move == tt_move:
+                return 1 << 40
+            if move == pv_move:
+                return 1 << 39
+            frm, to, removed = move
+            if removed is not None or bitboard.is_mill(bitboard.apply_move(own, 0, move)[0], to):
+                return 1 << 38
+            if move in killers:
+                return 1 << 37
+            return history.get((side, frm, to), 0)
+        
+        possible_moves.sort(key=priority, reverse=True)
+        return possible_moves
     
-    def get_best_move(self, algorithm, depth):
+    def _record_cutoff(self, move, ply, depth):
+        """Update the killer moves and history heuristic after a cutoff by a quiet move."""
+        if move.removed is not None:
+            return
+        search = self._search
+        killers = search.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        history_key = (self.position.side, move.frm, move.to)
+        search.history[history_key] = search.history.get(history_key, 0) + depth * depth
+    
+    def get_best_move(self, algorithm, depth=None, time_limit_ms=None, workers=None, quiescence=False,
+                      stats=False, proof_nodes=None, trace=None):
         """
         Get the best move according to the specified algorithm and depth.
+        Positions found in the opening book are answered without searching.
         
         Args:
-            algorithm: Either "MinMax" or "AlphaBeta"
-            depth: The maximum search depth
+            algorithm: "MinMax", "AlphaBeta", "Negamax" (alpha-beta in negamax form with
+                       principal variation search, aspiration windows and late-move reductions)
+                       "DFPN" (a proof-number search for a forced win of 'x', see
+                       proof_number.py; without one the move comes from "AlphaBeta",
+                       to proof_fallback_depth if neither depth nor time_limit_ms is given)
+                       or "MCTS" (Monte Carlo tree search, see mcts.py; it runs for
+                       time_limit_ms, or mcts_playouts playouts when the time limit is
+                       missing or infinite, and ignores depth)
+            depth: The maximum search depth (optional when a time limit is given)
+            time_limit_ms: If given, search with iterative deepening until the time budget
+                           runs out and return the best move of the deepest finished iteration
+            workers: If greater than 1, split the fixed-depth search over the root moves
+                     across this many processes (ignored together with time_limit_ms and
+                     for "Negamax"); for "MCTS", the processes running the playouts
+            quiescence: If True, extend the leaves with a quiescence search over mill-closing
+                        and mill-blocking moves
+            stats: If True, collect a search_stats.SearchStats for this call in
+                   self.search_stats (parallel workers are not included)
+            proof_nodes: If given, first look for a forced win with a proof-number search of
+                         at most this many nodes (for "DFPN", its budget instead of
+                         proof_nodes) and play it when one is proven
+            trace: Optional search_trace.SearchTrace recording the nodes of the search
+                   (parallel workers are not included)
             
         Returns:
             The best move as a tuple (new_board, new_pieces_to_place)
         """
+        self.quiescence = quiescence
+        self.nodes = 0
+        self.best_score = None
+        self.proof_result = None
+        if trace is None:
+            return self._get_best_move(algorithm, depth, time_limit_ms, workers, stats, proof_nodes)
+        trace.attach(self)
+        try:
+            return self._get_best_move(algorithm, depth, time_limit_ms, workers, stats, proof_nodes)
+        finally:
+            trace.detach(self)
+    
+    def _get_best_move(self, algorithm, depth, time_limit_ms, workers, stats, proof_nodes):
+        """get_best_move with the search statistics set up when stats is True."""
+        if not stats:
+            return self._best_move(algorithm, depth, time_limit_ms, workers, proof_nodes)
+        
+        self.search_stats = self._stats = search_stats = SearchStats()
+        tt = self.transposition_table
+        if tt is not None:
+            probes, hits = tt.probes, tt.hits
+        self.evaluate = search_stats.timed_evaluation(self.evaluate)
+        started = time.perf_counter()
+        try:
+            return self._best_move(algorithm, depth, time_limit_ms, workers, proof_nodes)
+        finally:
+            search_stats.seconds = time.perf_counter() - started
+            del self.evaluate
+            self._stats = None
+            search_stats.nodes = self.nodes
+            search_stats.completed_depth = self.completed_depth
+            if tt is not None:
+                search_stats.cache_probes = tt.probes - probes
+                search_stats.cache_hits = tt.hits - hits
+    
+    def _best_move(self, algorithm, depth, time_limit_ms, workers, proof_nodes):
+        """get_best_move without the statistics set-up."""
+        if self.opening_book is not None:
+            self.position.set_side(0)
+            book_move = self.opening_book.lookup(self.position)
+            if book_move is not None:
+                self.completed_depth = self.opening_book.depth
+                return self._move_result(book_move)
+        if algorithm == "DFPN" or proof_nodes:
+            winning_move = self._prove_win(proof_nodes or self.proof_nodes)
+            if winning_move is not None:
+                self.best_score = 1000
+                return self._move_result(winning_move)
+            if algorithm == "DFPN":
+                if depth is None and time_limit_ms is None:
+                    depth = self.proof_fallback_depth
+                algorithm = "AlphaBeta"
+        if algorithm == "Negamax":
+            self.best_score, best_move = self._negamax_search(depth, time_limit_ms)
+            return self._move_result(best_move)
+        if algorithm == "MCTS":
+            return self._move_result(self._mcts_search(time_limit_ms, workers))
         use_alpha_beta = (algorithm == "AlphaBeta")
-        _, best_move = self.minimax(depth, float('-inf'), float('inf'), True, use_alpha_beta)
+        if time_limit_ms is not None:
+            return self._iterative_deepening(use_alpha_beta, depth, time_limit_ms)
+        self.completed_depth = depth
+        if workers is not None and workers > 1:
+            self.best_score, best_move = self._parallel_minimax(depth, use_alpha_beta, workers)
+            return self._move_result(best_move)
+        self.best_score, best_move = self.minimax(depth, float('-inf'), float('inf'), True, use_alpha_beta)
         return best_move
     
+    def _mcts_search(self, time_limit_ms, workers):
+        """
+        Monte Carlo tree search for 'x' to move; stops early on stop().
+        
+        Returns:
+            The most visited bitboard.Move, or None without a legal move
+        """
+        if self.mcts is None:
+            self.mcts = MonteCarloTreeSearch()
+        tree = self.mcts
+        position = self.position
+        if time_limit_ms is None or time_limit_ms == float('inf'):
+            deadline, max_playouts = None, self.mcts_playouts
+        else:
+            deadline, max_playouts = time.perf_counter() + time_limit_ms / 1000, None
+        move = tree.search(position.bb[0], position.bb[1], position.pieces_to_place, 0, deadline,
+                           max_playouts, workers, lambda: self._stopped)
+        self.nodes += tree.playouts
+        self.principal_variation = tree.principal_variation()
+        return move
+    
+    def _prove_win(self, max_nodes):
+        """
+        Proof-number search for a forced win of 'x', stored in self.proof_result.
+        
+        Returns:
+            The winning bitboard.Move if the win is proven, else None
+        """
+        position = self.position
+        position.set_side(0)
+        search = ProofNumberSearch(ProofTable(self.proof_table_mb), max_nodes, tablebase=self.tablebase)
+        self.proof_result, move = search.solve(position)
+        self.nodes += search.nodes
+        return move if self.proof_result == PROVEN else None
+    
+    def stop(self):
+        """
+        Make a running iterative deepening search (with a time limit, or "Negamax") or
+        "MCTS" search return its best move so far, as when its time runs out. Safe to call
+        from another thread; later searches of this game stop at once too.
+        """
+        self._stopped = True
+        search = self._search
+        if search is not None:
+            search.deadline = float('-inf')
+    
+    def _parallel_minimax(self, depth, use_alpha_beta, workers):
+        """
+        Root-split search for 'x' to move (Young Brothers Wait at the root).
+        
+        The first root move is searched here to get a bound; the other root moves are
+        then searched in a process pool, one wave of `workers` moves at a time, with the
+        window (best score so far, inf). A move's result is exact whenever it beats the
+        bound the serial search would have used, and moves are compared in generation
+        order with the same strict improvement rule, so the result matches the serial
+        search at the same depth.
+        
+        Returns:
+            A tuple (best_score, best_move) with best_move a bitboard.Move
+        """
+        position = self.position
+        position.set_side(0)
+        if self._stats is not None:
+            self._stats.root_depth = depth
+        root_moves = self._distinct_moves(position.moves())
+        if depth <= 1 or len(root_moves) <= 1:
+            return self._minimax(depth, float('-inf'), float('inf'), use_alpha_beta, True)
+        
+        best_move = root_moves[0]
+        position.make_move(best_move)
+        try:
+            best_score, _ = self._minimax(depth - 1, float('-inf'), float('inf'), use_alpha_beta)
+        finally:
+            position.unmake_move(best_move)
+        
+        x_bb, o_bb = position.bb
+        pieces_to_place = position.pieces_to_place
+        tt_mb = 0
+        if self.transposition_table is not None:
+            tt_mb = max(1, self.transposition_table.capacity * ENTRY_BYTES // (1024 * 1024 * workers))
+        tablebase_dir = self.tablebase.directory if self.tablebase is not None else None
+        pool = _process_pool(workers, tt_mb, tablebase_dir)
+        for start in range(1, len(root_moves), workers):
+            wave = root_moves[start:start + workers]
+            alpha = best_score if use_alpha_beta else float('-inf')
+            tasks = [(x_bb, o_bb, pieces_to_place, (self.repetition_limit, self.no_capture_limit),
+                      position.quiet_plies, position.seen, move, depth - 1, alpha, use_alpha_beta, self.quiescence)
+                     for move in wave]
+            for move, score in zip(wave, pool.map(_search_root_move, tasks)):
+                if score > best_score:
+                    best_score = score
+                    best_move = move
+        return best_score, best_move
+    
+    def _iterative_deepening(self, use_alpha_beta, max_depth, time_limit_ms):
+        """
+        Search depth 1, 2, ... until the deadline (or max_depth) is reached.
+        
+        A move is available from the start (the first legal move), is replaced after each
+        completed iteration, and, when time runs out mid-iteration, by any root move that
+        already scored better than the previous iteration's choice.
+        """
+        position = self.position
+        position.set_side(0)
+        best_move = next(position.moves(), None)
+        if best_move is None:
+            return None
+        
+        search = _SearchState(time.perf_counter() + time_limit_ms / 1000)
+        self._search = search
+        if self._stopped:
+            search.deadline = float('-inf')
+        self.completed_depth = 0
+        self.principal_variation = []
+        depth = 1
+        try:
+            while max_depth is None or depth <= max_depth:
+                search.root_depth = depth
+                search.root_best = None
+                score, best_move = self._minimax(depth, float('-inf'), float('inf'), use_alpha_beta, True)
+                search.prev_pv = search.pv[0]
+                self.completed_depth = depth
+                self.principal_variation = search.prev_pv
+                self.best_score = score
+                if is_decisive(score):
+                    break
+                depth += 1
+        except SearchTimeout:
+            if search.root_best is not None:
+                best_move = search.root_best
+        finally:
+            self._search = None
+        
+        return self._move_result(best_move)
+    
+    def _negamax_search(self, max_depth, time_limit_ms=None):
+        """
+        Iterative deepening driver for _negamax with 'x' to move.
+        
+        From the second iteration on, each depth is first searched with an aspiration
+        window of +-aspiration_window around the previous score; when the score falls
+        outside it, that side of the window is opened and the depth searched again.
+        
+        Returns:
+            A tuple (best_score, best_move) with best_move a bitboard.Move
+        """
+        position = self.position
+        position.set_side(0)
+        best_move = next(position.moves(), None)
+        if best_move is None:
+            return -1000, None
+        
+        deadline = float('inf') if time_limit_ms is None else time.perf_counter() + time_limit_ms / 1000
+        search = _SearchState(deadline)
+        self._search = search
+        if self._stopped:
+            search.deadline = float('-inf')
+        self.completed_depth = 0
+        self.principal_variation = []
+        best_score = None
+        depth = 1
+        try:
+            while max_depth is None or depth <= max_depth:
+                search.root_depth = depth
+                search.root_best = None
+                if best_score is None or is_decisive(best_score):
+                    alpha, beta = float('-inf'), float('inf')
+                else:
+                    alpha, beta = best_score - self.aspiration_window, best_score + self.aspiration_window
+                while True:
+                    score, move = self._negamax(depth, alpha, beta, 0, True)
+                    if score <= alpha:
+                        alpha = float('-inf')
+                    elif score >= beta:
+                        beta = float('inf')
+                    else:
+                        break
+                best_score, best_move = score, move
+                search.prev_pv = search.pv[0]
+                self.completed_depth = depth
+                self.principal_variation = search.prev_pv
+                if is_decisive(best_score):
+                    break
+                depth += 1
+        except SearchTimeout:
+            if search.root_best is not None:
+                best_move = search.root_best
+        finally:
+            self._search = None
+        
+        return best_score, best_move
+    
+    def get_top_moves(self, count, depth=None, time_limit_ms=None, quiescence=False):
+        """
+        Multi-PV analysis: rank the best `count` moves of 'x' with one search.
+        
+        The root moves are searched with iterative deepening as in "Negamax", each one
+        against the count-th best score so far instead of the best, so that every move
+        of the top `count` gets an exact score. The lines share the transposition table
+        (a temporary one of multi_pv_table_mb megabytes if the game has none), killer
+        moves and history, and each iteration searches the previous ranking first.
+        Moves leading to symmetric positions are ranked separately, and a variation cut
+        short by a transposition table hit is completed from the table's best moves.
+        
+        Args:
+            count: Number of moves to return
+            depth: The maximum search depth (optional when a time limit is given)
+            time_limit_ms: If given, stop deepening when the time budget runs out and
+                           return the ranking of the deepest finished iteration
+            quiescence: If True, extend the leaves with a quiescence search
+            
+        Returns:
+            A list of up to count tuples ((new_board, new_pieces_to_place), score,
+            principal variation), best first, with scores from 'x's point of view and
+            each principal variation a list of bitboard.Moves starting with the move
+        """
+        self.quiescence = quiescence
+        self.nodes = 0
+        self.best_score = None
+        table = self.transposition_table
+        if table is None:
+            self.transposition_table = TranspositionTable(self.multi_pv_table_mb)
+        try:
+            lines = self._multi_pv_search(count, depth, time_limit_ms)
+        finally:
+            self.transposition_table = table
+        if lines:
+            self.best_score = lines[0][0]
+            self.principal_variation = lines[0][2]
+        return [(self._move_result(pv[0]), score, pv) for score, _, pv in lines]
+    
+    def _multi_pv_search(self, count, max_depth, time_limit_ms):
+        """
+        Iterative deepening driver for _multi_pv_root.
+        
+        Returns:
+            A list of (score, order, pv) lines, best first
+        """
+        position = self.position
+        position.set_side(0)
+        root_moves = list(position.moves())
+        if not root_moves:
+            return []
+        
+        deadline = float('inf') if time_limit_ms is None else time.perf_counter() + time_limit_ms / 1000
+        search = _SearchState(deadline)
+        self._search = search
+        if self._stopped:
+            search.deadline = float('-inf')
+        self.completed_depth = 0
+        lines = []
+        depth = 1
+        try:
+            while max_depth is None or depth <= max_depth:
+                search.root_depth = depth
+                # The previous ranking first, then the other moves in generation order.
+                ranked = [pv[0] for _, _, pv in lines]
+                root_moves = ranked + [move for move in root_moves if move not in ranked]
+                partial = []
+                lines = self._multi_pv_root(root_moves, count, depth, partial)
+                self.completed_depth = depth
+                if all(is_decisive(score) for score, _, _ in lines):
+                    break
+                depth += 1
+        except SearchTimeout:
+            if not lines:
+                lines = partial
+        finally:
+            self._search = None
+        return lines
+    
+    def _multi_pv_root(self, root_moves, count, depth, lines):
+        """
+        Search the root moves at the given depth, keeping the best count in lines (a list
+        filled in place, so that a timeout leaves the moves searched so far). A move is
+        searched with a null window at the count-th best score and again with an open
+        window when it beats it.
+        """
+        position = self.position
+        search = self._search
+        for order, move in enumerate(root_moves):
+            alpha = lines[-1][0] if len(lines) >= count else float('-inf')
+            position.make_move(move)
+            try:
+                if alpha == float('-inf'):
+                    score = -self._negamax(depth - 1, float('-inf'), float('inf'), 1)[0]
+                else:
+                    score = -self._negamax(depth - 1, -alpha - 1, -alpha, 1)[0]
+                    if score > alpha:
+                        score = -self._negamax(depth - 1, float('-inf'), -alpha, 1)[0]
+            finally:
+                position.unmake_move(move)
+            if score > alpha:
+                lines.append((score, order, self._extend_pv([move] + search.pv[1], depth)))
+                # Ties keep the earlier move first.
+                lines.sort(key=lambda line: (-line[0], line[1]))
+                del lines[count:]
+        return lines
+    
+    def _extend_pv(self, pv, depth):
+        """
+        Extend pv, which stops short where a child returned from a transposition table
+        hit, with the table's best moves up to depth moves.
+        
+        Returns:
+            The extended pv
+        """
+        position = self.position
+        tt = self.transposition_table
+        pv = list(pv)
+        if tt is None or len(pv) >= depth:
+            return pv
+        for move in pv:
+            position.make_move(move)
+        try:
+            while len(pv) < depth:
+                key, symmetry = position.canonical_key()
+                entry = tt.probe(key)
+                if entry is None or entry[4] is None:
+                    break
+                move = entry[4]
+                if symmetry:
+                    move = bitboard.transform_move(move, bitboard.INVERSE_SYMMETRIES[symmetry])
+                if move not in position.moves():
+                    break
+                position.make_move(move)
+                pv.append(move)
+        finally:
+            for move in reversed(pv):
+                position.unmake_move(move)
+        return pv
+    
+    def _negamax(self, depth, alpha, beta, ply, is_root=False):
+        """
+        Alpha-beta in negamax form on self.position: scores are from the point of view of
+        the side to move. Moves after the first are searched with a null window and only
+        searched again with the full window when they beat alpha (principal variation
+        search). Late quiet moves, which neither capture nor close a mill, are first
+        searched one ply shallower and searched again at full depth if they beat alpha.
+        
+        Transposition table entries are shared with _minimax, so scores are stored from
+        'x's point of view.
+        
+        Returns:
+            A tuple (best_score, best_move) with best_move a bitboard.Move
+        """
+        self.nodes += 1
+        search = self._search
+        if not self.nodes & 127 and time.perf_counter() >= search.deadline:
+            raise SearchTimeout()
+        search.pv[ply] = []
+        stats = self._stats
+        if stats is not None:
+            stats.node(ply)
+        
+        position = self.position
+        side = position.side
+        sign = -1 if side else 1
+        
+        if position.quiet_plies and not is_root and self._is_search_draw():
+            self._path_draws += 1
+            return 0, None
+        path_draws = self._path_draws
+        
+        if depth <= 0:
+            if self.tablebase is not None:
+                score = self.tablebase.score(position)
+                if score is not None:
+                    return sign * score, None
+            if self.quiescence:
+                self._quiescence_budget = self.quiescence_nodes
+                if side:
+                    return -self._quiescence(-beta, -alpha, True), None
+                return self._quiescence(alpha, beta, True), None
+            return sign * self.evaluate(), None
+        
+        tt = self.transposition_table
+        tt_move = None
+        if tt is not None:
+            key, symmetry = position.canonical_key()
+            entry = tt.probe(key)
+            if entry is not None:
+                _, entry_depth, entry_score, bound, tt_move = entry
+                if symmetry and tt_move is not None:
+                    tt_move = bitboard.transform_move(tt_move, bitboard.INVERSE_SYMMETRIES[symmetry])
+                if entry_depth >= depth and not is_root:
+                    entry_score *= sign
+                    if bound != EXACT and side:
+                        bound = LOWER if bound == UPPER else UPPER
+                    if bound == EXACT:
+                        return entry_score, tt_move
+                    if bound == LOWER:
+                        alpha = max(alpha, entry_score)
+                    else:
+                        beta = min(beta, entry_score)
+                    if alpha >= beta:
+                        return entry_score, tt_move
+        alpha_orig = alpha
+        
+        if stats is not None:
+            started = time.perf_counter()
+        possible_moves = self._distinct_moves(position.moves()) if is_root else list(position.moves())
+        if not possible_moves:
+            return -1000, None
+        possible_moves = self._order_moves(possible_moves, ply, tt_move)
+        if stats is not None:
+            possible_moves = stats.timed_moves(possible_moves, started)
+        own = position.bb[side]
+        
+        best_score = float('-inf')
+        best_move = None
+        for index, move in enumerate(possible_moves):
+            reduction = 0
+            if (index >= self.reduction_move and depth >= self.reduction_depth and move.removed is None
+                    and not bitboard.is_mill(bitboard.apply_move(own, 0, move)[0], move.to)):
+                reduction = 1
+            position.make_move(move)
+            try:
+                if index == 0:
+                    score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)[0]
+                else:
+                    score = -self._negamax(depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)[0]
+                    if reduction and score > alpha:
+                        score = -self._negamax(depth - 1, -alpha - 1, -alpha, ply + 1)[0]
+                    if alpha < score < beta:
+                        score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)[0]
+            finally:
+                position.unmake_move(move)
+            
+            if score > best_score:
+                best_score = score
+                best_move = move
+                search.pv[ply] = [move] + search.pv[ply + 1]
+                if is_root:
+                    search.root_best = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self._record_cutoff(move, ply, depth)
+                        if stats is not None:
+                            stats.cutoff(index == 0)
+                        break
+        
+        if tt is not None and self._path_draws == path_draws:
+            if best_score <= alpha_orig:
+                bound = UPPER
+            elif best_score >= beta:
+                bound = LOWER
+            else:
+                bound = EXACT
+            if side and bound != EXACT:
+                bound = LOWER if bound == UPPER else UPPER
+            tt.store(key, depth, sign * best_score, bound,
+                     bitboard.transform_move(best_move, symmetry) if symmetry else best_move)
+        
+        return best_score, best_move
+    
     def format_board(self, board):
         """Format the board for human-readable output matching the reference image."""
         symbols = []
@@ -308,7 +1131,112 @@ class NineMensMorrisGame:
         return formatted_board
 
 
-def solve_nine_mens_morris(board_state, pieces_to_place, algorithm, depth):
+_pools = {}
+_worker_table = None
+_worker_tablebase = None
+
+
+def _init_worker(tt_mb, tablebase_dir):
+    """Give each worker process its own transposition table (kept between tasks) and tablebase."""
+    global _worker_table, _worker_tablebase
+    _worker_table = TranspositionTable(tt_mb) if tt_mb else None
+    _worker_tablebase = Tablebase(tablebase_dir) if tablebase_dir else None
+
+
+def _process_pool(workers, tt_mb=0, tablebase_dir=None):
+    """Return a process pool for the given settings, reusing it across searches."""
+    settings = (workers, tt_mb, tablebase_dir)
+    pool = _pools.get(settings)
+    if pool is None:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(tt_mb, tablebase_dir))
+        _pools[settings] = pool
+    return pool
+
+
+def _search_root_move(task):
+    """Worker: score one root move of a parallel search."""
+    x_bb, o_bb, pieces_to_place, draw_rules, quiet_plies, seen, move, depth, alpha, use_alpha_beta, quiescence = task
+    game = NineMensMorrisGame(bitboard.to_board(x_bb, o_bb), pieces_to_place, _worker_table, _worker_tablebase,
+                              draw_rules=draw_rules)
+    game.quiescence = quiescence
+    game.position.quiet_plies = quiet_plies
+    game.position.seen = seen
+    game.position.make_move(move)
+    score, _ = game._minimax(depth, alpha, float('inf'), use_alpha_beta)
+    return score
+
+
+def compare_parallel_search(board_state, pieces_to_place, algorithm, depth, workers=None):
+    """
+    Run the same fixed-depth search serially and in parallel and report the speedup.
+    
+    The process pool is started before timing, so the parallel time does not include
+    process start-up.
+    
+    Returns:
+        A dict with the worker count, both times in seconds, the speedup and whether
+        both searches returned the same score and move
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    use_alpha_beta = (algorithm == "AlphaBeta")
+    _process_pool(workers).submit(int).result()
+    
+    game = NineMensMorrisGame(board_state, pieces_to_place)
+    start = time.perf_counter()
+    game.position.set_side(0)
+    serial_score, serial_move = game._minimax(depth, float('-inf'), float('inf'), use_alpha_beta, True)
+    serial_seconds = time.perf_counter() - start
+    
+    game = NineMensMorrisGame(board_state, pieces_to_place)
+    start = time.perf_counter()
+    parallel_score, parallel_move = game._parallel_minimax(depth, use_alpha_beta, workers)
+    parallel_seconds = time.perf_counter() - start
+    
+    return {
+        'workers': workers,
+        'serial_seconds': serial_seconds,
+        'parallel_seconds': parallel_seconds,
+        'speedup': serial_seconds / parallel_seconds if parallel_seconds else float('inf'),
+        'same_score': serial_score == parallel_score,
+        'same_move': serial_move == parallel_move,
+    }
+
+
+def compare_search_nodes(board_state, pieces_to_place, depth, algorithms=("AlphaBeta", "Negamax"),
+                         quiescence=False):
+    """
+    Run fixed-depth searches of the same position with several algorithms and report the
+    nodes each one visits.
+    
+    Returns:
+        A dict mapping each algorithm to a dict with its node count, time in seconds
+        and the board of the chosen move
+    """
+    results = {}
+    for algorithm in algorithms:
+        game = NineMensMorrisGame(board_state, pieces_to_place)
+        start = time.perf_counter()
+        best_move = game.get_best_move(algorithm, depth, quiescence=quiescence)
+        results[algorithm] = {
+            'nodes': game.nodes,
+            'seconds': time.perf_counter() - start,
+            'move': best_move[0] if best_move else None,
+        }
+    return results
+
+
+def _tt_move_first(tt_move, moves):
+    """Yield the transposition-table move, then the remaining moves of the lazy generator."""
+    yield tt_move
+    for move in moves:
+        if move != tt_move:
+            yield move
+
+
+def solve_nine_mens_morris(board_state, pieces_to_place, algorithm, depth, transposition_table=None,
+                           time_limit_ms=None, workers=None, tablebase=None, opening_book=None, quiescence=False,
+                           stats=False, proof_nodes=None):
     """
     Solve the Nine Men's Morris game.
     
@@ -316,14 +1244,27 @@ def solve_nine_mens_morris(board_state, pieces_to_place, algorithm, depth):
         board_state: A list representing the current state of the board
         pieces_to_place: A tuple (nx, n0) where nx is the number of 'x' pieces to place
                         and n0 is the number of '0' pieces to place
-        algorithm: Either "MinMax" or "AlphaBeta"
+        algorithm: "MinMax", "AlphaBeta", "Negamax" or "DFPN"
         depth: The maximum search depth
+        transposition_table: Optional transposition.TranspositionTable to use for the search
+        time_limit_ms: Optional time budget per move; the search then deepens iteratively
+                       up to depth (or without limit if depth is None)
+        workers: Optional number of processes for a parallel fixed-depth search
+        tablebase: Optional tablebase.Tablebase probed at the leaves of the search
+        opening_book: Optional opening_book.OpeningBook answered before searching
+        quiescence: If True, extend the leaves with a quiescence search
+        stats: If True, also return the search_stats.SearchStats of the search
+        proof_nodes: Optional node budget of a proof-number search for a forced win run
+                     before the search (see get_best_move)
         
     Returns:
-        The best move as a formatted board state
+        A tuple (formatted board state, best board), followed by the SearchStats when
+        stats is True
     """
-    game = NineMensMorrisGame(board_state, pieces_to_place)
-    best_move = game.get_best_move(algorithm, depth)
+    game = NineMensMorrisGame(board_state, pieces_to_place, transposition_table, tablebase, opening_book)
+    best_move = game.get_best_move(algorithm, depth, time_limit_ms, workers, quiescence, stats, proof_nodes)
+    if time_limit_ms is not None or depth is None:
+        depth = game.completed_depth
     
     if best_move:
         best_board, new_pieces_to_place = best_move
@@ -332,9 +1273,10 @@ def solve_nine_mens_morris(board_state, pieces_to_place, algorithm, depth):
         x_pieces = best_board.count('x')
         o_pieces = best_board.count('0')
         
+        proof_info = f"\n        Forced win: {game.proof_result}" if game.proof_result is not None else ""
         move_info = f"""
         Algorithm: {algorithm}
-        Search Depth: {depth}
+        Search Depth: {depth}{proof_info}
         
         X pieces on board: {x_pieces}
         O pieces on board: {o_pieces}
@@ -344,9 +1286,12 @@ def solve_nine_mens_morris(board_state, pieces_to_place, algorithm, depth):
         Board representation: {best_board}
         """
         
-        return formatted_board + move_info, best_board
+        result = formatted_board + move_info, best_board
     else:
-        return "No valid moves available", board_state
+        result = "No valid moves available", board_state
+    if stats:
+        return result + (game.search_stats,)
+    return result
 
 
 if __name__ == "__main__":
@@ -1,71 +1,51 @@
 import numpy as np
-import copy
 import random
 
+import bitboard
+from batch_eval import (MILL_INDEX, MILL_POINTS, STRATEGIC_POINTS, bayesian_batch, bayesian_components,
+                        bayesian_probability)
+from weights import WEIGHTS
+
+# (row, col) of every point on the 7x7 grid, in the point order of bitboard.py.
+POSITIONS = [
+    (0, 0), (0, 3), (0, 6),
+    (1, 1), (1, 3), (1, 5),
+    (2, 2), (2, 3), (2, 4),
+    (3, 0), (3, 1), (3, 2), (3, 4), (3, 5), (3, 6),
+    (4, 2), (4, 3), (4, 4),
+    (5, 1), (5, 3), (5, 5),
+    (6, 0), (6, 3), (6, 6)
+]
+POINT_INDEX = {pos: i for i, pos in enumerate(POSITIONS)}
+MILLS = [[POSITIONS[p] for p in mill] for mill in bitboard.MILLS]
+ADJACENT = {POSITIONS[p]: [POSITIONS[q] for q in adj] for p, adj in enumerate(bitboard.ADJACENCY)}
+
+# Cell values of the flat board (as in batch_eval) and back.
+PIECE_VALUES = {'x': 1, '0': -1, 'o': -1}
+CELL_PIECES = {1: 'x', -1: 'o', 0: ''}
+
 class NineMensMorris:
+    # Weights of the component scores of bayesian_evaluation, from weights.json (see weights.py).
+    weights = WEIGHTS['bayesian']
+    positions = POSITIONS
+    point_index = POINT_INDEX
+    mills = MILLS
+    adjacent = ADJACENT
+    
     def __init__(self, board_state, pieces_to_place):
         self.board = board_state
         self.pieces_to_place = pieces_to_place
-        
-        self.positions = [
-            (0, 0), (0, 3), (0, 6),
-            (1, 1), (1, 3), (1, 5),
-            (2, 2), (2, 3), (2, 4),
-            (3, 0), (3, 1), (3, 2), (3, 4), (3, 5), (3, 6),
-            (4, 2), (4, 3), (4, 4),
-            (5, 1), (5, 3), (5, 5),
-            (6, 0), (6, 3), (6, 6)
-        ]
-        
-        self.mills = [
-            [(0, 0), (0, 3), (0, 6)],
-            [(1, 1), (1, 3), (1, 5)],
-            [(2, 2), (2, 3), (2, 4)],
-            [(3, 0), (3, 1), (3, 2)],
-            [(3, 4), (3, 5), (3, 6)],
-            [(4, 2), (4, 3), (4, 4)],
-            [(5, 1), (5, 3), (5, 5)],
-            [(6, 0), (6, 3), (6, 6)],
-            
-            [(0, 0), (3, 0), (6, 0)],
-            [(1, 1), (3, 1), (5, 1)],
-            [(2, 2), (3, 2), (4, 2)],
-            [(0, 3), (1, 3), (2, 3)],
-            [(4, 3), (5, 3), (6, 3)],
-            [(2, 4), (3, 4), (4, 4)],
-            [(1, 5), (3, 5), (5, 5)],
-            [(0, 6), (3, 6), (6, 6)]
-        ]
-        
-        self.adjacent = {
-            (0, 0): [(0, 3), (3, 0)],
-            (0, 3): [(0, 0), (0, 6), (1, 3)],
-            (0, 6): [(0, 3), (3, 6)],
-            (1, 1): [(1, 3), (3, 1)],
-            (1, 3): [(0, 3), (1, 1), (1, 5), (2, 3)],
-            (1, 5): [(1, 3), (3, 5)],
-            (2, 2): [(2, 3), (3, 2)],
-            (2, 3): [(1, 3), (2, 2), (2, 4), (3, 3)],
-            (2, 4): [(2, 3), (3, 4)],
-            (3, 0): [(0, 0), (3, 1), (6, 0)],
-            (3, 1): [(1, 1), (3, 0), (3, 2), (5, 1)],
-            (3, 2): [(2, 2), (3, 1), (4, 2)],
-            (3, 4): [(2, 4), (3, 5), (4, 4)],
-            (3, 5): [(1, 5), (3, 4), (3, 6), (5, 5)],
-            (3, 6): [(0, 6), (3, 5), (6, 6)],
-            (4, 2): [(3, 2), (4, 3)],
-            (4, 3): [(4, 2), (4, 4), (5, 3)],
-            (4, 4): [(3, 4), (4, 3)],
-            (5, 1): [(3, 1), (5, 3)],
-            (5, 3): [(4, 3), (5, 1), (5, 5), (6, 3)],
-            (5, 5): [(3, 5), (5, 3)],
-            (6, 0): [(3, 0), (6, 3)],
-            (6, 3): [(5, 3), (6, 0), (6, 6)],
-            (6, 6): [(3, 6), (6, 3)]
-        }
-        
-        self.board_array = self.create_board_array(board_state)
-        
+        # One int8 per point: 1 for 'x', -1 for 'o', 0 for empty.
+        self.cells = self.create_cells(board_state)
+        
+    @staticmethod
+    def create_cells(board_state):
+        """Convert the flat board state to the flat int8 cells"""
+        cells = np.zeros(bitboard.POINTS, dtype=np.int8)
+        for idx, piece in enumerate(board_state[:bitboard.POINTS]):
+            cells[idx] = PIECE_VALUES.get(piece, 0)
+        return cells
+    
     def create_board_array(self, board_state):
         """Convert the flat board state to a 2D array for easier processing"""
         board_array = [['' for _ in range(7)] for _ in range(7)]
@@ -77,49 +57,64 @@ class NineMensMorris:
         
         return board_array
     
+    @property
+    def board_array(self):
+        """The board as a 7x7 grid of 'x', 'o' and '', built from the cells when asked for"""
+        return self.create_board_array(self.board_state())
+    
+    def board_state(self):
+        """The flat board state of the cells, with 'x', 'o' and ''"""
+        return [CELL_PIECES[cell] for cell in self.cells.tolist()]
+    
+    @classmethod
+    def from_code(cls, code):
+        """Create a game from a 64-bit position code (see bitboard.encode)"""
+        x_bb, o_bb, pieces_to_place, _ = bitboard.decode(code)
+        board_state = ['x' if x_bb >> i & 1 else 'o' if o_bb >> i & 1 else '' for i in range(bitboard.POINTS)]
+        return cls(board_state, pieces_to_place)
+    
+    def to_code(self):
+        """Encode the board and pieces to place as a 64-bit position code (see bitboard.encode)"""
+        return bitboard.encode_board(self.board_state(), self.pieces_to_place)
+    
     def get_position_value(self, row, col):
         """Get the piece at a specific position or empty string if no piece"""
-        if 0 <= row < 7 and 0 <= col < 7:
-            return self.board_array[row][col]
-        return ''
+        idx = self.point_index.get((row, col))
+        if idx is None:
+            return ''
+        return CELL_PIECES[int(self.cells[idx])]
     
     def count_pieces(self):
         """Count the number of 'x' and 'o' pieces on the board"""
-        x_count = sum(row.count('x') for row in self.board_array)
-        o_count = sum(row.count('o') for row in self.board_array)
-        return x_count, o_count
+        return int(np.count_nonzero(self.cells == 1)), int(np.count_nonzero(self.cells == -1))
     
     def is_valid_move(self, row, col):
         """Check if a position is valid for placing a piece"""
-        return (row, col) in self.positions and self.board_array[row][col] == ''
+        idx = self.point_index.get((row, col))
+        return idx is not None and bool(self.cells[idx] == 0)
     
     def get_valid_moves(self, player='x'):
         """Get all valid moves for the current phase"""
-        x_pieces_placed, o_pieces_placed = self.count_pieces()
         x_pieces_left, o_pieces_left = self.pieces_to_place
         
         if (player == 'x' and x_pieces_left > 0) or (player == 'o' and o_pieces_left > 0):
-            return [(row, col) for row, col in self.positions if self.is_valid_move(row, col)]
+            return [self.positions[idx] for idx in np.flatnonzero(self.cells == 0).tolist()]
         
         return []
     
     def check_mill(self, row, col, player):
         """Check if placing a piece at (row, col) forms a mill for the player"""
-        for mill in self.mills:
-            if (row, col) in mill:
-                if all(self.get_position_value(r, c) == player for r, c in mill):
-                    return True
-        return False
+        idx = self.point_index.get((row, col))
+        value = PIECE_VALUES.get(player)
+        if idx is None or value is None:
+            return False
+        in_mill = self.cells[MILL_INDEX[MILL_POINTS[:, idx]]] == value
+        return bool(in_mill.all(axis=1).any())
     
     def simulate_move(self, move, player):
         """Simulate making a move and return the new board state"""
-        row, col = move
-        new_board = copy.deepcopy(self.board_array)
-        new_board[row][col] = player
-        
-        new_state = []
-        for pos in self.positions:
-            new_state.append(new_board[pos[0]][pos[1]] if new_board[pos[0]][pos[1]] in ['x', 'o'] else '')
+        new_state = self.board_state()
+        new_state[self.point_index[move]] = player
         
         new_x_pieces, new_o_pieces = self.pieces_to_place
         if player == 'x':
@@ -129,94 +124,56 @@ class NineMensMorris:
             
         return new_state, (new_x_pieces, new_o_pieces)
     
-    def bayesian_evaluation(self, board_array, move=None):
+    def placement_probabilities(self, moves, cells=None):
         """
-        Bayesian evaluation of a board state
-        Returns a probability of winning for 'x'
-        """
-        if move:
-            row, col = move
-            board_array = copy.deepcopy(board_array)
-            board_array[row][col] = 'x'
-            
-        x_mills = 0
-        o_mills = 0
-        potential_x_mills = 0
-        potential_o_mills = 0
+        Win probabilities for 'x' after placing an 'x' on each move, in one pass.
         
-        for mill in self.mills:
-            pieces = [board_array[r][c] for r, c in mill if 0 <= r < 7 and 0 <= c < 7]
-            
-            if pieces.count('x') == 3:
-                x_mills += 1
-            elif pieces.count('o') == 3:
-                o_mills += 1
-                
-            if pieces.count('x') == 2 and pieces.count('') == 1:
-                potential_x_mills += 1
-            elif pieces.count('o') == 2 and pieces.count('') == 1:
-                potential_o_mills += 1
+        The counts behind bayesian_evaluation (pieces of each player in every mill,
+        on the board and on the strategic points) are taken once from the cells and
+        adjusted by what each placement changes, so no board is copied.
         
-        x_count = sum(row.count('x') for row in board_array)
-        o_count = sum(row.count('o') for row in board_array)
-        
-        strategic_positions = [(1, 1), (1, 5), (5, 1), (5, 5), (3, 3)]
-        x_strategic = sum(1 for pos in strategic_positions if 
-                         0 <= pos[0] < 7 and 0 <= pos[1] < 7 and board_array[pos[0]][pos[1]] == 'x')
-        o_strategic = sum(1 for pos in strategic_positions if 
-                         0 <= pos[0] < 7 and 0 <= pos[1] < 7 and board_array[pos[0]][pos[1]] == 'o')
-        
-        x_blocks = 0
-        o_blocks = 0
-        
-        for mill in self.mills:
-            pieces = [board_array[r][c] for r, c in mill if 0 <= r < 7 and 0 <= c < 7]
-            if pieces.count('x') == 1 and pieces.count('o') == 2:
-                x_blocks += 1
-            elif pieces.count('o') == 1 and pieces.count('x') == 2:
-                o_blocks += 1
-        
-        weights = {
-            'mills': 0.4,
-            'blocking': 0.3,
-            'pieces': 0.2,
-            'strategic': 0.1
-        }
-        
-        if x_mills + o_mills > 0:
-            mill_score = x_mills / (x_mills + o_mills) if x_mills > o_mills else 0.5
-        else:
-            mill_score = 0.5
+        Args:
+            moves: (row, col) points to place on
+            cells: Flat int8 board (default: the cells of the game)
             
-        if potential_x_mills + potential_o_mills > 0:
-            potential_mill_score = potential_x_mills / (potential_x_mills + potential_o_mills)
-        else:
-            potential_mill_score = 0.5
-            
-        if x_count + o_count > 0:
-            piece_score = x_count / (x_count + o_count)
-        else:
-            piece_score = 0.5
-            
-        if x_strategic + o_strategic > 0:
-            strategic_score = x_strategic / (x_strategic + o_strategic)
+        Returns:
+            A float64 array with one probability per move
+        """
+        if cells is None:
+            cells = self.cells
+        targets = np.array([self.point_index[move] for move in moves], dtype=np.intp)
+        x = cells == 1
+        o = cells == -1
+        gained = ~x[targets]
+        lost = o[targets]
+        touched = MILL_POINTS[:, targets].T
+        strategic = np.isin(targets, STRATEGIC_POINTS)
+        
+        features = bayesian_components(x[MILL_INDEX].sum(axis=1) + (touched & gained[:, None]),
+                                       o[MILL_INDEX].sum(axis=1) - (touched & lost[:, None]),
+                                       np.count_nonzero(x) + gained,
+                                       np.count_nonzero(o) - lost,
+                                       np.count_nonzero(x[STRATEGIC_POINTS]) + (strategic & gained),
+                                       np.count_nonzero(o[STRATEGIC_POINTS]) - (strategic & lost))
+        return bayesian_probability(features, self.weights)
+    
+    def bayesian_evaluation(self, board_array=None, move=None):
+        """
+        Bayesian evaluation of a board state
+        Returns a probability of winning for 'x'
+        
+        Args:
+            board_array: 7x7 board to evaluate instead of the game's own board
+            move: (row, col) where an 'x' is placed first
+        """
+        if board_array is None:
+            cells = self.cells
         else:
-            strategic_score = 0.5
+            cells = self.create_cells([board_array[row][col] for row, col in self.positions])
             
-        if x_blocks + o_blocks > 0:
-            blocking_score = x_blocks / (x_blocks + o_blocks)
-        else:
-            blocking_score = 0.5
-        
-        mill_combined = (mill_score + potential_mill_score) / 2
-        win_probability = (
-            weights['mills'] * mill_combined + 
-            weights['blocking'] * blocking_score + 
-            weights['pieces'] * piece_score + 
-            weights['strategic'] * strategic_score
-        )
-        
-        return win_probability
+        if move:
+            return float(self.placement_probabilities([move], cells)[0])
+        return float(bayesian_batch(cells[None, :], self.weights)[0])
     
     def bayesian_decision(self):
         """Use a Bayesian approach to decide the best move"""
@@ -225,15 +182,11 @@ class NineMensMorris:
         if not valid_moves:
             return None, 0.0
         
-        move_probabilities = {}
-        for move in valid_moves:
-            win_probability = self.bayesian_evaluation(self.board_array, move)
-            move_probabilities[move] = win_probability
-        
-        best_move = max(move_probabilities, key=move_probabilities.get)
-        best_prob = move_probabilities[best_move]
+        move_probabilities = self.placement_probabilities(valid_moves)
         
-        return best_move, best_prob
+        # argmax keeps the first of equal probabilities, like max over the moves in order.
+        best = int(np.argmax(move_probabilities))
+        return valid_moves[best], float(move_probabilities[best])
     
     def make_best_move(self):
         """Make the best move according to the Bayesian network"""
@@ -259,13 +212,14 @@ class NineMensMorris:
     def print_clear_board(self):
         """Print a clearer representation of the board"""
         clear_board = [[' ' for _ in range(7)] for _ in range(7)]
+        board_array = self.board_array
         
         for pos in self.positions:
             clear_board[pos[0]][pos[1]] = '-'
         
         for pos in self.positions:
-            if self.board_array[pos[0]][pos[1]] != '':
-                clear_board[pos[0]][pos[1]] = self.board_array[pos[0]][pos[1]]
+            if board_array[pos[0]][pos[1]] != '':
+                clear_board[pos[0]][pos[1]] = board_array[pos[0]][pos[1]]
         
         print("Current Board:")
         print("  a     d     g")
@@ -296,48 +250,49 @@ class NineMensMorris:
         new_state, new_pieces = self.simulate_move(move, 'o')
         return new_state, new_pieces, move
 
-board_state = ["", "x", "x", "0", "x", "", "", "", "0", "x", "0", "x", "", "0", ""]
-pieces_to_place = (3, 4)
+if __name__ == "__main__":
+    board_state = ["", "x", "x", "0", "x", "", "", "", "0", "x", "0", "x", "", "0", ""]
+    pieces_to_place = (3, 4)
 
-game = NineMensMorris(board_state, pieces_to_place)
+    game = NineMensMorris(board_state, pieces_to_place)
 
-print("Initial state:")
-print(game.format_board(board_state))
-print(f"Pieces to place: x={pieces_to_place[0]}, o={pieces_to_place[1]}")
-print("\nInitial board visualization:")
-game.print_clear_board()
+    print("Initial state:")
+    print(game.format_board(board_state))
+    print(f"Pieces to place: x={pieces_to_place[0]}, o={pieces_to_place[1]}")
+    print("\nInitial board visualization:")
+    game.print_clear_board()
 
-print("\n--- First move (player 'x') ---")
-new_state, new_pieces, probability, x_move = game.make_best_move()
-print(f"Player 'x' placed a piece at position {x_move}")
-print("New state:")
-print(game.format_board(new_state))
-print(f"New pieces to place: x={new_pieces[0]}, o={new_pieces[1]}")
-print(f"Win probability: {probability:.4f}")
+    print("\n--- First move (player 'x') ---")
+    new_state, new_pieces, probability, x_move = game.make_best_move()
+    print(f"Player 'x' placed a piece at position {x_move}")
+    print("New state:")
+    print(game.format_board(new_state))
+    print(f"New pieces to place: x={new_pieces[0]}, o={new_pieces[1]}")
+    print(f"Win probability: {probability:.4f}")
 
-game = NineMensMorris(new_state, new_pieces)
-print("\nBoard after 'x' move:")
-game.print_clear_board()
+    game = NineMensMorris(new_state, new_pieces)
+    print("\nBoard after 'x' move:")
+    game.print_clear_board()
 
-print("\n--- Second move (player 'o') ---")
-o_state, o_pieces, o_move = game.opponent_move()
-print(f"Player 'o' placed a piece at position {o_move}")
-print("New state after 'o' move:")
-print(game.format_board(o_state))
-print(f"New pieces to place: x={o_pieces[0]}, o={o_pieces[1]}")
+    print("\n--- Second move (player 'o') ---")
+    o_state, o_pieces, o_move = game.opponent_move()
+    print(f"Player 'o' placed a piece at position {o_move}")
+    print("New state after 'o' move:")
+    print(game.format_board(o_state))
+    print(f"New pieces to place: x={o_pieces[0]}, o={o_pieces[1]}")
 
-game = NineMensMorris(o_state, o_pieces)
-print("\nBoard after 'o' move:")
-game.print_clear_board()
+    game = NineMensMorris(o_state, o_pieces)
+    print("\nBoard after 'o' move:")
+    game.print_clear_board()
 
-print("\n--- Third move (player 'x') ---")
-final_state, final_pieces, final_probability, final_move = game.make_best_move()
-print(f"Player 'x' placed a piece at position {final_move}")
-print("Final state:")
-print(game.format_board(final_state))
-print(f"Final pieces to place: x={final_pieces[0]}, o={final_pieces[1]}")
-print(f"Win probability: {final_probability:.4f}")
+    print("\n--- Third move (player 'x') ---")
+    final_state, final_pieces, final_probability, final_move = game.make_best_move()
+    print(f"Player 'x' placed a piece at position {final_move}")
+    print("Final state:")
+    print(game.format_board(final_state))
+    print(f"Final pieces to place: x={final_pieces[0]}, o={final_pieces[1]}")
+    print(f"Win probability: {final_probability:.4f}")
 
-game = NineMensMorris(final_state, final_pieces)
-print("\nFinal board:")
-game.print_clear_board()
\ No newline at end of file
+    game = NineMensMorris(final_state, final_pieces)
+    print("\nFinal board:")
+    game.print_clear_board()
\ No newline at end of file
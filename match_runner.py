@@ -0,0 +1,418 @@
+"""
+Engine-vs-engine match runner.
+
+Plays many games between player configurations across a process pool and streams
+one JSON line per finished game (result, moves and per-move timings) to a file.
+At the end it prints each pairing's score with an Elo difference and its 95%
+confidence interval. Games already in the output file are skipped, so an
+interrupted match continues where it stopped when run again with the same
+arguments.
+
+    python match_runner.py --player name=ab3,algorithm=AlphaBeta,depth=3 \\
+                           --player name=bayes,engine=bayesian --games 200
+
+A player is a comma-separated list of key=value settings:
+
+    name            label used in the results (default: derived from the settings)
+    engine          "minimax" (NineMensMorrisGame, default) or "bayesian" (main2.NineMensMorris)
+    algorithm       "MinMax", "AlphaBeta", "Negamax", "DFPN" or "MCTS" (minimax engine)
+    depth           search depth (default 3, or no limit with time_limit_ms)
+    time_limit_ms   time budget per move (iterative deepening)
+    quiescence      1 to enable the quiescence search
+    tt_mb           transposition table size, 0 for none
+
+Every opening (a few random plies from the empty board) is played twice with the
+colours reversed. A game is drawn when it reaches --max-plies, when a position occurs
+for the --repetitions-th time or after --no-capture-plies plies without a capture or
+a placement; the engines are told the game history and the same draw rules.
+"""
+
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import bitboard
+from bitboard import NO_CAPTURE_LIMIT, PLAYERS, REPETITION_LIMIT, Position, popcount
+
+WIN, DRAW, LOSS = 1.0, 0.5, 0.0
+
+
+def parse_player(text):
+    """Parse a "key=value,key=value" player specification into a dict."""
+    spec = {'engine': 'minimax', 'algorithm': 'AlphaBeta', 'depth': None, 'time_limit_ms': None,
+            'quiescence': False, 'tt_mb': 0}
+    for item in text.split(','):
+        key, _, value = item.partition('=')
+        key = key.strip()
+        if key not in spec and key != 'name':
+            raise ValueError(f"Unknown player setting: {key}")
+        if key in ('depth', 'time_limit_ms', 'tt_mb'):
+            value = int(value) if value not in ('', 'None') else None
+        elif key == 'quiescence':
+            value = value.lower() in ('1', 'true', 'yes')
+        spec[key] = value
+    if spec['depth'] is None and spec['time_limit_ms'] is None:
+        spec['depth'] = 3
+    if 'name' not in spec:
+        if spec['engine'] == 'bayesian':
+            spec['name'] = 'bayesian'
+        else:
+            limit = '-'.join(([f"{spec['time_limit_ms']}ms"] if spec['time_limit_ms'] else [])
+                             + ([f"d{spec['depth']}"] if spec['depth'] is not None else []))
+            spec['name'] = f"{spec['algorithm']}-{limit}{'-q' if spec['quiescence'] else ''}"
+    return spec
+
+
+class EnginePlayer:
+    """Plays with NineMensMorrisGame; '0' is played by searching the colour-swapped board as 'x'."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self._engine = importlib.import_module('improved-nine-mens-morris')
+
+    def new_game(self, draw_rules):
+        self._draw_rules = draw_rules
+        if self.spec['tt_mb']:
+            from transposition import TranspositionTable
+            self._table = TranspositionTable(self.spec['tt_mb'])
+        else:
+            self._table = None
+        # Monte Carlo tree kept for the whole game, to reuse the subtree of the moves played.
+        if self.spec['algorithm'] == 'MCTS':
+            from mcts import MonteCarloTreeSearch
+            self._tree = MonteCarloTreeSearch()
+        else:
+            self._tree = None
+
+    def choose(self, position, history):
+        side = position.side
+        own, opp = position.bb[side], position.bb[side ^ 1]
+        to_place = (position.to_place[side], position.to_place[side ^ 1])
+        if side:
+            history = [(bitboard.to_board(o_bb, x_bb), (o_place, x_place))
+                       for x_bb, o_bb, (x_place, o_place) in history]
+        else:
+            history = [(bitboard.to_board(x_bb, o_bb), pieces_to_place) for x_bb, o_bb, pieces_to_place in history]
+        game = self._engine.NineMensMorrisGame(bitboard.to_board(own, opp), to_place, self._table, mcts=self._tree,
+                                               history=history, draw_rules=self._draw_rules)
+        best = game.get_best_move(self.spec['algorithm'], self.spec['depth'], self.spec['time_limit_ms'],
+                                  quiescence=self.spec['quiescence'])
+        if best is None:
+            return None
+        return bitboard.move_between(own, opp, *bitboard.from_board(best[0]))
+
+
+class BayesianPlayer:
+    """
+    Plays with main2.NineMensMorris: every legal move is scored with its
+    bayesian_evaluation of the resulting board (as 'x', on the colour-swapped board
+    when playing '0') and the most probable win is chosen.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self._module = importlib.import_module('main2')
+
+    def new_game(self, draw_rules):
+        pass
+
+    def choose(self, position, history):
+        side = position.side
+        own, opp = position.bb[side], position.bb[side ^ 1]
+        own_to_place, opp_to_place = position.to_place[side], position.to_place[side ^ 1]
+        best_move, best_probability = None, -1.0
+        for move in position.moves():
+            new_own, new_opp = bitboard.apply_move(own, opp, move)
+            board = bitboard.to_board(new_own, new_opp)
+            # A placement uses up one of the mover's pieces to place.
+            to_place = (own_to_place - 1 if move.frm is None else own_to_place, opp_to_place)
+            game = self._module.NineMensMorris(board, to_place)
+            probability = game.bayesian_evaluation()
+            if probability > best_probability:
+                best_move, best_probability = move, probability
+        return best_move
+
+
+def make_player(spec):
+    if spec['engine'] == 'bayesian':
+        return BayesianPlayer(spec)
+    if spec['engine'] == 'minimax':
+        return EnginePlayer(spec)
+    raise ValueError(f"Unknown engine: {spec['engine']}")
+
+
+def random_opening(seed, plies):
+    """
+    Return `plies` random legal moves from the empty board, as [frm, to, removed] lists.
+    The seed may be anything random.Random accepts; a string gives the same opening in
+    every process.
+    """
+    rng = random.Random(seed)
+    position = Position(0, 0, (9, 9))
+    moves = []
+    for _ in range(plies):
+        legal = list(position.moves())
+        if not legal:
+            break
+        move = rng.choice(legal)
+        position.make_move(move)
+        moves.append(list(move))
+    return moves
+
+
+def _game_over(position):
+    """Return the winning side index if the game is over with the side to move, else None."""
+    side = position.side
+    if not position.to_place[side] and popcount(position.bb[side]) <= 2:
+        return side ^ 1
+    if next(position.moves(), None) is None:
+        return side ^ 1
+    return None
+
+
+_players = {}
+
+
+def _player(spec):
+    """Players are cached per worker process and reused across games."""
+    key = json.dumps(spec, sort_keys=True)
+    player = _players.get(key)
+    if player is None:
+        player = _players[key] = make_player(spec)
+    return player
+
+
+def play_game(task):
+    """
+    Worker: play one game.
+
+    Args:
+        task: A tuple (game index, spec of 'x', spec of '0', opening moves, max plies,
+              (repetition limit, no-capture limit))
+
+    Returns:
+        The game record as a dict
+    """
+    index, x_spec, o_spec, opening, max_plies, draw_rules = task
+    repetition_limit, no_capture_limit = draw_rules
+    players = (_player(x_spec), _player(o_spec))
+    for player in players:
+        player.new_game(draw_rules)
+
+    position = Position(0, 0, (9, 9))
+    # (x_bb, o_bb, pieces_to_place) of the positions since the last capture or placement.
+    history = []
+
+    def play(move):
+        history.append((position.bb[0], position.bb[1], position.pieces_to_place))
+        position.make_move(move)
+        if not position.quiet_plies:
+            history.clear()
+
+    for move in opening:
+        play(bitboard.Move(*move))
+    moves = []
+    times_ms = []
+    winner = _game_over(position)
+    reason = 'no moves or pieces' if winner is not None else None
+    started = time.perf_counter()
+    while winner is None:
+        if len(opening) + len(moves) >= max_plies:
+            reason = 'max plies'
+            break
+        if position.is_draw(repetition_limit, None):
+            reason = 'repetition'
+            break
+        if position.is_draw(None, no_capture_limit):
+            reason = 'no captures'
+            break
+        side = position.side
+        move_started = time.perf_counter()
+        move = players[side].choose(position, history)
+        times_ms.append(round((time.perf_counter() - move_started) * 1000, 3))
+        if move is None or move not in set(position.moves()):
+            winner, reason = side ^ 1, 'illegal move'
+            break
+        play(move)
+        moves.append(list(move))
+        winner = _game_over(position)
+        if winner is not None:
+            reason = 'no moves or pieces'
+
+    score = DRAW if winner is None else (WIN if winner == 0 else LOSS)
+    return {
+        'game': index,
+        'x': x_spec['name'],
+        'o': o_spec['name'],
+        'score_x': score,
+        'result': {WIN: '1-0', DRAW: '1/2-1/2', LOSS: '0-1'}[score],
+        'reason': reason,
+        'plies': len(opening) + len(moves),
+        'opening': opening,
+        'moves': moves,
+        'move_times_ms': times_ms,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def schedule(specs, games, opening_plies, seed, max_plies, draw_rules=(REPETITION_LIMIT, NO_CAPTURE_LIMIT)):
+    """
+    Return the task of every game of a round robin between specs: `games` games per
+    pairing, in pairs sharing a random opening with the colours reversed.
+    """
+    tasks = []
+    pairings = [(a, b) for a in range(len(specs)) for b in range(a + 1, len(specs))]
+    for pairing, (a, b) in enumerate(pairings):
+        for game in range(games):
+            opening = random_opening(f"{seed}-{pairing}-{game // 2}", opening_plies)
+            first, second = (specs[a], specs[b]) if game % 2 == 0 else (specs[b], specs[a])
+            tasks.append((len(tasks), first, second, opening, max_plies, draw_rules))
+    return tasks
+
+
+def load_results(path):
+    """Read the game records of a results file, ignoring a truncated last line."""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
+
+
+def _drop_partial_line(path):
+    """Cut a line left unfinished by an interrupted run off the end of a results file."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+
+
+def elo(score, games):
+    """
+    Elo difference for a score fraction over a number of games, with a 95% confidence
+    interval from the normal approximation.
+
+    Returns:
+        A tuple (elo, low, high); infinite values mean a score of 0 or 1
+    """
+    def to_elo(p):
+        if p <= 0:
+            return float('-inf')
+        if p >= 1:
+            return float('inf')
+        return -400 * math.log10(1 / p - 1)
+
+    if not games:
+        return 0.0, float('-inf'), float('inf')
+    return to_elo(score), to_elo(score - 1.96 * _stderr(score, games)), to_elo(score + 1.96 * _stderr(score, games))
+
+
+def _stderr(score, games):
+    return math.sqrt(max(score * (1 - score), 0.0) / games) if games > 1 else 0.5
+
+
+def summarize(records):
+    """
+    Score every pairing from the first player's point of view.
+
+    Returns:
+        A dict mapping (player, opponent) to a dict with games, wins, draws, losses,
+        score fraction, elo and its 95% interval (elo_low, elo_high)
+    """
+    pairings = {}
+    for record in records:
+        a, b = sorted((record['x'], record['o']))
+        score_a = record['score_x'] if record['x'] == a else 1 - record['score_x']
+        entry = pairings.setdefault((a, b), {'games': 0, 'wins': 0, 'draws': 0, 'losses': 0, 'points': 0.0})
+        entry['games'] += 1
+        entry['points'] += score_a
+        entry['wins' if score_a == WIN else 'draws' if score_a == DRAW else 'losses'] += 1
+    for entry in pairings.values():
+        entry['score'] = entry['points'] / entry['games']
+        entry['elo'], entry['elo_low'], entry['elo_high'] = elo(entry['score'], entry['games'])
+    return pairings
+
+
+def run_match(specs, games, out, workers=None, opening_plies=4, seed=0, max_plies=200, log=None,
+              draw_rules=(REPETITION_LIMIT, NO_CAPTURE_LIMIT)):
+    """
+    Play every game of the match that is not in the out file yet, appending the
+    records as games finish. draw_rules is (repetition limit, no-capture limit), with
+    None turning a rule off.
+
+    Returns:
+        summarize() of all the records in the out file
+    """
+    done = {record['game'] for record in load_results(out)}
+    tasks = [task for task in schedule(specs, games, opening_plies, seed, max_plies, draw_rules) if task[0] not in done]
+    if log:
+        log(f"{len(done)} games already played, {len(tasks)} to play")
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    _drop_partial_line(out)
+    with open(out, 'a') as f, ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(play_game, task) for task in tasks]
+        for finished, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            if log:
+                log(f"[{finished}/{len(tasks)}] game {record['game']}: {record['x']} - {record['o']} "
+                    f"{record['result']} ({record['reason']}, {record['plies']} plies)")
+    return summarize(load_results(out))
+
+
+def format_summary(summary):
+    lines = []
+    for (a, b), entry in sorted(summary.items()):
+        lines.append(f"{a} vs {b}: +{entry['wins']} ={entry['draws']} -{entry['losses']} "
+                     f"({entry['score']:.3f}) Elo {entry['elo']:+.0f} "
+                     f"[{entry['elo_low']:+.0f}, {entry['elo_high']:+.0f}]")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play Nine Men's Morris engine matches.")
+    parser.add_argument('--player', action='append', required=True, type=parse_player,
+                        help="player settings, e.g. name=ab3,algorithm=AlphaBeta,depth=3 (at least two)")
+    parser.add_argument('--games', type=int, default=100, help="games per pairing")
+    parser.add_argument('--out', default='match.jsonl', help="results file (appended to, used to resume)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--opening-plies', type=int, default=4, help="random plies at the start of each game")
+    parser.add_argument('--max-plies', type=int, default=200, help="plies after which a game is drawn")
+    parser.add_argument('--repetitions', type=int, default=REPETITION_LIMIT,
+                        help="occurrences of a position that draw the game, 0 for no repetition rule")
+    parser.add_argument('--no-capture-plies', type=int, default=NO_CAPTURE_LIMIT,
+                        help="plies without a capture or placement that draw the game, 0 for no limit")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    if len(args.player) < 2:
+        parser.error("at least two players are needed")
+    if len({spec['name'] for spec in args.player}) != len(args.player):
+        parser.error("player names must be unique")
+
+    summary = run_match(args.player, args.games, args.out, args.workers, args.opening_plies, args.seed,
+                        args.max_plies, lambda message: print(message, file=sys.stderr),
+                        (args.repetitions or None, args.no_capture_plies or None))
+    print(format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Monte Carlo tree search (UCT) for get_best_move(algorithm="MCTS").
+
+The tree grows one node per playout. Selection follows UCT, expansion adds one
+untried move, and a playout then finishes the game with the move generator of
+bitboard.py (the rules of get_possible_moves): a random move, or a mill-closing
+move with probability capture_bias. A playout still running after playout_plies
+plies is scored by the material left. Playouts run in batches: a batch selects
+several leaves with a virtual loss on their paths so that they differ, plays them
+out (in worker processes with workers > 1) and backs all results up together.
+
+The search is anytime: it stops at a deadline, a playout count or a stop request
+and returns the most visited move. The tree is kept between calls; when a later
+search starts from a position reached by the chosen move and the opponent's
+reply, that subtree becomes the new root.
+"""
+
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import apply_move, generate_moves, popcount
+
+_pools = {}
+
+
+class Node:
+    """
+    A position of the tree, stored relative to its side to move: own and opp
+    bitboards and pieces left to place, plus side (0 for 'x', 1 for '0').
+    """
+
+    __slots__ = ('move', 'parent', 'children', 'untried', 'visits', 'wins', 'state', 'side')
+
+    def __init__(self, state, side, move=None, parent=None):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        own, opp, own_place, _ = state
+        if not own_place and popcount(own) <= 2:
+            self.untried = []
+        else:
+            self.untried = list(generate_moves(own, opp, own_place > 0))
+        self.visits = 0
+        # Playout results for the player who moved into this node (1 per win, 0.5 per draw).
+        self.wins = 0.0
+        self.state = state
+        self.side = side
+
+    @property
+    def key(self):
+        """The position as (x_bb, o_bb, pieces_to_place, side)."""
+        own, opp, own_place, opp_place = self.state
+        if self.side == 0:
+            return own, opp, (own_place, opp_place), 0
+        return opp, own, (opp_place, own_place), 1
+
+    @property
+    def terminal(self):
+        return not self.untried and not self.children
+
+
+def play(state, move):
+    """Return the state after the side to move of state plays move."""
+    own, opp, own_place, opp_place = state
+    own, opp = apply_move(own, opp, move)
+    if move.frm is None:
+        own_place -= 1
+    return opp, own, opp_place, own_place
+
+
+def playout(state, rng, max_plies=200, capture_bias=0.8):
+    """
+    Finish a game from state with random moves.
+
+    Returns:
+        1.0 if the side to move of state wins, 0.0 if it loses, 0.5 for a draw by
+        material when max_plies is reached
+    """
+    own, opp, own_place, opp_place = state
+    for ply in range(max_plies):
+        moves = None
+        if own_place or popcount(own) > 2:
+            moves = list(generate_moves(own, opp, own_place > 0))
+        if not moves:
+            return 0.0 if ply & 1 == 0 else 1.0
+        if capture_bias and rng.random() < capture_bias:
+            captures = [move for move in moves if move.removed is not None]
+            if captures:
+                moves = captures
+        move = rng.choice(moves)
+        own, opp = apply_move(own, opp, move)
+        if move.frm is None:
+            own_place -= 1
+        own, opp, own_place, opp_place = opp, own, opp_place, own_place
+    material = popcount(own) + own_place - popcount(opp) - opp_place
+    result = 1.0 if material > 0 else 0.0 if material < 0 else 0.5
+    return result if max_plies & 1 == 0 else 1.0 - result
+
+
+def _playout_batch(task):
+    """Worker: play out a list of states."""
+    states, seed, max_plies, capture_bias = task
+    rng = random.Random(seed)
+    return [playout(state, rng, max_plies, capture_bias) for state in states]
+
+
+def _process_pool(workers):
+    pool = _pools.get(workers)
+    if pool is None:
+        pool = _pools[workers] = ProcessPoolExecutor(workers)
+    return pool
+
+
+class MonteCarloTreeSearch:
+    def __init__(self, exploration=1.4, batch_size=32, playout_plies=200, capture_bias=0.8, seed=None):
+        """
+        Args:
+            exploration: UCT exploration constant
+            batch_size: Leaves selected and played out together
+            playout_plies: Plies after which a playout is scored by material
+            capture_bias: Probability of playing a mill-closing move when there is one
+            seed: Seed of the random playouts
+        """
+        self.exploration = exploration
+        self.batch_size = batch_size
+        self.playout_plies = playout_plies
+        self.capture_bias = capture_bias
+        self.rng = random.Random(seed)
+        self.root = None
+        # Playouts of the last search, and whether its root came from the previous tree.
+        self.playouts = 0
+        self.reused = False
+
+    def _set_root(self, x_bb, o_bb, pieces_to_place, side):
+        key = (x_bb, o_bb, tuple(pieces_to_place), side)
+        root = self.root
+        # The root itself, or a position after one or two moves from it.
+        candidates = [root] if root is not None else []
+        if root is not None:
+            candidates += root.children
+            candidates += [grandchild for child in root.children for grandchild in child.children]
+        for node in candidates:
+            if node.key == key:
+                node.parent = None
+                node.move = None
+                self.root = node
+                self.reused = True
+                return node
+        own, opp = (x_bb, o_bb) if side == 0 else (o_bb, x_bb)
+        self.root = Node((own, opp, pieces_to_place[side], pieces_to_place[side ^ 1]), side)
+        self.reused = False
+        return self.root
+
+    def _select(self, root):
+        """Walk down by UCT and expand one move; every node on the path gets a virtual visit."""
+        node = root
+        node.visits += 1
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            exploration = self.exploration
+            node = max(node.children,
+                       key=lambda child: child.wins / child.visits
+                       + exploration * math.sqrt(log_visits / child.visits))
+            node.visits += 1
+        if node.untried:
+            move = node.untried.pop(self.rng.randrange(len(node.untried)))
+            child = Node(play(node.state, move), node.side ^ 1, move, node)
+            node.children.append(child)
+            node = child
+            node.visits += 1
+        return node
+
+    @staticmethod
+    def _backpropagate(node, result):
+        """Add a playout result, for the side to move at node, to node and its ancestors."""
+        reward = 1.0 - result
+        while node is not None:
+            node.wins += reward
+            reward = 1.0 - reward
+            node = node.parent
+
+    def _play_out(self, leaves, workers):
+        """Play out the states of leaves, split over `workers` processes when greater than 1."""
+        states = [leaf.state for leaf in leaves]
+        if workers is None or workers <= 1 or len(states) < 2:
+            return [playout(state, self.rng, self.playout_plies, self.capture_bias) for state in states]
+        size = -(-len(states) // workers)
+        tasks = [(states[start:start + size], self.rng.getrandbits(32), self.playout_plies, self.capture_bias)
+                 for start in range(0, len(states), size)]
+        return [result for chunk in _process_pool(workers).map(_playout_batch, tasks) for result in chunk]
+
+    def search(self, x_bb, o_bb, pieces_to_place, side=0, deadline=None, max_playouts=None, workers=None,
+               should_stop=None):
+        """
+        Grow the tree from a position until the deadline (a time.perf_counter value),
+        max_playouts or should_stop() (checked between batches) ends the search.
+
+        Returns:
+            The most visited bitboard.Move, or None when the side to move has no move
+        """
+        root = self._set_root(x_bb, o_bb, pieces_to_place, side)
+        if root.terminal:
+            return None
+        if workers is not None and workers > 1:
+            _process_pool(workers)
+        self.playouts = 0
+        while True:
+            if max_playouts is not None and self.playouts >= max_playouts:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if should_stop is not None and should_stop():
+                break
+            count = self.batch_size
+            if max_playouts is not None:
+                count = min(count, max_playouts - self.playouts)
+            leaves = [self._select(root) for _ in range(count)]
+            for leaf, result in zip(leaves, self._play_out(leaves, workers)):
+                self._backpropagate(leaf, result)
+            self.playouts += count
+        if not root.children:
+            return root.untried[0]
+        return max(root.children, key=lambda child: child.visits).move
+
+    def principal_variation(self, max_length=16):
+        """Most visited line from the root, as a list of bitboard.Moves."""
+        line = []
+        node = self.root
+        while node is not None and node.children and len(line) < max_length:
+            node = max(node.children, key=lambda child: child.visits)
+            line.append(node.move)
+        return line
+
+    def win_rate(self):
+        """Fraction of playouts won by the side to move at the root through its most visited move."""
+        if self.root is None or not self.root.children:
+            return None
+        best = max(self.root.children, key=lambda child: child.visits)
+        return best.wins / best.visits
+
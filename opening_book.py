@@ -0,0 +1,218 @@
+"""
+Opening book for the placement phase.
+
+The book is built offline: every placement position reachable in the first
+plies of a game is reduced by the 16 board symmetries (see bitboard.SYMMETRIES),
+searched deeply with alpha-beta, and the best reply is stored for the canonical
+form only. A lookup canonicalises the position, finds it with a single hash probe
+and maps the stored move back.
+
+Positions are stored with the side to move as 'x', the way get_best_move sees them
+(a caller playing '0' swaps the colours), so the book covers the second player's
+moves too: a position with '0' to move is looked up with its colours swapped.
+
+File format:
+
+    header  HEADER: magic, search depth, plies covered, number of slots (a power
+            of two), number of positions
+    slots   SLOT records (key, move, score) of an open-addressing hash table with
+            linear probing; key 0 marks an empty slot
+
+A key is the position code (bitboard.encode) of the canonical position, with the
+top bit set so that no key is 0. A move is its bitboard.encode_move code, in the
+canonical frame, and a score is from the point of view of the side to move.
+"""
+
+import argparse
+import importlib
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import (INVERSE_SYMMETRIES, apply_move, canonical, decode_move, encode, encode_move, from_board,
+                      generate_moves, move_between, to_board, transform_move)
+from transposition import TranspositionTable
+
+MAGIC = b'NMMOB\x00\x02\x00'
+HEADER = struct.Struct('<8sBB6xQQ')
+SLOT = struct.Struct('<QHh')
+
+_OCCUPIED = 1 << 63
+_MASK64 = (1 << 64) - 1
+
+
+def book_key(x_bb, o_bb, pieces_to_place):
+    """Key of a canonical position with 'x' to move (x_bb, o_bb already in canonical form)."""
+    return _OCCUPIED | encode(x_bb, o_bb, pieces_to_place)
+
+
+def _slot(key, bits):
+    return (key * 0x9E3779B97F4A7C15 & _MASK64) >> (64 - bits)
+
+
+class OpeningBook:
+    def __init__(self, path):
+        """Open a book file read-only through mmap."""
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.depth, self.plies, slots, self.positions = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC or slots & (slots - 1) or len(self._data) != HEADER.size + slots * SLOT.size:
+            raise ValueError(f"Not a valid opening book file: {path}")
+        self.path = path
+        self._bits = slots.bit_length() - 1
+        self._mask = slots - 1
+
+    def __len__(self):
+        return self.positions
+
+    def _find(self, key):
+        """Return (move, score) stored for key, or None."""
+        index = _slot(key, self._bits)
+        data = self._data
+        while True:
+            stored, move, score = SLOT.unpack_from(data, HEADER.size + index * SLOT.size)
+            if stored == key:
+                return decode_move(move), score
+            if stored == 0:
+                return None
+            index = (index + 1) & self._mask
+
+    def probe(self, x_bb, o_bb, pieces_to_place, side=0):
+        """
+        Look up a position.
+
+        Returns:
+            A tuple (move, score) with move a bitboard.Move of the side to move and
+            score from 'x's point of view, or None if the position is not in the book
+        """
+        if not pieces_to_place[side]:
+            return None
+        if side:
+            x_bb, o_bb, pieces_to_place = o_bb, x_bb, (pieces_to_place[1], pieces_to_place[0])
+        cx, co, symmetry = canonical(x_bb, o_bb)
+        found = self._find(book_key(cx, co, pieces_to_place))
+        if found is None:
+            return None
+        move, score = found
+        return transform_move(move, INVERSE_SYMMETRIES[symmetry]), -score if side else score
+
+    def lookup(self, position):
+        """Return the book move (a bitboard.Move) for a bitboard.Position, or None."""
+        found = self.probe(position.bb[0], position.bb[1], position.to_place, position.side)
+        return found[0] if found is not None else None
+
+    def close(self):
+        self._data.close()
+
+
+def book_positions(plies, pieces_to_place=(9, 9)):
+    """
+    Canonical placement positions in the first plies of a game, with the side to move
+    as 'x' (the colours of the positions with '0' to move are swapped).
+
+    Returns:
+        A sorted list of (x_bb, o_bb, pieces_to_place) tuples
+    """
+    frontier = {(0, 0, tuple(pieces_to_place))}
+    positions = set()
+    for ply in range(plies + 1):
+        side = ply & 1
+        if side == 0:
+            positions.update(frontier)
+        else:
+            positions.update(canonical(o_bb, x_bb)[:2] + ((to_place[1], to_place[0]),)
+                             for x_bb, o_bb, to_place in frontier)
+        if ply == plies:
+            break
+        children = set()
+        for x_bb, o_bb, to_place in frontier:
+            if not to_place[side]:
+                continue
+            own, opp = (x_bb, o_bb) if side == 0 else (o_bb, x_bb)
+            next_place = (to_place[0] - 1, to_place[1]) if side == 0 else (to_place[0], to_place[1] - 1)
+            for move in generate_moves(own, opp, True):
+                new_own, new_opp = apply_move(own, opp, move)
+                new_x, new_o = (new_own, new_opp) if side == 0 else (new_opp, new_own)
+                cx, co, _ = canonical(new_x, new_o)
+                children.add((cx, co, next_place))
+        frontier = children
+    return sorted(position for position in positions if position[2][0])
+
+
+def _search_position(task):
+    """Search one book position in a worker; returns (key, encoded move, score)."""
+    x_bb, o_bb, pieces_to_place, depth, tt_mb = task
+    engine = importlib.import_module('improved-nine-mens-morris')
+    game = engine.NineMensMorrisGame(to_board(x_bb, o_bb), pieces_to_place, TranspositionTable(tt_mb))
+    score, best = game.minimax(depth, float('-inf'), float('inf'), True, use_alpha_beta=True)
+    if best is None:
+        return None
+    move = move_between(x_bb, o_bb, *from_board(best[0]))
+    return book_key(x_bb, o_bb, pieces_to_place), encode_move(move), max(-32768, min(32767, score))
+
+
+def build(path, plies=2, depth=6, workers=1, tt_mb=16, log=None):
+    """
+    Build an opening book file.
+
+    Args:
+        path: Output file
+        plies: Cover the positions reached in the first plies of a game
+        depth: Alpha-beta search depth for each position
+        workers: Number of processes searching positions in parallel
+        tt_mb: Transposition table size per search in megabytes
+        log: Optional callable receiving progress messages
+
+    Returns:
+        The number of positions stored
+    """
+    started = time.perf_counter()
+    positions = book_positions(plies)
+    if log:
+        log(f"{len(positions)} positions up to ply {plies}, searching to depth {depth}")
+    tasks = [(x_bb, o_bb, to_place, depth, tt_mb) for x_bb, o_bb, to_place in positions]
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_search_position, tasks, chunksize=4))
+    else:
+        results = [_search_position(task) for task in tasks]
+    results = [result for result in results if result is not None]
+
+    bits = 1
+    while (1 << bits) < 2 * len(results):
+        bits += 1
+    mask = (1 << bits) - 1
+    slots = [None] * (1 << bits)
+    for result in results:
+        index = _slot(result[0], bits)
+        while slots[index] is not None:
+            index = (index + 1) & mask
+        slots[index] = result
+
+    with open(path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, depth, plies, len(slots), len(results)))
+        empty = SLOT.pack(0, 0, 0)
+        f.write(b''.join(empty if slot is None else SLOT.pack(*slot) for slot in slots))
+    os.replace(path + '.tmp', path)
+    if log:
+        log(f"{len(results)} positions written to {path} in {time.perf_counter() - started:.1f}s")
+    return len(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a Nine Men's Morris placement-phase opening book.")
+    parser.add_argument('--out', default='opening.book', help="output file")
+    parser.add_argument('--plies', type=int, default=2, help="cover positions up to this many plies into the game")
+    parser.add_argument('--depth', type=int, default=6, help="search depth per position")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--tt-mb', type=int, default=16, help="transposition table size per search")
+    args = parser.parse_args(argv)
+
+    build(args.out, args.plies, args.depth, args.workers, args.tt_mb, lambda message: print(message, file=sys.stderr))
+
+
+if __name__ == "__main__":
+    main()
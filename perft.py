@@ -0,0 +1,247 @@
+"""
+Perft for the move generator: count the leaf nodes of the full move tree to a fixed
+depth from reference positions covering every phase of the game (placement,
+sliding, flying and mill captures).
+
+The counts are compared with the ones recorded in a baseline file, and the speed
+with nodes per second recorded on the same machine, so a generator optimisation
+that changes the rules or slows the generator down is caught:
+
+    python perft.py                      # check against perft_baseline.json
+    python perft.py --update             # record the current counts and timings
+    python perft.py --divide moving      # per-root-move counts of one position
+
+Each position is counted three ways that must agree: by generating the moves of
+every node (bitboard.generate_moves with make/unmake), by counting the moves of
+the last ply without generating them (bitboard.count_moves), and through the list
+API (NineMensMorrisGame.get_possible_moves). The tree does not stop at won
+positions or draws; it follows the generator only, so the positions do not track
+repetitions, like those of a NineMensMorrisGame without a repetition rule.
+
+The counts are the same everywhere, and perft_baseline.json, which holds only
+them, is committed. Timings depend on the machine: --update also writes them to
+perft_timings.json, which git ignores, and the speed is only checked when that
+file exists.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+
+import bitboard
+
+# (name, board, pieces_to_place, side to move, depth); boards use the point order of
+# bitboard.py with 'x', '0' and ',' for an empty point.
+REFERENCE_POSITIONS = [
+    ('start', ',,,,,,,,,,,,,,,,,,,,,,,,', (9, 9), 0, 3),
+    ('placement-mills', 'xx,00,,,,,x,,,,00,,x,,,,', (5, 5), 0, 3),
+    ('placement-captures-from-mills', '000xx,,,,,,,,,,,,,,,,,,,', (7, 6), 0, 3),
+    ('last-placement', 'xx0x0000,xx,,x0,,,0x0,x0', (1, 0), 0, 4),
+    ('moving', 'xx0,00,0,xx,,x0,,,0x0,x,', (0, 0), 0, 4),
+    ('moving-captures', 'x0,x0,,,0,x,x00,,,,x0,x0', (0, 0), 1, 4),
+    ('blocked', 'x0x,0,,,,,0,,00,,,,0,x0x', (0, 0), 0, 5),
+    ('flying', 'x,,0,x,,,0,,x,,,0,,,,,,,', (0, 0), 0, 3),
+    ('flying-against-sliding', 'x0,,0,,x,00,,0,,,,,,0x,,', (0, 0), 0, 3),
+]
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perft_baseline.json')
+DEFAULT_TIMINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perft_timings.json')
+DEFAULT_THRESHOLD = 0.25
+
+
+def reference_position(name):
+    """Return a bitboard.Position and the depth of the named reference position."""
+    for ref_name, board, pieces_to_place, side, depth in REFERENCE_POSITIONS:
+        if ref_name == name:
+            x_bb, o_bb = bitboard.from_board(board)
+            return bitboard.Position(x_bb, o_bb, pieces_to_place, side, track_repetitions=False), depth
+    raise KeyError(f"Unknown reference position: {name}")
+
+
+def perft(position, depth):
+    """Count the leaf nodes depth plies below position, generating every move."""
+    if depth == 0:
+        return 1
+    nodes = 0
+    for move in position.moves():
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move(move)
+    return nodes
+
+
+def perft_counted(position, depth):
+    """Like perft, but count the moves of the last ply with Position.count_moves."""
+    if depth == 0:
+        return 1
+    if depth == 1:
+        return position.count_moves(position.side)
+    nodes = 0
+    for move in position.moves():
+        position.make_move(move)
+        nodes += perft_counted(position, depth - 1)
+        position.unmake_move(move)
+    return nodes
+
+
+def perft_boards(board, pieces_to_place, player, depth, engine=None):
+    """Like perft, but through the list API of NineMensMorrisGame.get_possible_moves."""
+    if depth == 0:
+        return 1
+    if engine is None:
+        engine = importlib.import_module('improved-nine-mens-morris')
+    opponent = '0' if player == 'x' else 'x'
+    game = engine.NineMensMorrisGame(board, pieces_to_place, draw_rules=(None, None))
+    nodes = 0
+    for new_board, new_pieces_to_place in game.get_possible_moves(player, opponent):
+        nodes += perft_boards(new_board, new_pieces_to_place, opponent, depth - 1, engine)
+    return nodes
+
+
+def divide(position, depth):
+    """Return a dict mapping each root move to the leaf count below it."""
+    counts = {}
+    for move in position.moves():
+        position.make_move(move)
+        counts[move] = perft(position, depth - 1)
+        position.unmake_move(move)
+    return counts
+
+
+def run_position(name, depth=None, repeat=5, min_seconds=0.1):
+    """
+    Count one reference position all three ways.
+
+    The generating perft is timed `repeat` times, each time running it as often as
+    needed to take at least min_seconds, and the median time is kept.
+
+    Returns:
+        A dict with the depth, the leaf count, the seconds and nodes per second of one
+        generating perft, and whether the three counts agree
+    """
+    position, ref_depth = reference_position(name)
+    if depth is None:
+        depth = ref_depth
+    timings = []
+    for _ in range(repeat):
+        runs = 0
+        start = time.perf_counter()
+        while True:
+            nodes = perft(position, depth)
+            runs += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_seconds:
+                break
+        timings.append(elapsed / runs)
+    seconds = sorted(timings)[len(timings) // 2]
+    counted = perft_counted(position, depth)
+    listed = perft_boards(position.board(), position.pieces_to_place, bitboard.PLAYERS[position.side], depth)
+    return {
+        'depth': depth,
+        'nodes': nodes,
+        'seconds': seconds,
+        'nodes_per_second': nodes / seconds if seconds else 0.0,
+        'consistent': nodes == counted == listed,
+    }
+
+
+def run_suite(baseline=None, threshold=DEFAULT_THRESHOLD, log=None, timings=None):
+    """
+    Run every reference position and compare with a baseline.
+
+    Args:
+        baseline: Dict of counts loaded from a baseline file, or None to only check
+                  consistency
+        threshold: Allowed relative drop in nodes per second from the timings
+        log: Optional callable receiving one line per position
+        timings: Dict loaded from a timings file recorded on this machine, or None to
+                 skip the speed check
+        log: Optional callable receiving one line per position
+
+    Returns:
+        A tuple (results, failures): the results of run_position by name and a list of
+        failure messages (empty when the suite passes)
+    """
+    results = {}
+    failures = []
+    for name, _, _, _, depth in REFERENCE_POSITIONS:
+        expected = baseline.get(name) if baseline else None
+        result = run_position(name, expected['depth'] if expected else depth)
+        results[name] = result
+        if log:
+            log(f"{name:32} depth {result['depth']}  {result['nodes']:>9} nodes  "
+                f"{result['seconds']:7.3f}s  {result['nodes_per_second']:>9.0f} nodes/s")
+        if not result['consistent']:
+            failures.append(f"{name}: generated, counted and list-API perft disagree")
+        if expected is not None and result['nodes'] != expected['nodes']:
+            failures.append(f"{name}: {result['nodes']} nodes at depth {result['depth']}, "
+                            f"expected {expected['nodes']}")
+        timing = timings.get(name) if timings else None
+        if timing is None or timing['depth'] != result['depth']:
+            continue
+        if result['nodes_per_second'] < timing['nodes_per_second'] * (1 - threshold):
+            failures.append(f"{name}: {result['nodes_per_second']:.0f} nodes/s, recorded "
+                            f"{timing['nodes_per_second']:.0f} (more than {threshold:.0%} slower)")
+    return results, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft suite for the Nine Men's Morris move generator.")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline file with the expected counts")
+    parser.add_argument('--timings', default=DEFAULT_TIMINGS,
+                        help="timings recorded on this machine (default: %(default)s)")
+    parser.add_argument('--update', action='store_true',
+                        help="write the current counts to the baseline and the timings to the timings file")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative drop in nodes per second (default: %(default)s)")
+    parser.add_argument('--divide', metavar='NAME', help="print per-root-move counts of a reference position")
+    parser.add_argument('--depth', type=int, help="depth for --divide (default: the position's depth)")
+    args = parser.parse_args(argv)
+
+    if args.divide:
+        position, depth = reference_position(args.divide)
+        counts = divide(position, args.depth or depth)
+        for move, nodes in counts.items():
+            print(f"{move}: {nodes}")
+        print(f"total: {sum(counts.values())}")
+        return 0
+
+    baseline = timings = None
+    if not args.update:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        if os.path.exists(args.timings):
+            with open(args.timings) as f:
+                timings = json.load(f)
+    results, failures = run_suite(baseline, args.threshold, print, timings)
+
+    if args.update:
+        if failures:
+            print("\n".join(failures), file=sys.stderr)
+            return 1
+        for path, keys in ((args.baseline, ('depth', 'nodes')),
+                           (args.timings, ('depth', 'seconds', 'nodes_per_second'))):
+            with open(path, 'w') as f:
+                json.dump({name: {key: result[key] for key in keys} for name, result in results.items()}, f, indent=2)
+                f.write('\n')
+        print(f"baseline written to {args.baseline}, timings to {args.timings}")
+        return 0
+
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; run with --update to record one", file=sys.stderr)
+    if timings is None:
+        print(f"no timings at {args.timings}; speed not checked (run with --update to record them)",
+              file=sys.stderr)
+    if failures:
+        print("\n".join(failures), file=sys.stderr)
+        return 1
+    print("perft ok")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
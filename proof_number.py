@@ -0,0 +1,274 @@
+"""
+Depth-first proof-number search (df-pn) for forced wins.
+
+The search proves or disproves that the side to move at the root (the attacker)
+can force a win, however long the winning line is, instead of scoring positions
+up to a horizon. Each node keeps a proof and a disproof number: how many leaves
+still have to be solved to prove it or to disprove it. Like the alpha-beta search
+in its negamax form, a node stores them from the point of view of its side to
+move as (phi, delta): (proof, disproof) where the attacker moves and (disproof,
+proof) where the defender moves. The search always expands the most-proving
+child, and only while both numbers stay under thresholds handed down by its
+parent, so it goes deep where the win is forced and shallow elsewhere.
+
+A position is lost for the side to move when it has two pieces left and none to
+place, or no legal move. A draw from an endgame tablebase, a repetition of a
+position on the current line and a line longer than max_ply all count as not
+winning for the attacker. (phi, delta) pairs live in a ProofTable of bounded size.
+
+The last two depend on the line that reached a position, not on the position
+alone. A proof never rests on them, but a disproof can: the attacker may fail
+only because a line returns to a position played earlier, or runs past max_ply.
+Such a disproof is stored with what it rests on: the positions of the line whose
+repetition it counted as a draw, and the least ply from which the horizon cuts
+the same lines. It is only reused where those positions are on the current line
+and at that ply or deeper; elsewhere the position is searched again.
+"""
+
+from bitboard import (POINTS, ZOBRIST_POINTS, ZOBRIST_SIDE, ZOBRIST_TO_PLACE, apply_move, generate_moves,
+                      popcount)
+
+PROVEN = 'proven'
+DISPROVEN = 'disproven'
+UNKNOWN = 'unknown'
+
+INFINITY = 1 << 40
+
+# Rough size of one stored entry (tuple and ints) in bytes.
+ENTRY_BYTES = 120
+
+
+class ProofTable:
+    def __init__(self, max_mb=16):
+        """
+        Create an empty table of two-slot buckets sized from a memory cap. As in
+        transposition.TWO_TIER, the first slot of a bucket keeps the entry with the most
+        work (nodes searched below it) and the second one the newest other entry.
+        """
+        buckets = 1
+        while buckets * 4 * ENTRY_BYTES <= max_mb * 1024 * 1024:
+            buckets *= 2
+        self._mask = buckets - 1
+        self._slots = [None] * (buckets * 2)
+
+    def __len__(self):
+        return sum(1 for entry in self._slots if entry is not None)
+
+    @property
+    def capacity(self):
+        """Maximum number of entries the table can hold."""
+        return len(self._slots)
+
+    def probe(self, key):
+        """Return (phi, delta, conditions) stored for key, or None."""
+        index = (key & self._mask) << 1
+        slots = self._slots
+        entry = slots[index]
+        if entry is not None and entry[0] == key:
+            return entry[1], entry[2], entry[4]
+        entry = slots[index + 1]
+        if entry is not None and entry[0] == key:
+            return entry[1], entry[2], entry[4]
+        return None
+
+    def store(self, key, phi, delta, work, conditions=None):
+        """
+        Store (phi, delta) for key; conditions are those of a disproof that depends on
+        the line searched (see ProofNumberSearch._conditions), or None.
+        """
+        index = (key & self._mask) << 1
+        slots = self._slots
+        entry = (key, phi, delta, work, conditions)
+        first = slots[index]
+        if first is None or first[0] == key or work >= first[3]:
+            if first is not None and first[0] != key:
+                slots[index + 1] = first
+            slots[index] = entry
+        else:
+            slots[index + 1] = entry
+
+
+class ProofNumberSearch:
+    def __init__(self, table=None, max_nodes=100000, max_ply=200, tablebase=None):
+        """
+        Args:
+            table: ProofTable to use (default: a new 16 MB table); a table must not be
+                   shared between searches with different attackers
+            max_nodes: Node budget of one solve call
+            max_ply: Lines longer than this count as not winning for the attacker
+            tablebase: Optional tablebase.Tablebase answering moving-phase positions
+        """
+        self.table = table if table is not None else ProofTable()
+        self.max_nodes = max_nodes
+        self.max_ply = max_ply
+        self.tablebase = tablebase
+        self.nodes = 0
+        self._attacker = 0
+        self._path = set()
+
+    def solve(self, position):
+        """
+        Decide whether the side to move of a bitboard.Position can force a win. The
+        position is searched in place and left as it was.
+
+        Returns:
+            A tuple (result, move): PROVEN with a winning bitboard.Move, or DISPROVEN or
+            UNKNOWN (node budget exhausted) with None
+        """
+        self.nodes = 0
+        self._attacker = position.side
+        self._path = set()
+        self._mid(position, INFINITY, INFINITY, 0)
+        entry = self.table.probe(position.key)
+        if entry is None:
+            return UNKNOWN, None
+        phi, delta, _ = entry
+        if phi == 0:
+            for move, child_key, fixed in self._children(position):
+                if self._lookup(child_key, fixed, 1)[1] == 0:
+                    return PROVEN, move
+            return UNKNOWN, None
+        if delta == 0:
+            return DISPROVEN, None
+        return UNKNOWN, None
+
+    def _draw(self, side):
+        """(phi, delta) of a drawn position with side to move: only the defender reaches its goal."""
+        return (INFINITY, 0) if side == self._attacker else (0, INFINITY)
+
+    def _children(self, position):
+        """
+        Return (move, key, fixed (phi, delta) or None) for each move of the position. The
+        child keys are derived from the Zobrist tables as make_move would, without
+        playing the moves.
+        """
+        side = position.side
+        own, opp = position.bb[side], position.bb[side ^ 1]
+        left = position.to_place[side]
+        own_keys, opp_keys = ZOBRIST_POINTS[side], ZOBRIST_POINTS[side ^ 1]
+        base = position.key ^ ZOBRIST_SIDE
+        if left:
+            base ^= ZOBRIST_TO_PLACE[side][left] ^ ZOBRIST_TO_PLACE[side][left - 1]
+        # The opponent moves next: it loses with two pieces left and none to place, and
+        # the tablebase covers the child once neither side has pieces to place.
+        opp_placed = not position.to_place[side ^ 1]
+        opp_count = popcount(opp) if opp_placed else POINTS
+        tablebase = self.tablebase if opp_placed and left <= 1 else None
+        children = []
+        for move in generate_moves(own, opp, left > 0):
+            frm, to, removed = move
+            key = base ^ own_keys[to]
+            if frm is not None:
+                key ^= own_keys[frm]
+            fixed = None
+            if removed is not None:
+                key ^= opp_keys[removed]
+            if opp_count - (removed is not None) <= 2:
+                fixed = (INFINITY, 0)
+            elif tablebase is not None:
+                new_own, new_opp = apply_move(own, opp, move)
+                found = tablebase.probe(new_opp, new_own)
+                if found is not None:
+                    result = found[0]
+                    fixed = (0, INFINITY) if result > 0 else (INFINITY, 0) if result < 0 else self._draw(side ^ 1)
+            children.append((move, key, fixed))
+        return children
+
+    def _lookup(self, key, fixed, ply):
+        """(phi, delta) of a child at the given ply, from the point of view of its side to move."""
+        if fixed is not None:
+            return fixed
+        if key in self._path or ply >= self.max_ply:
+            # The child's side to move is the other side of its parent's.
+            return self._draw(self._side_at(ply))
+        entry = self.table.probe(key)
+        if entry is None:
+            return 1, 1
+        phi, delta, conditions = entry
+        if conditions is not None:
+            keys, least_ply = conditions
+            if not keys <= self._path or (least_ply is not None and ply < least_ply):
+                # A disproof found along another line: search the position again.
+                return 1, 1
+        return phi, delta
+
+    def _side_at(self, ply):
+        return self._attacker ^ (ply & 1)
+
+    def _conditions(self, key, children, ply):
+        """
+        What a disproof of the node at ply, found from its children, rests on.
+
+        Returns:
+            A tuple (keys, least_ply): the positions of the current line whose repetition
+            counted as a draw below the node, and the least ply at which the node is
+            cut by the max_ply horizon the same way (or None); None when the disproof
+            holds wherever the node is reached
+        """
+        keys = set()
+        least_ply = None
+        for _, child_key, fixed in children:
+            if fixed is not None:
+                continue
+            if child_key in self._path:
+                keys.add(child_key)
+                continue
+            if ply + 1 >= self.max_ply:
+                child_ply = ply + 1
+            else:
+                entry = self.table.probe(child_key)
+                if entry is None or entry[2] is None:
+                    continue
+                child_keys, child_ply = entry[2]
+                keys.update(child_keys)
+                if child_ply is None:
+                    continue
+            if least_ply is None or child_ply - 1 > least_ply:
+                least_ply = child_ply - 1
+        keys.discard(key)
+        if not keys and least_ply is None:
+            return None
+        return frozenset(keys), least_ply
+
+    def _mid(self, position, phi_threshold, delta_threshold, ply):
+        """Search position until its phi or delta reaches its threshold, and store both."""
+        self.nodes += 1
+        started = self.nodes
+        key = position.key
+        children = self._children(position)
+        if not children:
+            self.table.store(key, INFINITY, 0, 0)
+            return
+
+        self._path.add(key)
+        try:
+            while True:
+                phi = INFINITY
+                delta = 0
+                second = INFINITY
+                best = None
+                for child in children:
+                    child_phi, child_delta = self._lookup(child[1], child[2], ply + 1)
+                    delta = min(delta + child_phi, INFINITY)
+                    if child_delta < phi:
+                        second = phi
+                        phi = child_delta
+                        best, best_phi = child, child_phi
+                    elif child_delta < second:
+                        second = child_delta
+                if phi >= phi_threshold or delta >= delta_threshold or self.nodes >= self.max_nodes:
+                    break
+                child_phi_threshold = min(delta_threshold - delta + best_phi, INFINITY)
+                child_delta_threshold = min(phi_threshold, second + 1)
+                move = best[0]
+                position.make_move(move)
+                try:
+                    self._mid(position, child_phi_threshold, child_delta_threshold, ply + 1)
+                finally:
+                    position.unmake_move(move)
+            # Disproven: delta is 0 where the attacker moves, phi where the defender does.
+            disproven = (delta if self._side_at(ply) == self._attacker else phi) == 0
+            conditions = self._conditions(key, children, ply) if disproven else None
+        finally:
+            self._path.discard(key)
+        self.table.store(key, phi, delta, self.nodes - started, conditions)
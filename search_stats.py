@@ -0,0 +1,145 @@
+"""
+Statistics collected by NineMensMorrisGame.get_best_move(..., stats=True).
+
+The search only touches a SearchStats when one is attached to the game, so a
+search without statistics runs exactly as before.
+"""
+
+import time
+
+
+class SearchStats:
+    """
+    Counters and timers of one get_best_move call.
+
+    Attributes:
+        nodes: Nodes visited, including quiescence nodes
+        leaves: Positions scored by the static evaluation
+        expanded: Nodes whose moves were searched
+        cutoffs: Expanded nodes left early by a beta cutoff
+        first_move_cutoffs: Cutoffs caused by the first move searched
+        nodes_per_ply: Dict mapping the distance from the root to the nodes visited there
+        seconds: Wall time of the search
+        move_generation_seconds: Time spent generating and ordering moves
+        evaluation_seconds: Time spent in the static evaluation
+        cache_probes, cache_hits: Transposition table probes and hits during the search,
+                                  or None without a transposition table
+        completed_depth: Deepest finished search depth
+    """
+
+    def __init__(self):
+        self.nodes = 0
+        self.leaves = 0
+        self.expanded = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.nodes_per_ply = {}
+        self.seconds = 0.0
+        self.move_generation_seconds = 0.0
+        self.evaluation_seconds = 0.0
+        self.cache_probes = None
+        self.cache_hits = None
+        self.completed_depth = None
+        # Depth of the current root search, to turn remaining depth into distance from the root.
+        self.root_depth = 0
+
+    def node(self, ply):
+        """Count a node at the given distance from the root."""
+        self.nodes_per_ply[ply] = self.nodes_per_ply.get(ply, 0) + 1
+
+    def cutoff(self, first_move):
+        self.cutoffs += 1
+        if first_move:
+            self.first_move_cutoffs += 1
+
+    def timed_moves(self, moves, started):
+        """
+        Count an expanded node whose move list was started at time `started`, and wrap
+        its moves so that the time spent producing them goes to move_generation_seconds.
+        """
+        self.expanded += 1
+        self.move_generation_seconds += time.perf_counter() - started
+        return _TimedMoves(self, moves)
+
+    def timed_evaluation(self, evaluate):
+        """Wrap an evaluation function so that it counts leaves and evaluation time."""
+        clock = time.perf_counter
+
+        def timed():
+            started = clock()
+            score = evaluate()
+            self.evaluation_seconds += clock() - started
+            self.leaves += 1
+            return score
+
+        return timed
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+    @property
+    def cutoff_rate(self):
+        """Fraction of expanded nodes that ended with a beta cutoff."""
+        return self.cutoffs / self.expanded if self.expanded else 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        """Fraction of cutoffs caused by the first move searched (a measure of move ordering)."""
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def branching_factors(self):
+        """Dict mapping each ply to the ratio of the nodes one ply deeper to the nodes at that ply."""
+        return {ply: self.nodes_per_ply[ply + 1] / count
+                for ply, count in sorted(self.nodes_per_ply.items()) if ply + 1 in self.nodes_per_ply}
+
+    @property
+    def cache_hit_rate(self):
+        """Fraction of transposition table probes that hit, or None without a table."""
+        if self.cache_probes is None:
+            return None
+        return self.cache_hits / self.cache_probes if self.cache_probes else 0.0
+
+    def as_dict(self):
+        """Return all counters and derived rates as a plain dict."""
+        return {
+            'nodes': self.nodes,
+            'leaves': self.leaves,
+            'expanded': self.expanded,
+            'nodes_per_second': self.nodes_per_second,
+            'cutoff_rate': self.cutoff_rate,
+            'first_move_cutoff_rate': self.first_move_cutoff_rate,
+            'branching_factors': self.branching_factors,
+            'cache_hit_rate': self.cache_hit_rate,
+            'seconds': self.seconds,
+            'move_generation_seconds': self.move_generation_seconds,
+            'evaluation_seconds': self.evaluation_seconds,
+            'completed_depth': self.completed_depth,
+        }
+
+    def __repr__(self):
+        return (f"SearchStats(nodes={self.nodes}, leaves={self.leaves}, nps={self.nodes_per_second:.0f}, "
+                f"cutoff_rate={self.cutoff_rate:.2f}, first_move_cutoff_rate={self.first_move_cutoff_rate:.2f})")
+
+
+class _TimedMoves:
+    """Iterator over the moves of one node that times the underlying generator."""
+
+    def __init__(self, stats, moves):
+        self._stats = stats
+        self._moves = iter(moves)
+        # Moves yielded so far.
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            move = next(self._moves)
+        finally:
+            self._stats.move_generation_seconds += time.perf_counter() - started
+        self.count += 1
+        return move
@@ -0,0 +1,161 @@
+"""
+Search trace recorder: get_best_move(..., trace=SearchTrace()) records every node
+of the main search (the _minimax or _negamax recursion, not the quiescence search)
+into a ring buffer, to be saved and examined offline with trace_viewer.py.
+
+Each node adds two events: ENTER with its remaining depth, position code (see
+bitboard.encode) and alpha-beta window, and EXIT with its score, or ABORT when the
+search was interrupted below it. Windows and scores are stored from 'x's point of
+view for both searches. The buffer is a set of preallocated typed arrays written in
+place, so recording allocates no record object per node; once it is full, the
+oldest events are overwritten.
+
+A trace file holds a header (MAGIC, version, number of events in the file, number
+of events recorded) followed by the columns of the events, oldest first, as
+little-endian arrays.
+"""
+
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+ENTER = 0
+EXIT = 1
+ABORT = 2
+
+MAGIC = b'NMMT'
+VERSION = 1
+HEADER = struct.Struct('<4sB3xQQ')
+# Column names and array type codes, in file order.
+COLUMNS = (('kind', 'B'), ('depth', 'b'), ('code', 'Q'), ('first', 'd'), ('second', 'd'))
+
+TraceData = namedtuple('TraceData', [name for name, _ in COLUMNS] + ['recorded'])
+TraceData.__doc__ = """
+Events of a trace, oldest first: kind, depth, code, first (alpha on ENTER, the
+score on EXIT) and second (beta on ENTER) arrays, plus the number of events
+recorded, which exceeds the length of the arrays when the oldest were overwritten.
+"""
+
+
+class SearchTrace:
+    def __init__(self, capacity=1 << 20):
+        """
+        Args:
+            capacity: Events kept (rounded up to a power of two); each takes 26 bytes
+        """
+        size = 1
+        while size < capacity:
+            size *= 2
+        self._mask = size - 1
+        self.kind = array('B', bytes(size))
+        self.depth = array('b', bytes(size))
+        self.code = array('Q', bytes(8 * size))
+        self.first = array('d', bytes(8 * size))
+        self.second = array('d', bytes(8 * size))
+        # Events recorded since the trace was created or cleared.
+        self.recorded = 0
+
+    @property
+    def capacity(self):
+        return self._mask + 1
+
+    def __len__(self):
+        """Number of events kept in the buffer."""
+        return min(self.recorded, self.capacity)
+
+    def clear(self):
+        self.recorded = 0
+
+    def _wrap(self, search, position, negamax):
+        """Return search wrapped to record its nodes; `negamax` flips windows and scores of '0' nodes."""
+        kinds, depths, codes, firsts, seconds = self.kind, self.depth, self.code, self.first, self.second
+        mask = self._mask
+        bb = position.bb
+        to_place = position.to_place
+
+        def traced(depth, alpha, beta, *args):
+            code = bb[0] | bb[1] << 24 | to_place[0] << 48 | to_place[1] << 52 | position.side << 56
+            flip = negamax and position.side
+            i = self.recorded & mask
+            self.recorded += 1
+            kinds[i] = ENTER
+            depths[i] = depth
+            codes[i] = code
+            if flip:
+                firsts[i] = -beta
+                seconds[i] = -alpha
+            else:
+                firsts[i] = alpha
+                seconds[i] = beta
+            try:
+                result = search(depth, alpha, beta, *args)
+            except BaseException:
+                i = self.recorded & mask
+                self.recorded += 1
+                kinds[i] = ABORT
+                depths[i] = depth
+                codes[i] = code
+                raise
+            i = self.recorded & mask
+            self.recorded += 1
+            kinds[i] = EXIT
+            depths[i] = depth
+            codes[i] = code
+            firsts[i] = -result[0] if flip else result[0]
+            return result
+
+        return traced
+
+    def attach(self, game):
+        """Record the searches of a NineMensMorrisGame until detach."""
+        game._minimax = self._wrap(game._minimax, game.position, False)
+        game._negamax = self._wrap(game._negamax, game.position, True)
+
+    @staticmethod
+    def detach(game):
+        del game._minimax
+        del game._negamax
+
+    def data(self):
+        """The events kept, oldest first, as a TraceData."""
+        count = len(self)
+        start = self.recorded & self._mask if self.recorded > self.capacity else 0
+        columns = []
+        for name, _ in COLUMNS:
+            column = getattr(self, name)
+            columns.append(column[start:count] + column[:start] if start else column[:count])
+        return TraceData(*columns, self.recorded)
+
+    def save(self, path):
+        """Write the events kept to a trace file."""
+        data = self.data()
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(data.kind), data.recorded))
+            for name, _ in COLUMNS:
+                column = getattr(data, name)
+                if sys.byteorder == 'big':
+                    column.byteswap()
+                column.tofile(f)
+
+
+def load_trace(path):
+    """Read a trace file written by SearchTrace.save; returns a TraceData."""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size or header[:4] != MAGIC:
+            raise ValueError(f"{path} is not a search trace file")
+        _, version, count, recorded = HEADER.unpack(header)
+        if version != VERSION:
+            raise ValueError(f"{path} has version {version}, expected {VERSION}")
+        columns = []
+        for _, typecode in COLUMNS:
+            column = array(typecode)
+            try:
+                column.fromfile(f, count)
+            except EOFError:
+                raise ValueError(f"{path} is truncated") from None
+            if sys.byteorder == 'big':
+                column.byteswap()
+            columns.append(column)
+    return TraceData(*columns, recorded)
@@ -0,0 +1,416 @@
+"""
+Retrograde-analysis endgame tablebases for the moving phase.
+
+A table covers every position with no pieces left to place where the side to
+move has `mover` pieces and the other side `opponent` pieces (both colours use
+the same table). For each position it stores win / loss / draw for the side to
+move together with the distance to the end of the game in plies.
+
+File format (one file per table, named "<mover>v<opponent>.tb"):
+
+    header   HEADER: magic, mover pieces, opponent pieces, number of entries
+    entries  one byte per index: 0 = draw, otherwise 1 + distance to end in plies
+             (an odd distance is a win for the side to move, an even one a loss)
+
+The index of (own, opp) is rank(own) * C(24, opponent) + rank(opp), where rank
+is the colex rank of the bitboard among the sets with that many pieces. Indices
+where the two sets overlap are unused. Tables are read through mmap, so probing
+only touches the pages that are needed.
+
+Tables reference smaller ones through captures, and the tables (a, b) and (b, a)
+reference each other, so they are generated together, smallest first.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from math import comb
+
+from bitboard import (FULL, MILL_MASKS, NEIGHBOURS, count_moves, iter_points, mill_points,
+                      popcount, potential_mill_indices, removable)
+
+MAGIC = b'NMMTB\x00\x01\x00'
+HEADER = struct.Struct('<8sBB6xQ')
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+MIN_PIECES = 3
+MAX_DISTANCE = 254
+
+_sets = {}
+_ranks = {}
+
+
+def piece_sets(pieces):
+    """Return all bitboards with the given number of pieces, in colex rank order."""
+    sets = _sets.get(pieces)
+    if sets is None:
+        sets = [0] * comb(24, pieces)
+        for combo in combinations(range(24), pieces):
+            sets[sum(comb(p, i + 1) for i, p in enumerate(combo))] = sum(1 << p for p in combo)
+        _sets[pieces] = sets
+    return sets
+
+
+def piece_ranks(pieces):
+    """Return a dict mapping each bitboard with the given number of pieces to its colex rank."""
+    ranks = _ranks.get(pieces)
+    if ranks is None:
+        ranks = {bb: rank for rank, bb in enumerate(piece_sets(pieces))}
+        _ranks[pieces] = ranks
+    return ranks
+
+
+def table_size(mover, opponent):
+    """Number of entries of the table (mover, opponent)."""
+    return comb(24, mover) * comb(24, opponent)
+
+
+def table_name(mover, opponent):
+    return f"{mover}v{opponent}.tb"
+
+
+def decode(value):
+    """Turn a stored byte into (result, distance) for the side to move."""
+    if value == 0:
+        return DRAW, None
+    distance = value - 1
+    return (WIN if distance & 1 else LOSS), distance
+
+
+def is_decisive(score):
+    """Whether a search score is a won or lost game: 1000 at its end, or 1000 - distance from a table."""
+    return abs(score) >= 1000 - MAX_DISTANCE
+
+
+class Table:
+    def __init__(self, path):
+        """Open a table file read-only through mmap."""
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.mover, self.opponent, entries = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC or entries != table_size(self.mover, self.opponent):
+            raise ValueError(f"Not a valid tablebase file: {path}")
+        self._own_ranks = piece_ranks(self.mover)
+        self._opp_ranks = piece_ranks(self.opponent)
+        self._stride = comb(24, self.opponent)
+
+    def value(self, own, opp):
+        """Return the stored byte for the side to move owning own."""
+        return self._data[HEADER.size + self._own_ranks[own] * self._stride + self._opp_ranks[opp]]
+
+    def probe(self, own, opp):
+        """Return (result, distance) for the side to move owning own."""
+        return decode(self.value(own, opp))
+
+    def close(self):
+        self._data.close()
+
+
+class Tablebase:
+    def __init__(self, directory):
+        """
+        Give access to every table file found in directory.
+
+        Args:
+            directory: Directory with "<mover>v<opponent>.tb" files
+        """
+        self.directory = directory
+        self._tables = {}
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                stem, ext = os.path.splitext(name)
+                if ext == '.tb' and 'v' in stem:
+                    mover, opponent = stem.split('v')
+                    self._tables[(int(mover), int(opponent))] = os.path.join(directory, name)
+
+    def __contains__(self, material):
+        return material in self._tables
+
+    def table(self, mover, opponent):
+        """Return the Table for (mover, opponent), or None if it has not been generated."""
+        table = self._tables.get((mover, opponent))
+        if isinstance(table, str):
+            table = self._tables[(mover, opponent)] = Table(table)
+        return table
+
+    def probe(self, own, opp):
+        """Return (result, distance) for the side to move owning own, or None if not covered."""
+        table = self.table(popcount(own), popcount(opp))
+        if table is None:
+            return None
+        return table.probe(own, opp)
+
+    def score(self, position):
+        """
+        Score a bitboard.Position for the search: 1000 - distance if 'x' wins,
+        distance - 1000 if '0' wins (distance being the plies to the end of the game,
+        so that faster wins and slower losses score better), 0 for a draw, or None
+        when the position is not covered by a table.
+        """
+        if position.to_place[0] or position.to_place[1]:
+            return None
+        side = position.side
+        own, opp = position.bb[side], position.bb[side ^ 1]
+        table = self.table(popcount(own), popcount(opp))
+        if table is None:
+            return None
+        result, distance = decode(table.value(own, opp))
+        if result == DRAW:
+            return 0
+        if (result == WIN) == (side == 0):
+            return 1000 - distance
+        return distance - 1000
+
+
+def _closing_moves(own, opp, potential):
+    """Yield (frm, to) for the moves of own that close a mill."""
+    empty = FULL & ~(own | opp)
+    flying = popcount(own) <= 3
+    for frm in iter_points(own):
+        completing = 0
+        for i in iter_points(potential):
+            mill = MILL_MASKS[i]
+            if not mill >> frm & 1:
+                completing |= mill & empty
+        destinations = completing if flying else NEIGHBOURS[frm] & completing
+        for to in iter_points(destinations):
+            yield frm, to
+
+
+_worker_tablebase = None
+
+
+def _init_range(task):
+    """
+    First pass over the positions of one table whose own set has a rank in [start, end).
+
+    Returns:
+        (first index, counts, floors, entries): counts holds the number of non-capturing
+        moves (plus one if a capture reaches a drawn or won position, so the counter never
+        runs out), floors the longest loss distance reachable through captures into smaller
+        tables, and entries the (index, distance) pairs already known: immediate losses,
+        pending losses and tentative capture wins
+    """
+    global _worker_tablebase
+    mover, opponent, offset, start, end, directory = task
+    if _worker_tablebase is None or _worker_tablebase.directory != directory:
+        _worker_tablebase = Tablebase(directory)
+    sub_table = _worker_tablebase.table(opponent - 1, mover) if opponent - 1 >= MIN_PIECES else None
+    if opponent - 1 >= MIN_PIECES and sub_table is None:
+        raise FileNotFoundError(f"Missing table {table_name(opponent - 1, mover)} in {directory}")
+
+    own_sets = piece_sets(mover)
+    opp_sets = piece_sets(opponent)
+    stride = len(opp_sets)
+    counts = bytearray((end - start) * stride)
+    floors = bytearray((end - start) * stride)
+    entries = []
+    first = offset + start * stride
+
+    for own_rank in range(start, end):
+        own = own_sets[own_rank]
+        base = (own_rank - start) * stride
+        for opp_rank, opp in enumerate(opp_sets):
+            if own & opp:
+                continue
+            local = base + opp_rank
+            total = count_moves(own, opp, False)
+            if not total:
+                entries.append((first + local, 0))
+                continue
+            potential = potential_mill_indices(own, opp)
+            quiet = total
+            win = None
+            floor = 0
+            escape = False
+            if potential:
+                captures = removable(opp)
+                closing = list(_closing_moves(own, opp, potential))
+                quiet -= len(closing) * popcount(captures)
+                if closing and sub_table is None:
+                    win = 1
+                else:
+                    for frm, to in closing:
+                        new_own = (own ^ (1 << frm)) | (1 << to)
+                        for removed in iter_points(captures):
+                            value = sub_table.value(opp ^ (1 << removed), new_own)
+                            if value == 0:
+                                escape = True
+                            elif (value - 1) & 1:
+                                floor = max(floor, value)
+                            elif win is None or value < win:
+                                win = value
+            if win is not None:
+                entries.append((first + local, win))
+                escape = True
+            if quiet + escape:
+                counts[local] = quiet + escape
+                floors[local] = floor
+            elif floor:
+                entries.append((first + local, floor))
+    return first, bytes(counts), bytes(floors), entries
+
+
+def _predecessors(own_q, opp_q):
+    """
+    Yield (own_p, opp_p) for the positions from which the previous mover (owning opp_q)
+    reached (own_q, opp_q) with a non-capturing move.
+    """
+    empty = FULL & ~(own_q | opp_q)
+    flying = popcount(opp_q) <= 3
+    for to in iter_points(opp_q & ~mill_points(opp_q)):
+        rest = opp_q ^ (1 << to)
+        for frm in iter_points(empty if flying else NEIGHBOURS[to] & empty):
+            yield rest | (1 << frm), own_q
+
+
+def generate(mover, opponent, directory, workers=1, log=None):
+    """
+    Generate the tables (mover, opponent) and (opponent, mover) into directory.
+
+    Tables reached through captures (one piece fewer) must already exist there.
+
+    Args:
+        mover, opponent: Piece counts (at least 3 each)
+        directory: Output directory
+        workers: Number of processes for the first pass over all positions
+        log: Optional callable receiving progress messages
+    """
+    if min(mover, opponent) < MIN_PIECES:
+        raise ValueError("Tables need at least 3 pieces per side")
+    os.makedirs(directory, exist_ok=True)
+    materials = [(mover, opponent)] if mover == opponent else [(mover, opponent), (opponent, mover)]
+    offsets = {}
+    total = 0
+    for material in materials:
+        offsets[material] = total
+        total += table_size(*material)
+    started = time.perf_counter()
+
+    counts = bytearray(total)
+    floors = bytearray(total)
+    values = bytearray(total)
+    buckets = {}
+
+    tasks = []
+    for a, b in materials:
+        own_count = comb(24, a)
+        chunk = max(1, own_count // (workers * 8))
+        for start in range(0, own_count, chunk):
+            tasks.append((a, b, offsets[(a, b)], start, min(own_count, start + chunk), directory))
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_init_range, tasks))
+    else:
+        results = map(_init_range, tasks)
+    for first, chunk_counts, chunk_floors, entries in results:
+        counts[first:first + len(chunk_counts)] = chunk_counts
+        floors[first:first + len(chunk_floors)] = chunk_floors
+        for index, distance in entries:
+            buckets.setdefault(distance, []).append(index)
+    if log:
+        log(f"{materials}: first pass over {total} indices in {time.perf_counter() - started:.1f}s")
+
+    ranks = {pieces: piece_ranks(pieces) for pieces in {mover, opponent}}
+    sets = {pieces: piece_sets(pieces) for pieces in {mover, opponent}}
+    layout = [(offsets[(a, b)], table_size(a, b), a, b) for a, b in materials]
+
+    distance = 0
+    resolved = []
+    while resolved or any(d >= distance for d in buckets):
+        frontier = resolved
+        for index in buckets.pop(distance, ()):
+            if not values[index]:
+                values[index] = distance + 1
+                frontier.append(index)
+        resolved = []
+        if frontier and distance + 1 >= MAX_DISTANCE:
+            raise OverflowError("Distance to end does not fit in one byte")
+
+        for index in frontier:
+            for offset, size, a, b in layout:
+                if offset <= index < offset + size:
+                    break
+            own_rank, opp_rank = divmod(index - offset, comb(24, b))
+            own_q, opp_q = sets[a][own_rank], sets[b][opp_rank]
+            # Predecessors are in table (b, a), with the roles swapped.
+            pred_offset = offsets[(b, a)]
+            pred_stride = comb(24, a)
+            own_ranks = ranks[b]
+            opp_part = ranks[a][own_q]
+            if distance & 1 == 0:
+                for own_p, _ in _predecessors(own_q, opp_q):
+                    pred = pred_offset + own_ranks[own_p] * pred_stride + opp_part
+                    if not values[pred]:
+                        values[pred] = distance + 2
+                        resolved.append(pred)
+            else:
+                for own_p, _ in _predecessors(own_q, opp_q):
+                    pred = pred_offset + own_ranks[own_p] * pred_stride + opp_part
+                    if not values[pred]:
+                        counts[pred] -= 1
+                        if not counts[pred]:
+                            loss = max(distance + 1, floors[pred])
+                            if loss == distance + 1:
+                                values[pred] = loss + 1
+                                resolved.append(pred)
+                            else:
+                                buckets.setdefault(loss, []).append(pred)
+        distance += 1
+
+    for (a, b), offset in offsets.items():
+        size = table_size(a, b)
+        path = os.path.join(directory, table_name(a, b))
+        with open(path + '.tmp', 'wb') as f:
+            f.write(HEADER.pack(MAGIC, a, b, size))
+            f.write(values[offset:offset + size])
+        os.replace(path + '.tmp', path)
+    if log:
+        log(f"{materials}: done in {time.perf_counter() - started:.1f}s, longest distance {distance - 1}")
+
+
+def generate_all(materials, directory, workers=1, log=None):
+    """
+    Generate the given tables and every smaller table they depend on, skipping the
+    ones that already exist in directory.
+
+    Args:
+        materials: Iterable of (mover, opponent) piece counts
+    """
+    wanted = {tuple(sorted(material)) for material in materials}
+    max_pieces = max(max(material) for material in wanted)
+    existing = Tablebase(directory)
+    for total in range(2 * MIN_PIECES, 2 * max_pieces + 1):
+        for mover in range(MIN_PIECES, max_pieces + 1):
+            opponent = total - mover
+            if opponent < mover or opponent > max_pieces:
+                continue
+            if not any(a >= mover and b >= opponent for a, b in wanted):
+                continue
+            if (mover, opponent) in existing and (opponent, mover) in existing:
+                continue
+            generate(mover, opponent, directory, workers, log)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Nine Men's Morris endgame tablebases.")
+    parser.add_argument('materials', nargs='*', default=['3v3'],
+                        help="tables to generate, e.g. 3v3 4v3 (smaller tables are generated first)")
+    parser.add_argument('--dir', default='tablebases', help="output directory")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    materials = [tuple(int(n) for n in material.split('v')) for material in args.materials]
+    generate_all(materials, args.dir, args.workers, lambda message: print(message, file=sys.stderr))
+
+
+if __name__ == "__main__":
+    main()
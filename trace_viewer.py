@@ -0,0 +1,180 @@
+"""
+Offline viewer for search traces (see search_trace.py): rebuild the searched tree
+and summarise how well it was pruned.
+
+    python trace_viewer.py trace.nmt                       # summary per ply
+    python trace_viewer.py trace.nmt --json
+    python trace_viewer.py trace.nmt --tree -1 --max-ply 2  # last root search as a tree
+
+Every node is classified from its window and score (from 'x's point of view, with
+'x' maximizing): "cut" when the score reached beta for 'x' (alpha for '0'), so the
+node stopped early; "all" when it stayed at or below alpha for 'x' (beta for '0'),
+so every move was searched without improving the window; "pv" in between; "aborted"
+when the search was interrupted below it. Nodes whose ENTER was overwritten in the
+ring buffer are left out, so their children become roots.
+"""
+
+import argparse
+import json
+import sys
+
+from bitboard import decode, move_between
+from search_trace import ABORT, ENTER, load_trace
+
+
+class TraceNode:
+    __slots__ = ('code', 'depth', 'ply', 'alpha', 'beta', 'score', 'aborted', 'children')
+
+    def __init__(self, code, depth, ply, alpha, beta):
+        self.code = code
+        self.depth = depth
+        self.ply = ply
+        self.alpha = alpha
+        self.beta = beta
+        # None while the node is unfinished (its EXIT is not in the trace).
+        self.score = None
+        self.aborted = False
+        self.children = []
+
+    @property
+    def side(self):
+        return self.code >> 56 & 1
+
+    @property
+    def kind(self):
+        """"cut", "all", "pv", "aborted" or "unfinished"; see the module docstring."""
+        if self.aborted:
+            return 'aborted'
+        if self.score is None:
+            return 'unfinished'
+        low, high = (self.alpha, self.beta) if self.side == 0 else (-self.beta, -self.alpha)
+        score = self.score if self.side == 0 else -self.score
+        if score >= high:
+            return 'cut'
+        if score <= low:
+            return 'all'
+        return 'pv'
+
+    def move_to(self, child):
+        """The bitboard.Move leading from this node to a child."""
+        x_bb, o_bb, _, side = decode(self.code)
+        new_x, new_o, _, _ = decode(child.code)
+        if side == 0:
+            return move_between(x_bb, o_bb, new_x, new_o)
+        return move_between(o_bb, x_bb, new_o, new_x)
+
+
+def build_tree(data):
+    """
+    Rebuild the trees of a TraceData.
+
+    Returns:
+        The list of root TraceNodes, in search order (one per root search, such as
+        each iteration of iterative deepening)
+    """
+    roots = []
+    stack = []
+    for kind, depth, code, first, second in zip(data.kind, data.depth, data.code, data.first, data.second):
+        if kind == ENTER:
+            node = TraceNode(code, depth, len(stack), first, second)
+            (stack[-1].children if stack else roots).append(node)
+            stack.append(node)
+        elif stack:
+            node = stack.pop()
+            if kind == ABORT:
+                node.aborted = True
+            else:
+                node.score = first
+    return roots
+
+
+def walk(roots):
+    """Yield every node of the trees, depth first."""
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
+
+
+def summarise(data, roots):
+    """
+    Count the nodes of the trees per ply.
+
+    Returns:
+        A dict with the events recorded and kept, the number of roots and, per ply, the
+        nodes, leaves, nodes of each kind, cut nodes refuted by their first child and
+        the mean number of children of the expanded nodes
+    """
+    plies = {}
+    for node in walk(roots):
+        entry = plies.setdefault(node.ply, {'nodes': 0, 'leaves': 0, 'cut': 0, 'all': 0, 'pv': 0,
+                                            'aborted': 0, 'unfinished': 0, 'first_child_cuts': 0,
+                                            'children': 0})
+        entry['nodes'] += 1
+        entry[node.kind] += 1
+        if node.children:
+            entry['children'] += len(node.children)
+            if node.kind == 'cut' and len(node.children) == 1:
+                entry['first_child_cuts'] += 1
+        else:
+            entry['leaves'] += 1
+    for entry in plies.values():
+        expanded = entry['nodes'] - entry['leaves']
+        entry['mean_children'] = entry.pop('children') / expanded if expanded else 0.0
+    return {
+        'recorded': data.recorded,
+        'kept': len(data.kind),
+        'roots': len(roots),
+        'plies': dict(sorted(plies.items())),
+    }
+
+
+def format_summary(summary):
+    lines = [f"{summary['kept']} of {summary['recorded']} events kept, {summary['roots']} root searches",
+             f"{'ply':>4} {'nodes':>9} {'leaves':>9} {'cut':>8} {'all':>8} {'pv':>6} {'aborted':>8} "
+             f"{'1st cut':>8} {'children':>9}"]
+    for ply, entry in summary['plies'].items():
+        first = entry['first_child_cuts'] / entry['cut'] if entry['cut'] else 0.0
+        lines.append(f"{ply:>4} {entry['nodes']:>9} {entry['leaves']:>9} {entry['cut']:>8} {entry['all']:>8} "
+                     f"{entry['pv']:>6} {entry['aborted']:>8} {first:>8.1%} {entry['mean_children']:>9.2f}")
+    return "\n".join(lines)
+
+
+def format_tree(root, max_ply=None):
+    """One line per node: move from the parent, remaining depth, window, score and kind."""
+    lines = []
+    stack = [(root, None)]
+    while stack:
+        node, move = stack.pop()
+        label = 'root' if move is None else list(move)
+        lines.append(f"{'  ' * (node.ply - root.ply)}{label} d={node.depth} "
+                     f"[{node.alpha:g}, {node.beta:g}] score={node.score} {node.kind}")
+        if max_ply is None or node.ply - root.ply < max_ply:
+            stack.extend((child, node.move_to(child)) for child in reversed(node.children))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise a search trace file.")
+    parser.add_argument('path', help="trace file written by SearchTrace.save")
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    parser.add_argument('--tree', type=int, help="print the tree of this root search (-1 for the last)")
+    parser.add_argument('--max-ply', type=int, help="depth of the printed tree")
+    args = parser.parse_args(argv)
+
+    data = load_trace(args.path)
+    roots = build_tree(data)
+    if args.tree is not None:
+        if not roots:
+            print("the trace has no complete root search", file=sys.stderr)
+            return 1
+        print(format_tree(roots[args.tree], args.max_ply))
+        return 0
+    summary = summarise(data, roots)
+    print(json.dumps(summary) if args.json else format_summary(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Bounded transposition table for the minimax / alpha-beta search.
+
+Entries are keyed by bitboard.Position.canonical_key, which is shared by the
+positions symmetric to each other, and store (key, depth, score, bound, best_move)
+with the move in the canonical frame. The table is a fixed number of two-slot
+buckets sized from a memory cap, so it never grows during a search.
+"""
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Replacement policies.
+DEPTH_PREFERRED = 'depth-preferred'
+ALWAYS_REPLACE = 'always-replace'
+TWO_TIER = 'two-tier'
+
+# Rough size of one stored entry (tuple, ints and best move) in bytes.
+ENTRY_BYTES = 200
+
+
+class TranspositionTable:
+    def __init__(self, max_mb=16, policy=TWO_TIER):
+        """
+        Create an empty table.
+
+        Args:
+            max_mb: Memory cap in megabytes, used to size the number of buckets
+            policy: DEPTH_PREFERRED keeps the deeper of two results for the same bucket,
+                    ALWAYS_REPLACE keeps the newest one, TWO_TIER (default) uses the first
+                    slot of a bucket depth-preferred and the second one always-replace
+        """
+        if policy not in (DEPTH_PREFERRED, ALWAYS_REPLACE, TWO_TIER):
+            raise ValueError(f"Unknown replacement policy: {policy}")
+        buckets = 1
+        while buckets * 4 * ENTRY_BYTES <= max_mb * 1024 * 1024:
+            buckets *= 2
+        self.policy = policy
+        self._mask = buckets - 1
+        self._slots = [None] * (buckets * 2)
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def __len__(self):
+        return sum(1 for entry in self._slots if entry is not None)
+
+    @property
+    def capacity(self):
+        """Maximum number of entries the table can hold."""
+        return len(self._slots)
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        self._slots = [None] * len(self._slots)
+        self.probes = self.hits = self.stores = 0
+
+    def probe(self, key):
+        """Return the entry (key, depth, score, bound, best_move) stored for key, or None."""
+        self.probes += 1
+        index = (key & self._mask) << 1
+        slots = self._slots
+        entry = slots[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        entry = slots[index + 1]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, best_move):
+        """Store a search result according to the replacement policy."""
+        self.stores += 1
+        index = (key & self._mask) << 1
+        slots = self._slots
+        entry = (key, depth, score, bound, best_move)
+        first = slots[index]
+
+        if self.policy == ALWAYS_REPLACE:
+            second = slots[index + 1]
+            if second is not None and second[0] == key:
+                slots[index + 1] = entry
+            else:
+                if first is not None and first[0] != key:
+                    slots[index + 1] = first
+                slots[index] = entry
+        elif self.policy == DEPTH_PREFERRED:
+            if first is None or first[0] == key or depth >= first[1]:
+                slots[index] = entry
+            else:
+                second = slots[index + 1]
+                if second is None or second[0] == key or depth >= second[1]:
+                    slots[index + 1] = entry
+        else:
+            if first is None or first[0] == key or depth >= first[1]:
+                if first is not None and first[0] != key:
+                    slots[index + 1] = first
+                slots[index] = entry
+            else:
+                slots[index + 1] = entry
+
+    def hit_rate(self):
+        """Fraction of probes that found an entry."""
+        return self.hits / self.probes if self.probes else 0.0
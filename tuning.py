@@ -0,0 +1,263 @@
+"""
+Tune the evaluation weights of both engines on labelled positions.
+
+    python tuning.py --games match.jsonl --min-ply 8
+    python tuning.py --records games.nmr --min-ply 8
+    python tuning.py --positions labelled.jsonl --engine bayesian --dry-run
+
+Positions come from game records of match_runner.py or binary game records (see
+game_records.py), every position of a game labelled with the game's result for
+'x', and from JSONL files of positions, one
+{"board": ..., "pieces_to_place": [nx, n0], "result": r} per line, r being 1, 0.5
+or 0 for 'x'. Their features are extracted in bulk with batch_eval.
+
+evaluate is fitted the Texel way: a logistic curve sigmoid(K * score) maps its
+scores to expected results. K is fitted first for the current weights, so that the
+new weights stay on the same scale (the fixed 1000 of a finished game keeps its
+meaning); logistic regression then fits K * weights on the positions that are not
+over, and the weights are rounded to integers. Should the fitted weights score a
+position beyond half of that 1000, they are scaled down first, so that search
+never mistakes a good position for a won game. bayesian_evaluation already returns
+a probability: its component shares are fitted by least squares on the results,
+kept non-negative and scaled to sum to 1.
+
+The fitted weights are written to the weights file (see weights.py) that both
+engines read when they are imported.
+"""
+
+import argparse
+import json
+import sys
+from array import array
+
+import numpy as np
+
+import batch_eval
+from bitboard import EMPTY, POINTS, Move, apply_move, decode, from_board
+from game_records import GameRecordReader, replay
+from weights import load_weights, save_weights, weights_path
+
+# Score of a finished game in evaluate; fitted scores stay below half of it.
+GAME_OVER_SCORE = 1000
+# Ridge term of the logistic regression, keeping it stable on separable data.
+RIDGE = 1e-6
+
+
+class LabelledPositions:
+    """Positions and results collected into compact arrays."""
+
+    def __init__(self):
+        self.x_bbs = array('I')
+        self.o_bbs = array('I')
+        self.to_place = array('b')
+        self.results = array('d')
+
+    def __len__(self):
+        return len(self.results)
+
+    def add(self, x_bb, o_bb, pieces_to_place, result):
+        self.x_bbs.append(x_bb)
+        self.o_bbs.append(o_bb)
+        self.to_place.extend(pieces_to_place)
+        self.results.append(result)
+
+    def add_games(self, lines, min_ply=0):
+        """Add the positions (from ply min_ply on) of match_runner game records."""
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            result = record['score_x']
+            x_bb = o_bb = 0
+            pieces_to_place = [9, 9]
+            for ply, move in enumerate(record['opening'] + record['moves']):
+                side = ply & 1
+                if ply >= min_ply:
+                    self.add(x_bb, o_bb, pieces_to_place, result)
+                move = Move(*move)
+                if side == 0:
+                    x_bb, o_bb = apply_move(x_bb, o_bb, move)
+                else:
+                    o_bb, x_bb = apply_move(o_bb, x_bb, move)
+                if move.frm is None:
+                    pieces_to_place[side] -= 1
+            if len(record['opening']) + len(record['moves']) >= min_ply:
+                self.add(x_bb, o_bb, pieces_to_place, result)
+
+    def add_records(self, reader, min_ply=0):
+        """Add the positions (from ply min_ply on) of the games of a GameRecordReader with a result."""
+        for record in reader:
+            if record.result is None:
+                continue
+            for ply, code in enumerate(replay(record)):
+                if ply >= min_ply:
+                    x_bb, o_bb, pieces_to_place, _ = decode(code)
+                    self.add(x_bb, o_bb, pieces_to_place, record.result)
+
+    def add_positions(self, lines):
+        """Add {board, pieces_to_place, result} positions, one JSON object per line."""
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            board = record['board']
+            if len(board) != POINTS:
+                raise ValueError(f"line {number}: board must have {POINTS} points")
+            board = ['x' if piece == 'x' else '0' if piece in ('0', 'o') else EMPTY for piece in board]
+            self.add(*from_board(board), record['pieces_to_place'], float(record['result']))
+
+    def arrays(self):
+        """Return (boards, pieces_to_place, results) as NumPy arrays for batch_eval."""
+        boards = batch_eval.bitboards_to_array(np.frombuffer(self.x_bbs, dtype=np.uint32),
+                                               np.frombuffer(self.o_bbs, dtype=np.uint32))
+        pieces_to_place = np.frombuffer(self.to_place, dtype=np.int8).reshape(-1, 2)
+        return boards, pieces_to_place, np.frombuffer(self.results, dtype=np.float64)
+
+
+def sigmoid(values):
+    return 1.0 / (1.0 + np.exp(-np.clip(values, -500, 500)))
+
+
+def mean_squared_error(predicted, results):
+    return float(np.mean((predicted - results) ** 2))
+
+
+def fit_scale(scores, results):
+    """The K minimizing the squared error of sigmoid(K * scores), by golden-section search on log K."""
+    def error(log_k):
+        return mean_squared_error(sigmoid(np.exp(log_k) * scores), results)
+
+    low, high = np.log(1e-4), np.log(10.0)
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = high - ratio * (high - low), low + ratio * (high - low)
+    error_a, error_b = error(a), error(b)
+    for _ in range(60):
+        if error_a < error_b:
+            high, b, error_b = b, a, error_a
+            a = high - ratio * (high - low)
+            error_a = error(a)
+        else:
+            low, a, error_a = a, b, error_b
+            b = low + ratio * (high - low)
+            error_b = error(b)
+    return float(np.exp((low + high) / 2))
+
+
+def logistic_regression(features, results, start, iterations=25):
+    """
+    Fit sigmoid(features @ beta) to results (which may be 0.5) by iteratively
+    reweighted least squares.
+
+    Returns:
+        The coefficients beta
+    """
+    features = features.astype(np.float64)
+    beta = np.asarray(start, dtype=np.float64)
+    ridge = RIDGE * len(features) * np.eye(features.shape[1])
+    for _ in range(iterations):
+        predicted = sigmoid(features @ beta)
+        weights = predicted * (1 - predicted)
+        gradient = features.T @ (results - predicted) - ridge @ beta
+        hessian = (features * weights[:, None]).T @ features + ridge
+        step = np.linalg.solve(hessian, gradient)
+        beta += step
+        if np.max(np.abs(step)) < 1e-9:
+            break
+    return beta
+
+
+def fit_evaluate(boards, pieces_to_place, results, current):
+    """
+    Fit the weights of evaluate.
+
+    Returns:
+        A tuple (weights, K, error before, error after), the errors being the mean
+        squared errors of sigmoid(K * evaluate) on the positions that are not over
+    """
+    features, game_over = batch_eval.evaluation_features(boards, pieces_to_place)
+    playing = game_over == 0
+    features, results = features[playing], results[playing]
+    if not len(results):
+        raise ValueError("no positions to fit: every position is a finished game")
+    old = np.array([current[name] for name in batch_eval.FEATURES], dtype=np.float64)
+    scale = fit_scale(features @ old, results)
+    beta = logistic_regression(features, results, scale * old)
+    new = beta / scale
+    peak = np.max(np.abs(features @ new))
+    if peak > GAME_OVER_SCORE / 2:
+        new *= GAME_OVER_SCORE / 2 / peak
+    new = np.rint(new).astype(int)
+    fitted = {name: int(value) for name, value in zip(batch_eval.FEATURES, new)}
+    return (fitted, scale, mean_squared_error(sigmoid(scale * (features @ old)), results),
+            mean_squared_error(sigmoid(scale * (features @ new)), results))
+
+
+def fit_bayesian(boards, results, current):
+    """
+    Fit the component shares of bayesian_evaluation.
+
+    Returns:
+        A tuple (weights, error before, error after) with mean squared errors of the
+        win probabilities
+    """
+    features = batch_eval.bayesian_features(boards)
+    old = np.array([current[name] for name in batch_eval.BAYESIAN_FEATURES])
+    shares, *_ = np.linalg.lstsq(features, results, rcond=None)
+    shares = np.clip(shares, 0, None)
+    if shares.sum() == 0:
+        shares = old
+    shares = np.round(shares / shares.sum(), 4)
+    fitted = {name: float(value) for name, value in zip(batch_eval.BAYESIAN_FEATURES, shares)}
+    return (fitted, mean_squared_error(features @ old, results),
+            mean_squared_error(features @ shares, results))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit the evaluation weights to labelled positions.")
+    parser.add_argument('--games', action='append', default=[], help="match_runner results file (repeatable)")
+    parser.add_argument('--records', action='append', default=[], help="binary game record file (repeatable)")
+    parser.add_argument('--positions', action='append', default=[],
+                        help="JSONL file of labelled positions (repeatable)")
+    parser.add_argument('--min-ply', type=int, default=0, help="skip the first plies of every game")
+    parser.add_argument('--engine', choices=('evaluate', 'bayesian', 'both'), default='both')
+    parser.add_argument('--out', help=f"weights file to update (default: {weights_path()})")
+    parser.add_argument('--dry-run', action='store_true', help="print the fitted weights without saving them")
+    args = parser.parse_args(argv)
+    if not args.games and not args.records and not args.positions:
+        parser.error("give at least one --games, --records or --positions file")
+
+    positions = LabelledPositions()
+    for path in args.games:
+        with open(path) as f:
+            positions.add_games(f, args.min_ply)
+    for path in args.records:
+        with GameRecordReader(path) as reader:
+            positions.add_records(reader, args.min_ply)
+    for path in args.positions:
+        with open(path) as f:
+            positions.add_positions(f)
+    print(f"{len(positions)} positions", file=sys.stderr)
+    if not len(positions):
+        return 1
+    boards, pieces_to_place, results = positions.arrays()
+
+    weights = load_weights(args.out)
+    if args.engine in ('evaluate', 'both'):
+        fitted, scale, before, after = fit_evaluate(boards, pieces_to_place, results, weights['evaluate'])
+        print(f"evaluate: {fitted} (K = {scale:.5f}, error {before:.5f} -> {after:.5f})", file=sys.stderr)
+        weights['evaluate'] = fitted
+    if args.engine in ('bayesian', 'both'):
+        fitted, before, after = fit_bayesian(boards, results, weights['bayesian'])
+        print(f"bayesian: {fitted} (error {before:.5f} -> {after:.5f})", file=sys.stderr)
+        weights['bayesian'] = fitted
+    if not args.dry_run:
+        save_weights(weights, args.out)
+        print(f"saved {args.out or weights_path()}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Evaluation weights of both engines.
+
+NineMensMorrisGame.evaluate and main2.NineMensMorris.bayesian_evaluation read their
+weights from weights.json next to this file when they are imported (or from the
+file named by the NMM_WEIGHTS environment variable). Missing entries keep the
+defaults below; tuning.py fits new weights and writes the file.
+"""
+
+import json
+import os
+
+DEFAULT_WEIGHTS = {
+    # Multipliers of the differences ('x' minus '0') of the terms of evaluate; integers,
+    # so that evaluate stays integral.
+    'evaluate': {'pieces': 3, 'mills': 6, 'mobility': 1, 'potential_mills': 2, 'blocked': 1},
+    # Shares of the component scores of bayesian_evaluation; they sum to 1.
+    'bayesian': {'mills': 0.4, 'blocking': 0.3, 'pieces': 0.2, 'strategic': 0.1},
+}
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights.json')
+
+
+def weights_path():
+    return os.environ.get('NMM_WEIGHTS') or DEFAULT_PATH
+
+
+def load_weights(path=None):
+    """
+    Read a weights file over the defaults.
+
+    Returns:
+        A dict like DEFAULT_WEIGHTS; a missing file gives the defaults
+    """
+    if path is None:
+        path = weights_path()
+    weights = {engine: dict(values) for engine, values in DEFAULT_WEIGHTS.items()}
+    if os.path.exists(path):
+        with open(path) as f:
+            stored = json.load(f)
+        for engine, values in stored.items():
+            if engine not in weights:
+                raise ValueError(f"Unknown engine in {path}: {engine}")
+            for name, value in values.items():
+                if name not in weights[engine]:
+                    raise ValueError(f"Unknown {engine} weight in {path}: {name}")
+                weights[engine][name] = value
+    return weights
+
+
+def save_weights(weights, path=None):
+    """Write weights (a dict like DEFAULT_WEIGHTS) to a weights file."""
+    if path is None:
+        path = weights_path()
+    with open(path + '.tmp', 'w') as f:
+        json.dump(weights, f, indent=2)
+        f.write('\n')
+    os.replace(path + '.tmp', path)
+
+
+WEIGHTS = load_weights()